@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class DevconnectConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'DevConnect'
+
+    def ready(self):
+        from . import signals  # noqa: F401  (registers signal handlers)
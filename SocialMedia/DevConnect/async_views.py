@@ -0,0 +1,173 @@
+"""
+Async versions of the hottest API endpoints, for serving SocialMedia.asgi
+under uvicorn/daphne. While one request waits on the database the worker
+keeps serving others, instead of blocking a whole WSGI thread.
+
+DRF's @api_view is sync-only, so these are plain Django async views with
+the same JSON shapes as their counterparts in views.py. Reads use Django's
+async ORM; toggles run the shared transactional helpers through
+sync_to_async, because transactions are not available in async code.
+
+Like DRF, a request without a bearer token is authenticated from the session
+and then has to pass Django's CSRF check if it changes anything. The views
+are csrf_exempt only so that token requests, which carry no cookie, get through.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_GET, require_POST
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.exceptions import PermissionDenied
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+
+from . import like_buffer, realtime
+from .authentication import StatelessJWTAuthentication
+from .interactions import toggle_like, toggle_follow
+from .models import Comment, Like, Post
+from .serializers import CommentSerializer, PostSerializer
+
+
+async def aauthenticate(request):
+    """
+    Resolve request.user from a JWT bearer token, or from the session when no token is sent.
+    Token validation is pure CPU work, and tokens with the stateless claims need
+    no user lookup either (see authentication.py). Raises PermissionDenied for an
+    unsafe request authenticated by the session without a valid CSRF token.
+    """
+    jwt_auth = StatelessJWTAuthentication()
+    header = jwt_auth.get_header(request)
+    raw_token = jwt_auth.get_raw_token(header) if header else None
+
+    if raw_token is None:
+        request.user = await request.auser()
+        if request.user.is_authenticated:
+            SessionAuthentication().enforce_csrf(request)  # Only checks unsafe methods
+        return request.user
+
+    try:
+        token = jwt_auth.get_validated_token(raw_token)
+        user = await jwt_auth.aget_user(token)
+    except (InvalidToken, TokenError, AuthenticationFailed, User.DoesNotExist):
+        user = None
+    if user is None or not user.is_active:
+        # Never leave the middleware's lazy user behind, it would query from async code
+        request.user = AnonymousUser()
+        return None
+
+    request.user = user
+    return user
+
+
+def _auth_required():
+    return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+
+
+def _forbidden(error):
+    return JsonResponse({"detail": str(error.detail)}, status=403)
+
+
+@csrf_exempt
+@require_POST
+async def api_like_post(request, post_id):
+    """Toggle like/unlike for the authenticated user."""
+    try:
+        user = await aauthenticate(request)
+    except PermissionDenied as e:
+        return _forbidden(e)
+    if user is None or not user.is_authenticated:
+        return _auth_required()
+
+    if not await Post.objects.filter(id=post_id).aexists():
+        return JsonResponse({"error": "Post not found"}, status=404)
+
+    liked, like_count = await sync_to_async(toggle_like)(user, post_id)
+    return JsonResponse({
+        "message": "Post liked" if liked else "Like removed",
+        "like_count": like_count,
+        "is_liked": liked,
+    }, status=201 if liked else 200)
+
+
+@csrf_exempt
+@require_POST
+async def api_follow_list(request, user_id):
+    """Toggle follow/unfollow for the authenticated user."""
+    try:
+        user = await aauthenticate(request)
+    except PermissionDenied as e:
+        return _forbidden(e)
+    if user is None or not user.is_authenticated:
+        return _auth_required()
+
+    if not await User.objects.filter(id=user_id).aexists():
+        return JsonResponse({"error": "User not found"}, status=404)
+
+    following, follower_count = await sync_to_async(toggle_follow)(user, user_id)
+    return JsonResponse({
+        "message": "Followed successfully" if following else "Unfollowed successfully",
+        "follower_count": follower_count,
+        "is_following": following,
+    }, status=201 if following else 200)
+
+
+@require_GET
+async def api_post_detail(request, pk):
+    """Retrieve a single post with the viewer's like in the same query."""
+    user = await aauthenticate(request)
+    posts = PostSerializer.setup_queryset(Post.objects.filter(pk=pk), user)
+    try:
+        post = await posts.aget()
+    except Post.DoesNotExist:
+        return JsonResponse({"error": "Post not found."}, status=404)
+
+    data = PostSerializer(post).data
+    if like_buffer.LIKE_BUFFER_ENABLED:
+        # Likes on hot posts may still be in the write-behind buffer
+        if user is not None and user.is_authenticated:
+            buffered = await sync_to_async(like_buffer.viewer_state)(post.pk, user.pk)
+            if buffered is not None:
+                data['is_liked'] = buffered
+        data['like_count'] += await sync_to_async(like_buffer.pending_delta)(post.pk)
+    return JsonResponse(data)
+
+
+@require_GET
+async def api_comment_list(request, post_id):
+    """List all comments for a post."""
+    user = await aauthenticate(request)
+    if not await Post.objects.filter(id=post_id).aexists():
+        return JsonResponse({"error": "Post not found"}, status=404)
+
+    comments = CommentSerializer.setup_queryset(Comment.objects.filter(post_id=post_id).order_by('created_at'), user)
+    comments = [comment async for comment in comments]
+
+    # Every comment nests the same post, so its is_liked is looked up once here
+    # and handed to the serializer rather than queried from sync code
+    liked = bool(user and user.is_authenticated) and await Like.objects.filter(post_id=post_id, user=user).aexists()
+    serializer = CommentSerializer(comments, many=True, context={'request': request, 'liked_posts': {post_id: liked}})
+    return JsonResponse(serializer.data, safe=False)
+
+
+@require_GET
+async def api_stream(request):
+    """
+    Server-Sent Events stream of activity on watched posts and authors:
+    ?posts=1,2,3&authors=4,5. Events are deltas (post.liked, post.unliked,
+    comment.added, post.created); on stream.lagged the client should refetch.
+    """
+    user = await aauthenticate(request)
+    if user is None or not user.is_authenticated:
+        return _auth_required()
+
+    try:
+        topics = [realtime.post_topic(int(i)) for i in request.GET.get('posts', '').split(',') if i]
+        topics += [realtime.author_topic(int(i)) for i in request.GET.get('authors', '').split(',') if i]
+        subscription = realtime.subscribe(topics)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    response = StreamingHttpResponse(realtime.event_stream(subscription), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # Let nginx pass events straight through
+    return response
@@ -0,0 +1,138 @@
+"""
+JWT authentication without the per-request user query.
+
+simplejwt's JWTAuthentication loads the User row on every request only to learn
+that it still exists and is active. The tokens issued here (login, signup,
+token refresh) also carry the username and the user's token version. For those,
+StatelessJWTAuthentication checks the active flag and token version against a
+small per-user cache entry and hands the view a User built from the claims:
+id, username and is_active are loaded, and any other field is read from the
+database the first time a view touches it. A view that only needs
+request.user.pk, or passes request.user to a filter or foreign key, never
+queries for the user. Tokens without the claims (issued before this change)
+fall back to the usual lookup.
+
+Revocation is by token version. revoke_tokens() bumps it (every password
+change does), which rejects every token issued before. Deactivating or
+deleting a user drops the cache entry too. Both take effect at once in this
+process, and in the others once their cached entry is AUTH_STATE_TTL seconds
+old, unless the cache alias is shared.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Profile
+
+AUTH_STATE_CACHE_ALIAS = getattr(settings, 'AUTH_STATE_CACHE_ALIAS', 'default')
+AUTH_STATE_TTL = getattr(settings, 'AUTH_STATE_TTL', 30)
+
+TOKEN_VERSION_CLAIM = 'token_version'
+# Fields of the claims user that are loaded; all others are deferred
+CLAIM_FIELDS = ('id', 'username', 'is_active')
+MISSING = ()  # Cached for users that don't exist, since the cache can't tell None from a miss
+
+
+def _cache():
+    return caches[AUTH_STATE_CACHE_ALIAS]
+
+
+def state_key(user_id):
+    return f'auth_state:{user_id}'
+
+
+def _state_query(user_id):
+    return User.objects.filter(pk=user_id).values_list('is_active', 'profile__token_version')
+
+
+def _to_state(row):
+    return (row[0], row[1] or 0) if row else MISSING
+
+
+def user_state(user_id):
+    """(is_active, token_version) of a user, or None if there is no such user. Cached for AUTH_STATE_TTL seconds."""
+    state = _cache().get(state_key(user_id))
+    if state is None:
+        state = _to_state(_state_query(user_id).first())
+        _cache().set(state_key(user_id), state, AUTH_STATE_TTL)
+    return state or None
+
+
+async def auser_state(user_id):
+    state = await _cache().aget(state_key(user_id))
+    if state is None:
+        state = _to_state(await _state_query(user_id).afirst())
+        await _cache().aset(state_key(user_id), state, AUTH_STATE_TTL)
+    return state or None
+
+
+def forget_state(user_id):
+    # Deleting before commit would let a concurrent request cache the old state again
+    transaction.on_commit(lambda: _cache().delete(state_key(user_id)))
+
+
+def revoke_tokens(user_id):
+    """Reject every token issued to the user so far ("log out everywhere")."""
+    Profile.objects.filter(user_id=user_id).update(token_version=F('token_version') + 1)
+    forget_state(user_id)
+
+
+def claims_user(validated_token):
+    """A User with only the fields the token carries loaded; reading any other field queries for it."""
+    user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+    return User.from_db(router.db_for_read(User), CLAIM_FIELDS, (user_id, validated_token['username'], True))
+
+
+class StatelessRefreshToken(RefreshToken):
+    """Refresh token whose claims, copied into every access token made from it, identify the user fully."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        state = user_state(user.pk)
+        token['username'] = user.get_username()
+        token['is_active'] = user.is_active
+        token[TOKEN_VERSION_CLAIM] = state[1] if state else 0
+        return token
+
+
+class StatelessTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = StatelessRefreshToken
+
+
+class StatelessJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that trusts the token's claims, checked against the cached user state."""
+
+    def get_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        return self.check_state(validated_token, user_state(self.user_id(validated_token)))
+
+    async def aget_user(self, validated_token):
+        if TOKEN_VERSION_CLAIM not in validated_token:
+            return await User.objects.aget(**{api_settings.USER_ID_FIELD: self.user_id(validated_token)})
+        return self.check_state(validated_token, await auser_state(self.user_id(validated_token)))
+
+    def user_id(self, validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+    def check_state(self, validated_token, state):
+        if state is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        is_active, token_version = state
+        if not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if validated_token[TOKEN_VERSION_CLAIM] != token_version:
+            raise AuthenticationFailed(_("Token has been revoked"), code="token_revoked")
+        return claims_user(validated_token)
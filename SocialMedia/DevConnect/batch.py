@@ -0,0 +1,124 @@
+"""
+POST /api/batch/: several API calls in one round trip.
+
+The body is {"requests": [{"method": "GET", "path": "/api/posts/1/", "body": {...}}, ...]}.
+Sub-requests run in order, one after the other, in this process. Each is
+resolved against the URLconf and passed straight to its view, without
+middleware. DRF's forced authentication makes it run as the batch request's
+user, so the token is checked once per batch. All sub-requests share one
+object_cache.local_scope(), so a post or user card that several of them read
+is fetched once.
+
+The reply is {"responses": [{"status": ..., "body": ...}]}, in the same order.
+A failing sub-request fails alone.
+
+A batch takes at most BATCH_MAX_REQUESTS sub-requests. Once BATCH_MAX_SECONDS
+have passed, any that haven't started get a 504 instead of running; one that
+is already running is not interrupted. Only synchronous views under /api/ can
+be batched.
+"""
+import io
+import json
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+
+from . import object_cache
+
+BATCH_MAX_REQUESTS = getattr(settings, 'BATCH_MAX_REQUESTS', 20)
+BATCH_MAX_SECONDS = getattr(settings, 'BATCH_MAX_SECONDS', 5.0)
+BATCH_METHODS = ('GET', 'POST', 'PUT', 'PATCH', 'DELETE')
+# Batches within batches, uploads too long-running to share a time limit, and file downloads
+BATCH_EXCLUDED_VIEWS = {'api_batch', 'api_import_users', 'api_export_download'}
+
+# Request details a sub-request doesn't inherit from the batch request
+NOT_INHERITED = {
+    'REQUEST_METHOD', 'PATH_INFO', 'QUERY_STRING', 'CONTENT_TYPE', 'CONTENT_LENGTH',
+    'HTTP_AUTHORIZATION', 'HTTP_COOKIE', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'wsgi.input',
+}
+
+logger = logging.getLogger(__name__)
+
+
+class BatchError(ValueError):
+    pass
+
+
+def _error(status, message):
+    return {"status": status, "body": {"error": message}}
+
+
+def _sub_request(request, method, path, body):
+    path, _, query = path.partition('?')
+    payload = json.dumps(body).encode() if body is not None else b''
+    environ = {key: value for key, value in request.META.items() if key not in NOT_INHERITED}
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub = WSGIRequest(environ)
+    # DRF authenticates a request carrying these as this user, without running the authentication classes
+    sub._force_auth_user = request.user
+    sub._force_auth_token = request.auth
+    return sub
+
+
+def _body(response):
+    if hasattr(response, 'data'):
+        return response.data  # DRF responses: no need to render them only to parse them back
+    content = b''.join(response.streaming_content) if response.streaming else response.content
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(content)
+    return content.decode(response.charset)
+
+
+def _run(request, spec):
+    if not isinstance(spec, dict):
+        return _error(400, "Each request must be an object.")
+    method = str(spec.get('method', 'GET')).upper()
+    path = spec.get('path')
+    if method not in BATCH_METHODS:
+        return _error(405, f"Method {method} is not allowed in a batch.")
+    if not isinstance(path, str) or not path.startswith('/api/'):
+        return _error(400, "Each request needs a path under /api/.")
+
+    try:
+        match = resolve(path.partition('?')[0])
+    except Resolver404:
+        return _error(404, "Not found.")
+    if match.url_name in BATCH_EXCLUDED_VIEWS or iscoroutinefunction(match.func):
+        return _error(400, f"{match.route} can't be used in a batch.")
+
+    try:
+        response = match.func(_sub_request(request, method, path, spec.get('body')), *match.args, **match.kwargs)
+    except Exception:
+        logger.exception("Batched request %s %s failed", method, path)
+        return _error(500, "Internal server error.")
+    return {"status": response.status_code, "body": _body(response)}
+
+
+def run_batch(request, specs):
+    """Run the sub-requests described by specs as request's user; returns their responses in order."""
+    if not isinstance(specs, list) or not specs:
+        raise BatchError("'requests' must be a non-empty list.")
+    if len(specs) > BATCH_MAX_REQUESTS:
+        raise BatchError(f"A batch can have at most {BATCH_MAX_REQUESTS} requests.")
+
+    deadline = time.monotonic() + BATCH_MAX_SECONDS
+    responses = []
+    with object_cache.local_scope():
+        for spec in specs:
+            if time.monotonic() >= deadline:
+                responses.append(_error(504, "The batch ran out of time before this request."))
+            else:
+                responses.append(_run(request, spec))
+    return responses
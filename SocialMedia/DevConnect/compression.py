@@ -0,0 +1,124 @@
+"""
+Response compression negotiated from Accept-Encoding.
+
+CompressionMiddleware stands in for django.middleware.gzip.GZipMiddleware.
+It uses brotli for JSON when the client accepts "br" and the 'brotli'
+package is installed, and gzip otherwise. Django's rules still apply: responses
+under 200 bytes and responses that are already encoded are left alone, Vary:
+Accept-Encoding is set, and strong ETags are made weak.
+
+Every gzip response, streamed or not, carries Django's BREACH mitigation: a
+random-length file name in the gzip header, so the compressed size of a page
+holding a secret (the CSRF token in a form) doesn't reveal how well an
+attacker's guess matched it. Brotli has no such field, so it is only used for
+the API's JSON (BROTLI_CONTENT_TYPES), which holds no CSRF token; HTML pages
+are always gzipped.
+
+Streamed responses are compressed chunk by chunk, with a flush after each
+chunk. The client gets the first rows as soon as they are written, instead of
+waiting until the compressor has a full block. Async streams (the SSE endpoint)
+are left uncompressed: their events are small and must arrive immediately.
+"""
+import secrets
+import struct
+import zlib
+
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_MIN_LENGTH = getattr(settings, 'COMPRESSION_MIN_LENGTH', 200)
+# 11 is the maximum, but far too slow for responses built per request
+COMPRESSION_BROTLI_QUALITY = getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 5)
+
+# The only responses brotli is used for, since it can't be padded (see above)
+BROTLI_CONTENT_TYPES = ('application/json', 'application/x-ndjson')
+# Already compressed: another pass only costs CPU
+INCOMPRESSIBLE_TYPES = ('application/zip', 'application/gzip', 'image/', 'video/', 'audio/')
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b")
+re_accepts_gzip = _lazy_re_compile(r"\bgzip\b")
+
+
+def negotiate(accept_encoding, allow_brotli=True):
+    """The encoding to use for a client sending this Accept-Encoding, or None."""
+    if allow_brotli and brotli is not None and re_accepts_br.search(accept_encoding):
+        return 'br'
+    if re_accepts_gzip.search(accept_encoding):
+        return 'gzip'
+    return None
+
+
+def gzip_header(max_random_bytes):
+    """A gzip member header whose file name is 0 to max_random_bytes - 1 bytes long, as Django pads it."""
+    filename = b'a' * secrets.randbelow(max_random_bytes)
+    # Deflate, FNAME set, no mtime, unknown OS
+    return b'\x1f\x8b\x08\x08' + b'\x00' * 4 + b'\x00\xff' + filename + b'\x00'
+
+
+def gzip_stream(chunks, max_random_bytes):
+    yield gzip_header(max_random_bytes)
+    compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)  # Django's level; raw deflate, framed here
+    crc, size = 0, 0
+    for chunk in chunks:
+        crc, size = zlib.crc32(chunk, crc), size + len(chunk)
+        data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+    yield compressor.flush() + struct.pack('<II', crc, size & 0xffffffff)
+
+
+def brotli_stream(chunks):
+    compressor = brotli.Compressor(quality=COMPRESSION_BROTLI_QUALITY)
+    for chunk in chunks:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+class CompressionMiddleware(GZipMiddleware):
+    def process_response(self, request, response):
+        if response.has_header("Content-Encoding") or response.get("Content-Type", "").startswith(INCOMPRESSIBLE_TYPES):
+            return response
+        if response.streaming and response.is_async:
+            return response
+        if not response.streaming and len(response.content) < COMPRESSION_MIN_LENGTH:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        encoding = negotiate(
+            request.META.get("HTTP_ACCEPT_ENCODING", ""),
+            allow_brotli=response.get("Content-Type", "").startswith(BROTLI_CONTENT_TYPES),
+        )
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if encoding == 'br':
+                response.streaming_content = brotli_stream(response.streaming_content)
+            else:
+                response.streaming_content = gzip_stream(response.streaming_content, self.max_random_bytes)
+            del response.headers["Content-Length"]
+        else:
+            if encoding == 'br':
+                compressed = brotli.compress(response.content, quality=COMPRESSION_BROTLI_QUALITY)
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers["Content-Length"] = str(len(compressed))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
@@ -0,0 +1,109 @@
+"""
+Conditional GET (ETag, Last-Modified and 304 Not Modified) for the read endpoints.
+
+The validators are built from a few columns and counters, read with one query
+or from the cache. The payload is never serialized just to hash it. A client
+that sends If-None-Match or If-Modified-Since with a current copy gets a 304
+with no body, and its refresh costs that single lookup.
+
+What each ETag covers:
+
+* a post: its row (updated_at and counters), its author's name and email, the
+  newest like and comment on it, and whether the viewer likes it;
+* the post list: a version number kept in the cache. The signal handlers bump
+  it once any post, like, comment, or author name or email changes is
+  committed, so checking it never touches the posts table;
+* a post's comments: the post's version as above, which includes its newest
+  comment and comment count;
+* a profile: the cached user card.
+
+ETags are weak (the JSON rendering of equal data may differ byte for byte) and
+include the viewer, since is_liked is per viewer. Last-Modified, where sent, is
+the newest edit, like or comment. An unlike or deletion leaves it unchanged and
+only changes the ETag, so clients should revalidate with If-None-Match.
+"""
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import OuterRef, Subquery
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from .models import Comment, Like, Post
+from .object_cache import OBJECT_CACHE_ALIAS
+
+POST_LIST_VERSION_KEY = 'post_list_version'
+
+
+def make_etag(*parts):
+    return 'W/"%s"' % hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+def newest(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp is not None), default=None)
+
+
+def not_modified(request, etag, last_modified=None):
+    """The 304 to send if the client's copy of a GET is current, else None."""
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+    return with_validators(response, etag, last_modified) if response is not None else None
+
+
+def with_validators(response, etag, last_modified=None):
+    response.headers['ETag'] = etag
+    if last_modified:
+        response.headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def _newest(model, field, **filters):
+    return Subquery(model.objects.filter(**filters).order_by(f'-{field}').values(field)[:1])
+
+
+def post_version(post_id, viewer):
+    """
+    What a post's representation depends on, as a dict, from one indexed query;
+    None if there is no such post. Includes the viewer's is_liked.
+    """
+    return (
+        Post.objects.filter(pk=post_id)
+        .with_is_liked(viewer)
+        .annotate(
+            last_like=_newest(Like, 'created_at', post=OuterRef('pk')),
+            last_comment=_newest(Comment, 'created_at', post=OuterRef('pk')),
+        )
+        .values(
+            'updated_at', 'like_count', 'comment_count', 'author__username', 'author__email',
+            'last_like', 'last_comment', 'is_liked',
+        )
+        .first()
+    )
+
+
+def post_list_version():
+    """The current version of the whole post list (apart from the viewer), from one cache read."""
+    cache = caches[OBJECT_CACHE_ALIAS]
+    version = cache.get(POST_LIST_VERSION_KEY)
+    if version is None:
+        # Lost or never set: start a series that can't repeat a version handed out before
+        cache.add(POST_LIST_VERSION_KEY, time.time_ns(), timeout=None)
+        version = cache.get(POST_LIST_VERSION_KEY)
+    return version
+
+
+def bump_post_list():
+    """Give the post list a new version once the current transaction commits."""
+    def bump():
+        try:
+            caches[OBJECT_CACHE_ALIAS].incr(POST_LIST_VERSION_KEY)
+        except ValueError:
+            pass  # No version yet, the next read starts one
+
+    # Not before: a read in between would store the old rows under the new version
+    transaction.on_commit(bump, robust=True)
@@ -0,0 +1,19 @@
+"""
+Exact counts behind the denormalized counters (Post.like_count,
+Profile.follower_count, ...). Signals keep the stored values current with F()
+updates; count_of() recomputes them from the rows when they drift.
+"""
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_of(model, field, outer='pk'):
+    """Correlated COUNT(*) of `model` rows whose `field` points at the outer row."""
+    counted = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
@@ -0,0 +1,233 @@
+"""
+Read replicas with read-your-writes.
+
+ReplicaRouter sends the reads of API and template requests to the databases
+listed in DATABASE_REPLICAS, round-robin. Everything else goes to default:
+writes, anything outside a request (management commands, background work),
+reads inside a transaction, and sessions. ReplicaRoutingMiddleware marks the
+request so the router can tell which reads are safe.
+
+Read-your-writes: once a request writes, its remaining reads use the primary.
+The client (its Authorization header, or its session cookie) is then pinned to
+the primary for REPLICA_PIN_SECONDS, through the cache named by
+REPLICA_PIN_CACHE_ALIAS, so the post or like it just made is there on the next
+page. With several worker processes that cache must be shared.
+
+Lag: a background thread in each process (started by the first routed read)
+writes the time to the ReplicaHeartbeat row on the primary every
+REPLICA_LAG_CHECK_INTERVAL seconds and reads the row back from every replica.
+Routing only looks at the thread's last result, so no request waits on a slow
+or unreachable replica. A replica whose copy is more than REPLICA_MAX_LAG
+seconds older than the previous beat, or that can't be reached, gets no reads
+until a later check finds it caught up. So is a replica whose lag can't be
+measured yet: until a beat recent enough to compare with is on the primary,
+reads go to the primary. If the last result is older than
+REPLICA_LAG_CHECK_INTERVAL + REPLICA_MAX_LAG (the thread is stuck connecting to
+a replica, or died), it isn't trusted either, so give replica connections a
+connect timeout shorter than that. When no replica is usable, reads go to the
+primary.
+
+The middleware runs natively in both sync and async requests, so async views
+under ASGI aren't pushed through a thread adapter.
+"""
+import hashlib
+import itertools
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, close_old_connections, connections
+from django.utils import timezone
+
+DATABASE_REPLICAS = getattr(settings, 'DATABASE_REPLICAS', [])
+REPLICA_PIN_SECONDS = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+REPLICA_PIN_CACHE_ALIAS = getattr(settings, 'REPLICA_PIN_CACHE_ALIAS', 'default')
+REPLICA_MAX_LAG = getattr(settings, 'REPLICA_MAX_LAG', 5)
+REPLICA_LAG_CHECK_INTERVAL = getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 2)
+REPLICA_LAG_CHECK_THREAD = getattr(settings, 'REPLICA_LAG_CHECK_THREAD', True)
+# Apps whose reads always use the primary: a session read from a lagging replica logs the user out
+REPLICA_EXCLUDED_APPS = getattr(settings, 'REPLICA_EXCLUDED_APPS', {'sessions'})
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+logger = logging.getLogger(__name__)
+
+
+class RequestState:
+    __slots__ = ('pinned', 'wrote')
+
+    def __init__(self, pinned):
+        self.pinned = pinned  # Read from the primary only
+        self.wrote = False
+
+
+_request = ContextVar('replica_request', default=None)
+
+
+def pin_key(client):
+    return 'replica_pin:' + hashlib.sha256(client.encode()).hexdigest()[:32]
+
+
+def client_key(request):
+    """What identifies the client across requests, or None for anonymous ones (which don't write)."""
+    return request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+
+
+def replica_lags():
+    """
+    Beat on the primary and return {replica alias: seconds behind the previous beat,
+    or None if it can't be read or there is no recent beat to compare with}.
+    """
+    from .models import ReplicaHeartbeat
+
+    primary = ReplicaHeartbeat.objects.using(DEFAULT_DB_ALIAS)
+    previous = primary.filter(pk=1).values_list('beat', flat=True).first()
+    if not primary.filter(pk=1).update(beat=timezone.now()):
+        primary.bulk_create([ReplicaHeartbeat(pk=1, beat=timezone.now())], ignore_conflicts=True)
+
+    # A replica holding an old beat says nothing about its lag now. The first check
+    # of a fresh database, or after nobody beat for a while, has to wait for the next.
+    if previous is None or (timezone.now() - previous).total_seconds() > REPLICA_LAG_CHECK_INTERVAL + REPLICA_MAX_LAG:
+        return dict.fromkeys(DATABASE_REPLICAS)
+
+    lags = {}
+    for alias in DATABASE_REPLICAS:
+        try:
+            beat = ReplicaHeartbeat.objects.using(alias).filter(pk=1).values_list('beat', flat=True).first()
+        except DatabaseError:
+            lags[alias] = None
+            continue
+        if beat is None:
+            lags[alias] = None
+        else:
+            lags[alias] = max(0.0, (previous - beat).total_seconds())
+    return lags
+
+
+class ReplicaRouter:
+    def __init__(self):
+        self._counter = itertools.count()
+        self._healthy = []
+        self._checked_at = None  # time.monotonic() of the last check
+        self._checker = None
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Measure replica lag now and keep the replicas fit for reads. Returns them."""
+        healthy = [alias for alias, lag in replica_lags().items() if lag is not None and lag <= REPLICA_MAX_LAG]
+        self._healthy, self._checked_at = healthy, time.monotonic()
+        return healthy
+
+    def run_checker(self, stop=None):
+        """Check every REPLICA_LAG_CHECK_INTERVAL seconds until stop is set."""
+        while not (stop and stop.is_set()):
+            try:
+                self.check()
+            except Exception:
+                # Not trusted once it's too old, so reads fall back to the primary
+                logger.exception("Replica lag check failed")
+            finally:
+                close_old_connections()
+            time.sleep(REPLICA_LAG_CHECK_INTERVAL)
+
+    def _ensure_checker(self):
+        if not REPLICA_LAG_CHECK_THREAD or (self._checker is not None and self._checker.is_alive()):
+            return
+        with self._lock:
+            if self._checker is None or not self._checker.is_alive():
+                self._checker = threading.Thread(target=self.run_checker, name='replica-lag-check', daemon=True)
+                self._checker.start()
+
+    def healthy_replicas(self):
+        """The replicas the last check found caught up, or none if that check is too old to go by."""
+        self._ensure_checker()
+        checked_at = self._checked_at
+        if checked_at is None or time.monotonic() - checked_at > REPLICA_LAG_CHECK_INTERVAL + REPLICA_MAX_LAG:
+            return []
+        return self._healthy
+
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        if (
+            state is None or state.pinned or state.wrote or not DATABASE_REPLICAS
+            or model._meta.app_label in REPLICA_EXCLUDED_APPS
+            or connections[DEFAULT_DB_ALIAS].in_atomic_block  # A transaction must see its own writes
+        ):
+            return DEFAULT_DB_ALIAS
+        replicas = self.healthy_replicas()
+        if not replicas:
+            return DEFAULT_DB_ALIAS
+        return replicas[next(self._counter) % len(replicas)]
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state is not None:
+            state.wrote = True
+        # Explicitly, or Django would write an object read from a replica back to that replica
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return False if db in DATABASE_REPLICAS else None
+
+
+class ReplicaRoutingMiddleware:
+    """Lets ReplicaRouter route this request's reads, and pins the client to the primary after a write."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        client = client_key(request)
+        pins = caches[REPLICA_PIN_CACHE_ALIAS]
+        pinned = request.method not in SAFE_METHODS or bool(client and pins.get(pin_key(client)))
+
+        state = RequestState(pinned)
+        token = _request.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+
+        if state.wrote and client:
+            pins.set(pin_key(client), True, REPLICA_PIN_SECONDS)
+        return response
+
+    async def __acall__(self, request):
+        client = client_key(request)
+        pins = caches[REPLICA_PIN_CACHE_ALIAS]
+        pinned = request.method not in SAFE_METHODS or bool(client and await pins.aget(pin_key(client)))
+
+        # Set in this task's context, which sync_to_async carries into the threads running the ORM
+        state = RequestState(pinned)
+        token = _request.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+
+        if state.wrote and client:
+            await pins.aset(pin_key(client), True, REPLICA_PIN_SECONDS)
+        return response
@@ -0,0 +1,255 @@
+"""
+Personal data exports: everything a user has put into DevConnect, as a zip of NDJSON files.
+
+request_export() records a DataExport, and a background thread in this
+process runs it (EXPORT_THREAD). `manage.py run_exports --loop` can run
+exports in their own process instead, and picks up any left behind.
+
+run() writes one NDJSON file per section (account, posts, comments, likes,
+following, followers) in EXPORT_ROOT/<export id>/. Each section is read in
+primary key order in keyset pages of EXPORT_CHUNK_SIZE rows, each page a
+separate query starting after the last id written, and each page is written
+before the next is read. Nothing is held in memory beyond one page, including
+on MySQL, where .iterator() would buffer the whole section client-side.
+
+After each chunk the file is flushed to disk and the export checkpointed:
+section, last primary key written, file length and rows written. The
+heartbeat shows the export is alive. A worker that dies leaves a running export
+with a heartbeat older than EXPORT_STALE_AFTER. Whoever runs it next (the
+worker loop, or the user asking again) cuts the section file back to the
+checkpointed length and continues after the last id. A failed export is resumed
+the same way.
+
+Once every section is written, the files are copied into
+EXPORT_ROOT/<export id>.zip, again in chunks, and removed. A DONE export's
+archive is kept for EXPORT_KEEP_DAYS; run_exports deletes older ones.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import zipfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Comment, DataExport, Follow, Like, Post
+from .renderers import dumps
+
+logger = logging.getLogger(__name__)
+
+EXPORT_ROOT = getattr(settings, 'EXPORT_ROOT', os.path.join(settings.BASE_DIR, 'exports'))
+EXPORT_CHUNK_SIZE = getattr(settings, 'EXPORT_CHUNK_SIZE', 2000)
+EXPORT_STALE_AFTER = getattr(settings, 'EXPORT_STALE_AFTER', 300)
+EXPORT_KEEP_DAYS = getattr(settings, 'EXPORT_KEEP_DAYS', 7)
+EXPORT_THREAD = getattr(settings, 'EXPORT_THREAD', True)
+
+COPY_BUFFER_BYTES = 1024 * 1024
+
+# (file name, rows of a user's data); each queryset is read in pk order from a checkpoint
+SECTIONS = [
+    ('account', lambda user_id: User.objects.filter(pk=user_id).values(
+        'id', 'username', 'email', 'first_name', 'last_name', 'date_joined', 'last_login', bio=F('profile__bio'),
+    )),
+    ('posts', lambda user_id: Post.objects.filter(author_id=user_id).values(
+        'id', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count',
+    )),
+    ('comments', lambda user_id: Comment.objects.filter(author_id=user_id).values(
+        'id', 'post_id', 'content', 'created_at',
+    )),
+    ('likes', lambda user_id: Like.objects.filter(user_id=user_id).values('id', 'post_id', 'created_at')),
+    ('following', lambda user_id: Follow.objects.filter(follower_id=user_id).values(
+        'id', 'following_id', 'created_at', following_username=F('following__username'),
+    )),
+    ('followers', lambda user_id: Follow.objects.filter(following_id=user_id).values(
+        'id', 'follower_id', 'created_at', follower_username=F('follower__username'),
+    )),
+]
+
+
+def work_dir(export):
+    return os.path.join(EXPORT_ROOT, str(export.pk))
+
+
+def archive_path(export):
+    return os.path.join(EXPORT_ROOT, f'{export.pk}.zip')
+
+
+def progress(export):
+    """What the API reports about an export."""
+    if export.status == DataExport.DONE:
+        percent = 100.0
+    else:
+        percent = round(100 * export.rows_written / export.rows_total, 1) if export.rows_total else 0.0
+    return {
+        "id": export.pk,
+        "status": export.status,
+        "section": SECTIONS[export.section][0] if export.section < len(SECTIONS) else None,
+        "rows_written": export.rows_written,
+        "rows_total": export.rows_total,
+        "percent": percent,
+        "created_at": export.created_at,
+        "finished_at": export.finished_at,
+        "error": export.error or None,
+    }
+
+
+def request_export(user, background=None):
+    """
+    The user's unfinished export, resumed if it failed, or a new one. It is
+    started in a background thread if background (default EXPORT_THREAD) is set.
+    """
+    if background is None:
+        background = EXPORT_THREAD
+    with transaction.atomic():
+        export = (
+            DataExport.objects.select_for_update()
+            .filter(user=user).exclude(status=DataExport.DONE).order_by('-pk').first()
+        )
+        if export is None:
+            export = DataExport.objects.create(user=user)
+        elif export.status == DataExport.FAILED:
+            export.status, export.error = DataExport.PENDING, ''
+            export.save(update_fields=['status', 'error'])
+    if background:
+        transaction.on_commit(lambda: start(export.pk))
+    return export
+
+
+def start(export_id):
+    threading.Thread(target=_run_in_thread, args=(export_id,), name=f'data-export-{export_id}', daemon=True).start()
+
+
+def _run_in_thread(export_id):
+    try:
+        run(export_id)
+    finally:
+        close_old_connections()
+
+
+def claimable():
+    """Exports nobody is running: pending ones, and running ones whose worker stopped checkpointing."""
+    stale = timezone.now() - timedelta(seconds=EXPORT_STALE_AFTER)
+    return DataExport.objects.filter(
+        Q(status=DataExport.PENDING) | Q(status=DataExport.RUNNING, heartbeat__lt=stale)
+    )
+
+
+def claim(export_id):
+    """Mark an export as running by this worker; False if it isn't claimable (someone else has it)."""
+    return bool(claimable().filter(pk=export_id).update(status=DataExport.RUNNING, heartbeat=timezone.now()))
+
+
+def run(export_id, report=None):
+    """
+    Claim an export and write it, from its last checkpoint, to the end. report,
+    if given, is called with the export after every checkpoint. Returns the
+    export, or None if it wasn't claimable.
+    """
+    if not claim(export_id):
+        return None
+    export = DataExport.objects.get(pk=export_id)
+    try:
+        if export.rows_total is None:
+            export.rows_total = sum(rows(export.user_id).count() for _, rows in SECTIONS)
+            export.save(update_fields=['rows_total'])
+        os.makedirs(work_dir(export), exist_ok=True)
+        while export.section < len(SECTIONS):
+            write_section(export, report)
+        assemble(export)
+    except Exception as e:
+        logger.exception("Data export %s failed", export.pk)
+        export.status, export.error = DataExport.FAILED, f"{type(e).__name__}: {e}"
+        export.save(update_fields=['status', 'error'])
+        return export
+
+    export.status, export.finished_at = DataExport.DONE, timezone.now()
+    export.save(update_fields=['status', 'finished_at'])
+    return export
+
+
+def _checkpoint(export, report, **fields):
+    for name, value in fields.items():
+        setattr(export, name, value)
+    export.heartbeat = timezone.now()
+    export.save(update_fields=[*fields, 'heartbeat'])
+    if report:
+        report(export)
+
+
+def write_section(export, report=None):
+    """Append the rows of the export's current section after its checkpoint, then move to the next section."""
+    name, section_rows = SECTIONS[export.section]
+    path = os.path.join(work_dir(export), f'{name}.ndjson')
+    rows = section_rows(export.user_id).order_by('pk')
+
+    with open(path, 'ab') as out:
+        if out.tell() < export.offset:
+            raise RuntimeError(f"{path} is shorter than its checkpoint")
+        out.truncate(export.offset)  # Drops whatever was written after the last checkpoint
+        while True:
+            page = list(rows.filter(pk__gt=export.last_id)[:EXPORT_CHUNK_SIZE])
+            if page:
+                _flush(export, report, out, [dumps(row) + b'\n' for row in page], page[-1]['id'])
+            if len(page) < EXPORT_CHUNK_SIZE:
+                break
+    _checkpoint(export, report, section=export.section + 1, last_id=0, offset=0)
+
+
+def _flush(export, report, out, lines, last_id):
+    out.writelines(lines)
+    out.flush()
+    os.fsync(out.fileno())  # On disk before the checkpoint says it is
+    _checkpoint(
+        export, report, last_id=last_id, offset=out.tell(), rows_written=export.rows_written + len(lines),
+    )
+
+
+def assemble(export):
+    """Zip the section files (written to a temporary name first, so a crash leaves no half archive) and remove them."""
+    directory = work_dir(export)
+    partial = archive_path(export) + '.part'
+    with zipfile.ZipFile(partial, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, _ in SECTIONS:
+            with open(os.path.join(directory, f'{name}.ndjson'), 'rb') as source, \
+                    archive.open(f'{name}.ndjson', 'w', force_zip64=True) as target:
+                shutil.copyfileobj(source, target, COPY_BUFFER_BYTES)
+        archive.writestr('manifest.json', json.dumps({
+            "user_id": export.user_id,
+            "export_id": export.pk,
+            "created_at": export.created_at.isoformat(),
+            "files": [f'{name}.ndjson' for name, _ in SECTIONS],
+            "rows": export.rows_written,
+        }, indent=2))
+    os.replace(partial, archive_path(export))
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def run_pending(report=None):
+    """Run every claimable export, oldest first; returns how many were run."""
+    count = 0
+    for export_id in claimable().order_by('pk').values_list('pk', flat=True):
+        if run(export_id, report) is not None:
+            count += 1
+    return count
+
+
+def delete_expired():
+    """Delete exports finished more than EXPORT_KEEP_DAYS ago, with their archives; returns how many."""
+    expired = DataExport.objects.filter(
+        status=DataExport.DONE, finished_at__lt=timezone.now() - timedelta(days=EXPORT_KEEP_DAYS),
+    )
+    count = 0
+    for export in expired:
+        try:
+            os.remove(archive_path(export))
+        except FileNotFoundError:
+            pass
+        export.delete()
+        count += 1
+    return count
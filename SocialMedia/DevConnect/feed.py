@@ -0,0 +1,106 @@
+"""
+Per-user home timelines.
+
+New posts are pushed into the timeline of every follower when they are
+created (fan-out-on-write). Authors with at least FEED_CELEBRITY_THRESHOLD
+followers are skipped at write time and their posts are pulled in when the
+timeline is read (fan-out-on-read), so one post never means millions of rows.
+"""
+from django.conf import settings
+
+from .models import Follow, Post, Profile, TimelineEntry
+
+FEED_PAGE_SIZE = getattr(settings, 'FEED_PAGE_SIZE', 20)
+FEED_MAX_PAGE_SIZE = getattr(settings, 'FEED_MAX_PAGE_SIZE', 100)
+FEED_CELEBRITY_THRESHOLD = getattr(settings, 'FEED_CELEBRITY_THRESHOLD', 10000)
+FEED_FANOUT_BATCH_SIZE = getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+FEED_BACKFILL_SIZE = getattr(settings, 'FEED_BACKFILL_SIZE', 50)
+
+
+def celebrity_ids(user_ids):
+    """Return the subset of user_ids whose follower count puts them on the fan-out-on-read path."""
+    return set(
+        Profile.objects.filter(user_id__in=user_ids, follower_count__gte=FEED_CELEBRITY_THRESHOLD)
+        .values_list('user_id', flat=True)
+    )
+
+
+def fan_out_post(post):
+    """Write a new post into its author's timeline and, unless the author is a celebrity, every follower's."""
+    TimelineEntry.objects.get_or_create(owner_id=post.author_id, post_id=post.id)
+
+    if post.author_id in celebrity_ids([post.author_id]):
+        return
+
+    follower_ids = (
+        Follow.objects.filter(following_id=post.author_id)
+        .values_list('follower_id', flat=True)
+        .iterator(chunk_size=FEED_FANOUT_BATCH_SIZE)
+    )
+    batch = []
+    for follower_id in follower_ids:
+        batch.append(TimelineEntry(owner_id=follower_id, post_id=post.id))
+        if len(batch) >= FEED_FANOUT_BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_follow(follower_id, following_id):
+    """Copy the most recent posts of a newly followed user into the follower's timeline."""
+    if following_id in celebrity_ids([following_id]):
+        return
+
+    post_ids = (
+        Post.objects.filter(author_id=following_id)
+        .order_by('-id')
+        .values_list('id', flat=True)[:FEED_BACKFILL_SIZE]
+    )
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(owner_id=follower_id, post_id=post_id) for post_id in post_ids],
+        ignore_conflicts=True,
+    )
+
+
+def remove_follow(follower_id, following_id):
+    """Drop an unfollowed user's posts from the follower's timeline."""
+    TimelineEntry.objects.filter(owner_id=follower_id, post__author_id=following_id).delete()
+
+
+def read_timeline(user, cursor=None, limit=FEED_PAGE_SIZE):
+    """
+    Return one page of the user's timeline, newest first, and the cursor for the next page.
+
+    The cursor is the id of the last post on the previous page; ids grow with
+    creation time so "id < cursor" is a keyset seek on the timeline index.
+    """
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+
+    entries = TimelineEntry.objects.filter(owner=user)
+    if cursor is not None:
+        entries = entries.filter(post_id__lt=cursor)
+    post_ids = set(entries.order_by('-post_id').values_list('post_id', flat=True)[:limit])
+
+    followee_ids = Follow.objects.filter(follower=user).values_list('following_id', flat=True)
+    celebrities = celebrity_ids(followee_ids)
+    if celebrities:
+        pulled = Post.objects.filter(author_id__in=celebrities)
+        if cursor is not None:
+            pulled = pulled.filter(id__lt=cursor)
+        post_ids.update(pulled.order_by('-id').values_list('id', flat=True)[:limit])
+
+    page_ids = sorted(post_ids, reverse=True)[:limit]
+    posts = Post.objects.filter(id__in=page_ids).with_is_liked(user).select_related('author').order_by('-id')
+    next_cursor = page_ids[-1] if len(page_ids) == limit else None
+    return list(posts), next_cursor
+
+
+def page_of_posts(queryset, cursor=None, limit=FEED_PAGE_SIZE):
+    """Keyset-paginate any Post queryset newest first; returns (posts, next_cursor) like read_timeline."""
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+    if cursor is not None:
+        queryset = queryset.filter(id__lt=cursor)
+    posts = list(queryset.order_by('-id')[:limit + 1])
+    next_cursor = posts[limit - 1].id if len(posts) > limit else None
+    return posts[:limit], next_cursor
@@ -0,0 +1,70 @@
+"""
+Reading the follow graph one page at a time.
+
+Follower and following lists are keyset-paginated on (created_at, id), newest
+first, which the (following, created_at) and (follower, created_at) indexes
+serve directly. Each page is one query that joins in the usernames, and the
+totals come from the counters on Profile, so a user with millions of followers
+costs the same two queries as anyone else.
+"""
+import base64
+
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils.dateparse import parse_datetime
+
+from .models import Follow, Profile
+from .search import InvalidCursor
+
+FOLLOW_PAGE_SIZE = getattr(settings, 'FOLLOW_PAGE_SIZE', 50)
+FOLLOW_MAX_PAGE_SIZE = getattr(settings, 'FOLLOW_MAX_PAGE_SIZE', 200)
+
+# direction -> (column pointing at the user whose list it is, column pointing at the listed users)
+DIRECTIONS = {
+    'followers': ('following', 'follower'),
+    'following': ('follower', 'following'),
+}
+
+
+def encode_cursor(created_at, follow_id):
+    return base64.urlsafe_b64encode(f'{created_at.isoformat()}|{follow_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        created_at, follow_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        created_at = parse_datetime(created_at)
+        if created_at is None:
+            raise ValueError(cursor)
+        return created_at, int(follow_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+def follow_counts(user_id):
+    """(follower_count, following_count) from the stored counters, or None for an unknown user."""
+    return Profile.objects.filter(user_id=user_id).values_list('follower_count', 'following_count').first()
+
+
+def follow_page(user_id, direction, cursor=None, limit=FOLLOW_PAGE_SIZE):
+    """
+    One page of a user's followers or followings, most recent first.
+    Returns ([{"id", "username", "followed_at"}], next_cursor).
+    """
+    owner, listed = DIRECTIONS[direction]
+    limit = max(1, min(limit, FOLLOW_MAX_PAGE_SIZE))
+
+    follows = Follow.objects.filter(**{owner: user_id})
+    if cursor:
+        created_at, follow_id = decode_cursor(cursor)
+        follows = follows.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=follow_id))
+
+    rows = list(
+        follows.order_by('-created_at', '-id')
+        .values('id', 'created_at', user_id=F(f'{listed}_id'), username=F(f'{listed}__username'))[:limit + 1]
+    )
+    next_cursor = encode_cursor(rows[limit - 1]['created_at'], rows[limit - 1]['id']) if len(rows) > limit else None
+    return [
+        {"id": row['user_id'], "username": row['username'], "followed_at": row['created_at']}
+        for row in rows[:limit]
+    ], next_cursor
@@ -0,0 +1,222 @@
+"""
+Per-request SQL and timing instrumentation.
+
+Add 'DevConnect.instrumentation.RequestTimingMiddleware' to MIDDLEWARE to get,
+for a sample of requests:
+
+* query count, total database time and the slowest statements, from a
+  connection execute_wrapper (works with DEBUG off, nothing is kept beyond
+  the request);
+* serialization time (DRF serializer .data and JSON rendering) and template
+  render time;
+* for a streamed response, the time and queries spent producing the body
+  after the view returned (the whole serialization of a streamed list). The
+  Server-Timing header has already gone out by then, so these only show in
+  the log record, written once the body is sent;
+* a Server-Timing response header with those numbers, which browser dev tools
+  show next to the request;
+* a structured log record on the "DevConnect.instrumentation" logger when a
+  request is slower than INSTRUMENTATION_SLOW_REQUEST_MS, or when the same SQL
+  ran INSTRUMENTATION_N_PLUS_ONE_THRESHOLD times or more (a likely N+1).
+
+Requests outside the sample (INSTRUMENTATION_SAMPLE_RATE) cost one random
+number, so it can stay on in production at a low rate.
+"""
+import json
+import logging
+import random
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+from django.http import FileResponse
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+
+
+class RequestProfile:
+    """What one sampled request spent its time on."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []  # (sql, seconds, alias)
+        self.timings = Counter()  # kind -> seconds, for 'serialize' and 'template'
+        self._depth = Counter()  # Nested timed calls of a kind are only counted once
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started, context['connection'].alias))
+
+    @property
+    def db_time(self):
+        return sum(duration for _, duration, _ in self.queries)
+
+    def repeated_queries(self, threshold):
+        """SQL statements (with placeholders) that ran at least threshold times, most repeated first."""
+        counts = Counter(sql for sql, _, _ in self.queries)
+        return [(sql, n) for sql, n in counts.most_common() if n >= threshold]
+
+    def slowest_queries(self, limit):
+        return sorted(self.queries, key=lambda query: query[1], reverse=True)[:limit]
+
+
+def _timed(kind, func):
+    """Wrap func so the time spent in it is added to the current request's profile."""
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return func(*args, **kwargs)
+        profile._depth[kind] += 1
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profile._depth[kind] -= 1
+            if not profile._depth[kind]:
+                profile.timings[kind] += time.perf_counter() - started
+
+    wrapper._instrumented = True
+    return wrapper
+
+
+def _instrument(cls, name, kind):
+    attr = cls.__dict__[name]
+    if isinstance(attr, property):
+        if not getattr(attr.fget, '_instrumented', False):
+            setattr(cls, name, property(_timed(kind, attr.fget)))
+    elif not getattr(attr, '_instrumented', False):
+        setattr(cls, name, _timed(kind, attr))
+
+
+def install_hooks():
+    """Time serializers, renderers and templates. Idempotent; the hooks do nothing outside a sampled request."""
+    from django.template.backends.django import Template
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.serializers import ListSerializer, Serializer
+    from rest_framework.settings import api_settings
+
+    from .renderers import NDJSONRenderer
+
+    _instrument(Serializer, 'data', 'serialize')
+    _instrument(ListSerializer, 'data', 'serialize')
+    # The configured JSON renderers (ORJSONRenderer) override render(), so each is wrapped itself
+    json_renderers = {JSONRenderer, NDJSONRenderer}
+    json_renderers.update(cls for cls in api_settings.DEFAULT_RENDERER_CLASSES if issubclass(cls, JSONRenderer))
+    for renderer in json_renderers:
+        if 'render' in renderer.__dict__:
+            _instrument(renderer, 'render', 'serialize')
+    _instrument(Template, 'render', 'template')
+
+
+@contextmanager
+def _profiling(profile):
+    """Record the block's queries and timed calls in profile."""
+    token = _current.set(profile)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(profile.record_query))
+            yield
+    finally:
+        _current.reset(token)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class RequestTimingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'INSTRUMENTATION_SAMPLE_RATE', 1.0)
+        self.slow_request_ms = getattr(settings, 'INSTRUMENTATION_SLOW_REQUEST_MS', 500)
+        self.n_plus_one_threshold = getattr(settings, 'INSTRUMENTATION_N_PLUS_ONE_THRESHOLD', 5)
+        self.slowest_queries = getattr(settings, 'INSTRUMENTATION_SLOWEST_QUERIES', 3)
+        self.server_timing = getattr(settings, 'INSTRUMENTATION_SERVER_TIMING', True)
+        install_hooks()
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profile = RequestProfile()
+        with _profiling(profile):
+            response = self.get_response(request)
+
+        total = time.perf_counter() - profile.started
+        if response.streaming and not response.is_async and not isinstance(response, FileResponse):
+            # The body is produced after this returns: report the request once it has been sent
+            if self.server_timing:
+                response['Server-Timing'] = self.server_timing_header(profile, total, [])
+            response.streaming_content = self.profile_stream(request, response, profile, response.streaming_content)
+            return response
+
+        repeated = self.report(request, response, profile, total)
+        if self.server_timing:
+            response['Server-Timing'] = self.server_timing_header(profile, total, repeated)
+        return response
+
+    def profile_stream(self, request, response, profile, chunks):
+        """Yield the streamed body, adding the queries and serialization time behind each chunk to profile."""
+        chunks = iter(chunks)
+        try:
+            while True:
+                with _profiling(profile):
+                    started, db_time = time.perf_counter(), profile.db_time
+                    chunk = next(chunks, None)
+                    # Reading the rows is already in the database time
+                    profile.timings['serialize'] += time.perf_counter() - started - (profile.db_time - db_time)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            # Also when the client went away mid-stream
+            self.report(request, response, profile, time.perf_counter() - profile.started)
+
+    def server_timing_header(self, profile, total, repeated):
+        metrics = [
+            f'db;dur={_ms(profile.db_time)};desc="{len(profile.queries)} queries"',
+            f'serialize;dur={_ms(profile.timings["serialize"])}',
+            f'template;dur={_ms(profile.timings["template"])}',
+            f'total;dur={_ms(total)}',
+        ]
+        if repeated:
+            metrics.append(f'n-plus-one;desc="{repeated[0][1]}x same query"')
+        return ', '.join(metrics)
+
+    def report(self, request, response, profile, total):
+        """Log slow requests and likely N+1s; returns the repeated statements."""
+        repeated = profile.repeated_queries(self.n_plus_one_threshold)
+        slow = _ms(total) >= self.slow_request_ms
+        if not (slow or repeated):
+            return repeated
+
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": _ms(total),
+            "db_ms": _ms(profile.db_time),
+            "queries": len(profile.queries),
+            "serialize_ms": _ms(profile.timings['serialize']),
+            "template_ms": _ms(profile.timings['template']),
+            "slowest_queries": [
+                {"sql": sql[:500], "ms": _ms(duration), "db": alias}
+                for sql, duration, alias in profile.slowest_queries(self.slowest_queries)
+            ],
+            "repeated_queries": [{"sql": sql[:500], "count": n} for sql, n in repeated],
+        }
+        message = "slow request" if slow else "likely N+1 queries"
+        logger.warning("%s %s", message, json.dumps(record), extra={"request_profile": record})
+        return repeated
@@ -0,0 +1,117 @@
+"""
+Like and follow toggles shared by the template, API and async views.
+
+A toggle is one transaction built from single statements whose affected-row
+count says what happened: a DELETE of the row (1 row: it was there, now it is
+gone) and otherwise an INSERT that ignores a unique conflict (1 row: created,
+0 rows: a concurrent request created it first). No SELECT-then-write window
+is left for a double tap to race through, and the unique constraint can never
+surface as an IntegrityError.
+
+These statements bypass the model's save()/delete(), so when a row really was
+written the toggle sends post_save/post_delete itself. The receivers in
+signals.py then update the counters inside the same transaction and queue the
+cache invalidation, timeline and real-time work for after the commit, exactly
+as for any other Like or Follow. The instance they receive carries only the
+key columns.
+
+Lock conflicts between concurrent toggles (an InnoDB deadlock, a busy SQLite
+database) roll the transaction back; the toggle then retries it a few times
+with a short randomized backoff, unless it runs inside an outer transaction.
+
+They are plain synchronous functions so async views can run them with
+sync_to_async, which is how Django expects transactional code to be called
+from async code.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connections, router, transaction
+from django.db.models.constants import OnConflict
+from django.db.models.signals import post_delete, post_save
+from django.db.models.sql import InsertQuery
+
+from . import like_buffer
+from .models import Follow, Like, Post, Profile
+
+TOGGLE_RETRIES = getattr(settings, 'TOGGLE_RETRIES', 5)
+
+
+def _delete(instance, using):
+    """DELETE the rows matching the instance's key columns; returns how many went."""
+    # Not QuerySet.delete(): with post_delete receivers it SELECTs the rows first and
+    # sends the signal for each whether or not its DELETE still found it, so two
+    # concurrent unlikes would both decrement the counter
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    keys = [(field.column, getattr(instance, field.attname)) for field in instance._meta.concrete_fields
+            if field.is_relation]
+    sql = 'DELETE FROM {} WHERE {}'.format(
+        quote(instance._meta.db_table), ' AND '.join(f'{quote(column)} = %s' for column, _ in keys),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [value for _, value in keys])
+        return cursor.rowcount
+
+
+def _insert_ignoring_conflict(instance, using):
+    """INSERT the instance unless a unique constraint already holds the row; returns True if it was written."""
+    model = type(instance)
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    query = InsertQuery(model, on_conflict=OnConflict.IGNORE)
+    query.insert_values(fields, [instance])
+    with connections[using].cursor() as cursor:
+        for sql, params in query.get_compiler(using).as_sql():
+            cursor.execute(sql, params)
+        return cursor.rowcount > 0
+
+
+def _toggle(instance, counter):
+    """
+    Delete the row if it exists, else create it, then read the counter queryset
+    in the same transaction. Returns (exists afterwards, counter value).
+    """
+    using = router.db_for_write(type(instance))
+    retries = 0 if connections[using].in_atomic_block else TOGGLE_RETRIES
+    for attempt in range(retries + 1):
+        committed = []
+        try:
+            return _toggle_once(instance, counter, using, committed)
+        except OperationalError:
+            # Once committed the toggle happened; a failure after that must not toggle it back
+            if committed or attempt == retries:
+                raise
+            time.sleep(random.uniform(0, min(0.2, 0.01 * 2 ** attempt)))
+
+
+def _toggle_once(instance, counter, using, committed):
+    model = type(instance)
+    with transaction.atomic(using):
+        # Registered first, so it runs before the receivers' own on_commit work
+        transaction.on_commit(lambda: committed.append(True), using=using)
+        if _delete(instance, using):
+            post_delete.send(sender=model, instance=instance, using=using, origin=instance)
+            exists = False
+        else:
+            if _insert_ignoring_conflict(instance, using):
+                post_save.send(sender=model, instance=instance, created=True, update_fields=None, raw=False, using=using)
+            exists = True
+        return exists, counter.using(using).get()
+
+
+def toggle_like(user, post_id):
+    """Like the post, or remove the like if there is one. Returns (liked, like_count)."""
+    if like_buffer.LIKE_BUFFER_ENABLED:
+        stored_count = Post.objects.values_list('like_count', flat=True).get(pk=post_id)
+        if like_buffer.is_hot(stored_count):
+            # Viral post: record the intent and let the buffer write it (count is approximate)
+            return like_buffer.toggle_like(user, post_id, stored_count)
+    like_count = Post.objects.filter(pk=post_id).values_list('like_count', flat=True)
+    return _toggle(Like(user_id=user.pk, post_id=post_id), like_count)
+
+
+def toggle_follow(user, target_id):
+    """Follow the target user, or unfollow if already following. Returns (following, follower_count)."""
+    follower_count = Profile.objects.filter(user_id=target_id).values_list('follower_count', flat=True)
+    return _toggle(Follow(follower_id=user.pk, following_id=target_id), follower_count)
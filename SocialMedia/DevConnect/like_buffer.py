@@ -0,0 +1,377 @@
+"""
+Write-behind buffer for likes on hot posts.
+
+When LIKE_BUFFER_ENABLED is on, a like/unlike on a post with at least
+LIKE_BUFFER_HOT_THRESHOLD likes is not written to the database in the request.
+The intent ("user 7 likes post 42") is recorded in a buffer and the response is
+built from it straight away: the viewer's new state, and the stored like_count
+plus the buffered delta as an approximate count. flush() later applies every
+buffered intent in one transaction: a bulk_create for likes, one DELETE per
+post for unlikes, and one F() update per touched post moving like_count by the
+net number of rows inserted and deleted. Thousands of likes on one viral post
+become a few statements instead of thousands of writes queueing on the same
+Post row, and none of them counts the post's likes (`manage.py recount` fixes
+any drift).
+
+Buffered intents are flushed at least every LIKE_BUFFER_MAX_STALENESS seconds.
+A background thread in each process does this when LIKE_BUFFER_FLUSH_THREAD
+is on. Any toggle that finds older intents also flushes them inline, and
+`manage.py flush_likes --loop` can run the flushing as its own process.
+
+Crash safety: a flush first moves the pending intents aside ("in flight") and
+only drops them after its transaction commits. In-flight intents left by a
+crash are applied again by the next flush. That is safe because applying an
+intent is idempotent: the like ends up present or absent, and the count only
+moves by rows that were actually inserted or deleted, so an intent already in
+the table counts nothing the second time. Only one flush runs at a time, across
+every process sharing the buffer. Otherwise one flush could drop intents
+that another has taken but not yet written, or write older intents over newer ones.
+
+Where the buffer lives is up to the backend named by LIKE_BUFFER_BACKEND:
+
+* LocalBackend: in process memory, optionally journaled to the file at
+  LIKE_BUFFER_JOURNAL so a restarted worker replays what it had not flushed.
+  One process only.
+* RedisBackend: in Redis (LIKE_BUFFER_REDIS_URL), shared by every worker.
+  Flushes take a lock in Redis that expires after LIKE_BUFFER_FLUSH_LEASE
+  seconds, in case the flushing worker dies while holding it.
+"""
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, router, transaction
+from django.db.models import F
+from django.utils.module_loading import import_string
+
+from . import conditional, object_cache, realtime
+from .models import Like, Post
+
+logger = logging.getLogger(__name__)
+
+LIKE_BUFFER_ENABLED = getattr(settings, 'LIKE_BUFFER_ENABLED', False)
+LIKE_BUFFER_BACKEND = getattr(settings, 'LIKE_BUFFER_BACKEND', 'DevConnect.like_buffer.LocalBackend')
+LIKE_BUFFER_HOT_THRESHOLD = getattr(settings, 'LIKE_BUFFER_HOT_THRESHOLD', 1000)
+LIKE_BUFFER_MAX_STALENESS = getattr(settings, 'LIKE_BUFFER_MAX_STALENESS', 2.0)
+LIKE_BUFFER_FLUSH_THREAD = getattr(settings, 'LIKE_BUFFER_FLUSH_THREAD', True)
+LIKE_BUFFER_BATCH_SIZE = getattr(settings, 'LIKE_BUFFER_BATCH_SIZE', 1000)
+LIKE_BUFFER_FLUSH_LEASE = getattr(settings, 'LIKE_BUFFER_FLUSH_LEASE', 60)
+
+
+class LocalBackend:
+    """
+    Intents in this process's memory: {(post_id, user_id): liked} plus a per-post
+    count delta, each kept for the pending and the in-flight generation.
+    """
+
+    def __init__(self, journal=None):
+        self._lock = threading.Lock()
+        journal = journal if journal is not None else getattr(settings, 'LIKE_BUFFER_JOURNAL', None)
+        self.journal = os.fspath(journal) if journal else None
+        self.pending, self.pending_delta = {}, Counter()
+        self.inflight, self.inflight_delta = {}, Counter()
+        self.oldest = None
+        if self.journal:
+            self._replay()
+
+    # Journal: one "post_id user_id liked" line per intent. Draining moves its
+    # lines to <journal>.inflight, acking deletes that file.
+
+    def _replay(self):
+        for path, intents in ((self.journal + '.inflight', self.inflight), (self.journal, self.pending)):
+            if os.path.exists(path):
+                with open(path) as f:
+                    for line in f:
+                        try:
+                            post_id, user_id, liked = map(int, line.split())
+                        except ValueError:  # A line torn by the crash
+                            continue
+                        intents[(post_id, user_id)] = bool(liked)
+        if self.pending:
+            self.oldest = 0  # Unknown age, flush soon
+
+    def record(self, post_id, user_id, liked, delta):
+        with self._lock:
+            self.pending[(post_id, user_id)] = liked
+            self.pending_delta[post_id] += delta
+            if self.oldest is None:
+                self.oldest = time.time()
+            if self.journal:
+                with open(self.journal, 'a') as f:
+                    f.write(f'{post_id} {user_id} {int(liked)}\n')
+
+    def state(self, post_id, user_id):
+        key = (post_id, user_id)
+        with self._lock:
+            return self.pending.get(key, self.inflight.get(key))
+
+    def delta(self, post_id):
+        with self._lock:
+            return self.pending_delta[post_id] + self.inflight_delta[post_id]
+
+    def oldest_age(self):
+        with self._lock:
+            return None if self.oldest is None else time.time() - self.oldest
+
+    def drain(self):
+        """Move pending intents to in flight (on top of any left by a failed flush) and return all in flight."""
+        with self._lock:
+            self.inflight.update(self.pending)
+            self.inflight_delta.update(self.pending_delta)
+            self.pending, self.pending_delta, self.oldest = {}, Counter(), None
+            if self.journal and os.path.exists(self.journal):
+                with open(self.journal) as src, open(self.journal + '.inflight', 'a') as dst:
+                    dst.write(src.read())
+                os.remove(self.journal)
+            return dict(self.inflight)
+
+    def ack(self):
+        with self._lock:
+            self.inflight, self.inflight_delta = {}, Counter()
+            if self.journal and os.path.exists(self.journal + '.inflight'):
+                os.remove(self.journal + '.inflight')
+
+    @contextmanager
+    def flushing(self, blocking=True):
+        yield True  # One process: flush() already holds _flush_lock
+
+
+class RedisBackend:
+    """Intents in Redis hashes shared by every worker; drain merges the pending hashes into the in-flight ones."""
+
+    prefix = 'devconnect:likebuf'
+
+    def __init__(self):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBackend needs the 'redis' package.")
+        url = getattr(settings, 'LIKE_BUFFER_REDIS_URL', 'redis://localhost:6379/0')
+        self.client = redis.Redis.from_url(url)
+        self.keys = {name: f'{self.prefix}:{name}' for name in (
+            'pending', 'pending_delta', 'inflight', 'inflight_delta', 'oldest', 'lock',
+        )}
+        self._token = None
+        # Merge pending into in flight atomically, so a record() racing with drain lands in one or the other
+        self._merge = self.client.register_script("""
+            for i = 1, 2 do
+                local entries = redis.call('HGETALL', KEYS[i])
+                for j = 1, #entries, 2 do
+                    if i == 1 then
+                        redis.call('HSET', KEYS[i + 2], entries[j], entries[j + 1])
+                    else
+                        redis.call('HINCRBY', KEYS[i + 2], entries[j], entries[j + 1])
+                    end
+                end
+                redis.call('DEL', KEYS[i])
+            end
+            redis.call('DEL', KEYS[5])
+            return redis.call('HGETALL', KEYS[3])
+        """)
+        # Delete only while holding the lock: after the lease has expired, another
+        # flush may have taken the in-flight intents and not written them yet
+        self._if_locked = self.client.register_script("""
+            if redis.call('GET', KEYS[1]) ~= ARGV[1] then
+                return 0
+            end
+            for i = 2, #KEYS do
+                redis.call('DEL', KEYS[i])
+            end
+            return 1
+        """)
+
+    def record(self, post_id, user_id, liked, delta):
+        with self.client.pipeline() as pipe:
+            pipe.hset(self.keys['pending'], f'{post_id}:{user_id}', int(liked))
+            pipe.hincrby(self.keys['pending_delta'], post_id, delta)
+            pipe.set(self.keys['oldest'], time.time(), nx=True)
+            pipe.execute()
+
+    def state(self, post_id, user_id):
+        field = f'{post_id}:{user_id}'
+        pending, inflight = self.client.pipeline().hget(self.keys['pending'], field).hget(self.keys['inflight'], field).execute()
+        value = pending if pending is not None else inflight
+        return None if value is None else value == b'1'
+
+    def delta(self, post_id):
+        pending, inflight = (
+            self.client.pipeline()
+            .hget(self.keys['pending_delta'], post_id)
+            .hget(self.keys['inflight_delta'], post_id)
+            .execute()
+        )
+        return int(pending or 0) + int(inflight or 0)
+
+    def oldest_age(self):
+        oldest = self.client.get(self.keys['oldest'])
+        return None if oldest is None else time.time() - float(oldest)
+
+    def drain(self):
+        keys = self.keys
+        entries = self._merge(keys=[keys['pending'], keys['pending_delta'], keys['inflight'], keys['inflight_delta'], keys['oldest']])
+        intents = {}
+        for field, value in zip(entries[::2], entries[1::2]):
+            post_id, user_id = map(int, field.split(b':'))
+            intents[(post_id, user_id)] = value == b'1'
+        return intents
+
+    def ack(self):
+        keys = self.keys
+        if not self._if_locked(keys=[keys['lock'], keys['inflight'], keys['inflight_delta']], args=[self._token]):
+            logger.warning("Like buffer flush outlived its lock; the next flush applies its intents again")
+
+    @contextmanager
+    def flushing(self, blocking=True):
+        """Hold the flush lock shared by every worker; yields False if not blocking and another worker has it."""
+        token = uuid.uuid4().hex
+        while not self.client.set(self.keys['lock'], token, nx=True, ex=LIKE_BUFFER_FLUSH_LEASE):
+            if not blocking:
+                yield False
+                return
+            time.sleep(0.05)
+        self._token = token
+        try:
+            yield True
+        finally:
+            self._token = None
+            self._if_locked(keys=[self.keys['lock'], self.keys['lock']], args=[token])  # Release, if still ours
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flusher = None
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = import_string(LIKE_BUFFER_BACKEND)()
+    return _backend
+
+
+def is_hot(like_count):
+    return LIKE_BUFFER_ENABLED and like_count >= LIKE_BUFFER_HOT_THRESHOLD
+
+
+def viewer_state(post_id, user_id):
+    """The viewer's buffered like state for a post, or None when nothing is buffered."""
+    if not LIKE_BUFFER_ENABLED:
+        return None
+    return get_backend().state(post_id, user_id)
+
+
+def pending_delta(post_id):
+    """Change to the post's like_count that is still in the buffer."""
+    return get_backend().delta(post_id) if LIKE_BUFFER_ENABLED else 0
+
+
+def toggle_like(user, post_id, like_count):
+    """
+    Buffered toggle for a hot post whose stored count is like_count.
+    Returns (liked, approximate like_count), like interactions.toggle_like.
+    """
+    backend = get_backend()
+    currently = backend.state(post_id, user.pk)
+    if currently is None:
+        currently = Like.objects.filter(post_id=post_id, user_id=user.pk).exists()
+    liked = not currently
+    backend.record(post_id, user.pk, liked, 1 if liked else -1)
+
+    # The like is recorded whatever happens to the push, so a broker outage is only logged, as on the unbuffered path
+    event = {"type": "post.liked" if liked else "post.unliked", "post_id": post_id, "user_id": user.pk}
+    transaction.on_commit(lambda: realtime.publish([realtime.post_topic(post_id)], event), robust=True)
+
+    _ensure_flusher()
+    age = backend.oldest_age()
+    if age is not None and age > LIKE_BUFFER_MAX_STALENESS:
+        flush(blocking=False)
+        like_count = Post.objects.values_list('like_count', flat=True).get(pk=post_id)
+    return liked, like_count + backend.delta(post_id)
+
+
+def flush(blocking=True):
+    """Apply buffered intents to the Like table and the counts of the posts they touch. Returns how many were applied."""
+    if not _flush_lock.acquire(blocking=blocking):
+        return 0  # Another thread of this process is flushing right now
+    try:
+        backend = get_backend()
+        with backend.flushing(blocking) as flushing:
+            if not flushing:
+                return 0  # Another process is flushing right now
+            intents = backend.drain()
+            if intents:
+                _apply(intents)
+            backend.ack()
+            return len(intents)
+    finally:
+        _flush_lock.release()
+
+
+def _apply(intents):
+    post_ids = {post_id for post_id, _ in intents}
+    user_ids = {user_id for _, user_id in intents}
+    # Skip intents whose post or user was deleted meanwhile, they would fail the whole batch
+    post_ids = set(Post.objects.filter(pk__in=post_ids).values_list('pk', flat=True))
+    user_ids = set(User.objects.filter(pk__in=user_ids).values_list('pk', flat=True))
+
+    likes, unlikes = [], defaultdict(list)
+    for (post_id, user_id), liked in intents.items():
+        if post_id in post_ids and user_id in user_ids:
+            if liked:
+                likes.append(Like(post_id=post_id, user_id=user_id))
+            else:
+                unlikes[post_id].append(user_id)
+
+    # Straight to the table, without the per-row signals: each post's count moves once below
+    delta = Counter()
+    with transaction.atomic():
+        for start in range(0, len(likes), LIKE_BUFFER_BATCH_SIZE):
+            batch = likes[start:start + LIKE_BUFFER_BATCH_SIZE]
+            present = set(
+                Like.objects.filter(post_id__in={like.post_id for like in batch}, user_id__in={like.user_id for like in batch})
+                .values_list('post_id', 'user_id')
+            )
+            new = [like for like in batch if (like.post_id, like.user_id) not in present]
+            Like.objects.bulk_create(new, ignore_conflicts=True)
+            delta.update(like.post_id for like in new)
+        for post_id, users in unlikes.items():
+            for start in range(0, len(users), LIKE_BUFFER_BATCH_SIZE):
+                batch = users[start:start + LIKE_BUFFER_BATCH_SIZE]
+                delta[post_id] -= Like.objects.filter(post_id=post_id, user_id__in=batch)._raw_delete(router.db_for_write(Like))
+        for post_id, change in delta.items():
+            if change:
+                Post.objects.filter(pk=post_id).update(like_count=F('like_count') + change)
+        object_cache.invalidate_posts(*post_ids)
+        conditional.bump_post_list()
+
+
+def _ensure_flusher():
+    global _flusher
+    if not LIKE_BUFFER_FLUSH_THREAD or (_flusher is not None and _flusher.is_alive()):
+        return
+    with _backend_lock:
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=run_flusher, name='like-buffer-flush', daemon=True)
+            _flusher.start()
+
+
+def run_flusher(interval=None, stop=None):
+    """Flush every interval seconds (half the max staleness by default) until stop is set."""
+    interval = interval or LIKE_BUFFER_MAX_STALENESS / 2
+    while not (stop and stop.is_set()):
+        time.sleep(interval)
+        close_old_connections()
+        try:
+            flush()
+        except Exception:
+            # In-flight intents stay in the backend and are retried next time
+            logger.exception("Like buffer flush failed")
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from DevConnect.query_plans import check_views, EXEMPT_VIEWS, NothingToExplain
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the queries of every read view and fail on full table scans or filesorts."
+
+    def handle(self, *args, **options):
+        # The views only read, but roll back anyway so nothing here can touch real data
+        try:
+            with transaction.atomic():
+                report = check_views()
+                transaction.set_rollback(True)
+        except NothingToExplain as e:
+            raise CommandError(e)
+
+        for name, reason in EXEMPT_VIEWS.items():
+            self.stdout.write(f"skipped {name}: {reason}")
+
+        if not report:
+            self.stdout.write(self.style.SUCCESS("All query plans use indexes."))
+            return
+
+        for name, queries in report.items():
+            for sql, problems in queries:
+                self.stdout.write(self.style.ERROR(f"{name}: {', '.join(problems)}"))
+                self.stdout.write(f"    {sql}")
+        raise CommandError(f"{len(report)} view(s) have queries without a usable index.")
@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from DevConnect import exports
+from DevConnect.models import DataExport
+
+
+class Command(BaseCommand):
+    help = "Export (or resume exporting) a user's personal data in this process, for compliance requests."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}.")
+
+        def report(export):
+            info = exports.progress(export)
+            self.stdout.write(f"{info['section'] or 'done'}: {info['rows_written']}/{info['rows_total']} rows ({info['percent']}%)")
+
+        export = exports.run(exports.request_export(user, background=False).pk, report)
+        if export is None:
+            raise CommandError("That export is being written by another worker; try again later.")
+        if export.status == DataExport.FAILED:
+            raise CommandError(f"Export {export.pk} failed: {export.error}. Run the command again to resume it.")
+        self.stdout.write(self.style.SUCCESS(f"Wrote {export.rows_written} rows to {exports.archive_path(export)}"))
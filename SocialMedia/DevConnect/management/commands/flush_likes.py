@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from DevConnect import like_buffer
+
+
+class Command(BaseCommand):
+    help = "Write buffered likes (LIKE_BUFFER_ENABLED) to the database, once or in a loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep flushing until interrupted.")
+        parser.add_argument('--interval', type=float, default=like_buffer.LIKE_BUFFER_MAX_STALENESS / 2,
+                            help="Seconds between flushes with --loop.")
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.stdout.write(self.style.SUCCESS(f"Flushed {like_buffer.flush()} like intents."))
+            return
+
+        while True:
+            close_old_connections()
+            flushed = like_buffer.flush()
+            if flushed:
+                self.stdout.write(f"Flushed {flushed} like intents.")
+            time.sleep(options['interval'])
@@ -0,0 +1,46 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from DevConnect import provisioning
+
+
+class Command(BaseCommand):
+    help = "Create accounts in bulk from a CSV or NDJSON file of username, email, password and bio."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, or - for standard input.")
+        parser.add_argument('--format', choices=provisioning.FORMATS, help="Default: guessed from the file name, else csv.")
+        parser.add_argument('--batch-size', type=int, default=provisioning.IMPORT_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=provisioning.IMPORT_HASH_WORKERS,
+                            help="Processes hashing passwords; 1 hashes in this process.")
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or provisioning.guess_format(options['path'])
+        started = time.perf_counter()
+
+        def progress(result):
+            rate = result.processed / (time.perf_counter() - started)
+            self.stdout.write(f"{result.processed} rows, {result.created} created, {result.failed} failed ({rate:.0f} rows/s)")
+
+        try:
+            stream = sys.stdin.buffer if options['path'] == '-' else open(options['path'], 'rb')
+        except OSError as e:
+            raise CommandError(e)
+        try:
+            with stream:
+                result = provisioning.import_users(
+                    provisioning.read_rows(stream, fmt),
+                    batch_size=options['batch_size'],
+                    workers=options['workers'],
+                    progress=progress,
+                )
+        except (provisioning.ImportFormatError, UnicodeDecodeError) as e:
+            raise CommandError(e)
+
+        for line, message in result.errors:
+            self.stderr.write(f"line {line}: {message}")
+        if result.failed > len(result.errors):
+            self.stderr.write(f"... and {result.failed - len(result.errors)} more errors")
+        self.stdout.write(self.style.SUCCESS(f"Created {result.created} users, {result.failed} rows failed."))
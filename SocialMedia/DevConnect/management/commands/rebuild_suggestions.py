@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from DevConnect.suggestions import rebuild_all
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's who-to-follow suggestions from the whole follow graph."
+
+    def handle(self, *args, **options):
+        users = rebuild_all()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt suggestions for {users} users."))
@@ -0,0 +1,31 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+
+from DevConnect.feed import backfill_follow
+from DevConnect.models import Follow, Post, TimelineEntry
+
+
+class Command(BaseCommand):
+    help = "Backfill home timelines from existing posts and follows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only rebuild the timeline of this username.")
+
+    def handle(self, *args, **options):
+        users = User.objects.all()
+        if options['user']:
+            users = users.filter(username=options['user'])
+
+        rebuilt = 0
+        for user in users.iterator():
+            TimelineEntry.objects.filter(owner=user).delete()
+            own_posts = Post.objects.filter(author=user).values_list('id', flat=True)
+            TimelineEntry.objects.bulk_create(
+                [TimelineEntry(owner=user, post_id=post_id) for post_id in own_posts],
+                ignore_conflicts=True,
+            )
+            for following_id in Follow.objects.filter(follower=user).values_list('following_id', flat=True):
+                backfill_follow(user.id, following_id)
+            rebuilt += 1
+
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {rebuilt} timelines."))
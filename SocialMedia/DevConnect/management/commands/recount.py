@@ -0,0 +1,62 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F, Q
+
+from DevConnect import conditional
+from DevConnect.counters import count_of
+from DevConnect.models import Comment, Follow, Like, Post, Profile
+
+
+class Command(BaseCommand):
+    help = "Recompute denormalized like/comment/follower counters and fix any drift, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        fixed = self.reconcile(Post, {
+            'like_count': lambda: count_of(Like, 'post'),
+            'comment_count': lambda: count_of(Comment, 'post'),
+        }, batch_size)
+        self.stdout.write(f"Posts fixed: {fixed}")
+        if fixed:
+            conditional.bump_post_list()
+
+        fixed = self.reconcile(Profile, {
+            'follower_count': lambda: count_of(Follow, 'following', outer='user_id'),
+            'following_count': lambda: count_of(Follow, 'follower', outer='user_id'),
+        }, batch_size)
+        self.stdout.write(f"Profiles fixed: {fixed}")
+
+        self.stdout.write(self.style.SUCCESS("Counters reconciled."))
+
+    def reconcile(self, model, counters, batch_size):
+        """Walk the table in primary key batches and rewrite the rows whose counters drifted."""
+        drifted = Q()
+        for name in counters:
+            drifted |= ~Q(**{name: F(f'actual_{name}')})
+
+        fixed = 0
+        last_pk = 0
+        while True:
+            pks = list(
+                model.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not pks:
+                return fixed
+            last_pk = pks[-1]
+
+            stale = list(
+                model.objects.filter(pk__in=pks)
+                .annotate(**{f'actual_{name}': count() for name, count in counters.items()})
+                .filter(drifted)
+                .values_list('pk', flat=True)
+            )
+            if stale:
+                # Recount inside the UPDATE itself so increments racing with us are not lost
+                fixed += model.objects.filter(pk__in=stale).update(
+                    **{name: count() for name, count in counters.items()}
+                )
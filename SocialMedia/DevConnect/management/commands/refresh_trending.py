@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from DevConnect import trending
+
+
+class Command(BaseCommand):
+    help = "Fold new likes and comments into the trending scores, once or in a loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep refreshing until interrupted.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between refreshes with --loop.")
+        parser.add_argument('--batch-size', type=int, default=trending.TRENDING_BATCH_SIZE,
+                            help="Events of each kind read per transaction.")
+
+    def catch_up(self, batch_size):
+        """Refresh in batches until there is nothing new; returns the number of events read."""
+        total = 0
+        while True:
+            read = trending.refresh(batch_size)
+            total += read
+            if read < batch_size:
+                return total
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.stdout.write(self.style.SUCCESS(f"Read {self.catch_up(options['batch_size'])} new events."))
+            return
+
+        while True:
+            close_old_connections()
+            read = self.catch_up(options['batch_size'])
+            if read:
+                self.stdout.write(f"Read {read} new events.")
+            time.sleep(options['interval'])
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from DevConnect.search import get_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the full-text search index over post content. On MySQL, InnoDB keeps "
+        "the FULLTEXT index current, so there is nothing to rebuild and posts are only counted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        indexed = get_backend().reindex(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} posts."))
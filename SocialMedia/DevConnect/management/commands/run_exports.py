@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from DevConnect import exports
+
+
+class Command(BaseCommand):
+    help = "Run pending personal data exports, and resume those whose worker died; once or in a loop."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep running exports until interrupted.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between checks with --loop.")
+
+    def run_once(self):
+        ran = exports.run_pending()
+        expired = exports.delete_expired()
+        if ran or expired:
+            self.stdout.write(f"Ran {ran} exports, deleted {expired} expired ones.")
+        return ran
+
+    def handle(self, *args, **options):
+        if not options['loop']:
+            self.run_once()
+            return
+
+        while True:
+            close_old_connections()
+            self.run_once()
+            time.sleep(options['interval'])
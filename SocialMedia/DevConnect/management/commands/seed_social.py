@@ -0,0 +1,210 @@
+"""
+Generate a synthetic social graph for load testing.
+
+Everything goes in through bulk_create in fixed-size batches and ids are kept
+in compact arrays, so memory stays flat from a few thousand rows up to tens of
+millions. Activity follows a power law the way real networks do: most users
+post, follow and like a little, a few do a lot, and a handful of early users
+and posts collect most of the follows, likes and comments. Posts and follows
+are spread over the last --days days, and every like or comment falls between
+its post's creation and now, so recency indexes, trending decay and keyset
+pages see data of different ages.
+
+bulk_create skips signals, so counters, the search index and (optionally)
+timelines are rebuilt by the existing maintenance commands at the end.
+"""
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max
+from django.utils import timezone
+
+from DevConnect.models import Comment, Follow, Like, Post, Profile
+
+# Pareto shape of the per-user activity counts; below 2 the variance is unbounded, like real usage
+ACTIVITY_ALPHA = 1.5
+# Popularity skew of follow/like/comment targets; the first 1% of users or posts get ~20% of them
+POPULARITY_SKEW = 3.0
+
+WORDS = (
+    "django python rust go javascript react api database index cache query latency deploy "
+    "release bug fix refactor test review merge branch docker kubernetes queue worker async "
+    "thread lock replica shard backup metrics logging tracing profile benchmark scale"
+).split()
+
+
+class Command(BaseCommand):
+    help = "Bulk-create a power-law distributed set of users, posts, follows, likes and comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=float, default=10, help="Mean posts per user.")
+        parser.add_argument('--follows', type=float, default=20, help="Mean accounts followed per user.")
+        parser.add_argument('--likes', type=float, default=30, help="Mean likes given per user.")
+        parser.add_argument('--comments', type=float, default=5, help="Mean comments written per user.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--days', type=float, default=30, help="Spread created_at over this many days before now.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data sets.")
+        parser.add_argument('--prefix', default='seed', help="Usernames are <prefix>_<n>.")
+        parser.add_argument('--password', default='devconnect', help="Password shared by every generated user.")
+        parser.add_argument('--timelines', action='store_true', help="Also run rebuild_timelines (slow on big sets).")
+
+    def handle(self, *args, **options):
+        if options['users'] < 2:
+            raise CommandError("Need at least 2 users.")
+        if options['days'] < 0:
+            raise CommandError("--days can't be negative.")
+        if User.objects.filter(username=f"{options['prefix']}_0").exists():
+            raise CommandError(f"Users with prefix '{options['prefix']}' already exist, pick another --prefix.")
+
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.now = timezone.now()
+        self.window = options['days'] * 24 * 3600
+        self.post_ages = array('d')  # Seconds before now each new post was made, in post id order
+
+        user_ids = self.create_users(options['users'], options['prefix'], options['password'])
+        post_ids = self.create_posts(user_ids, options['posts'])
+        self.create_follows(user_ids, options['follows'])
+        if post_ids:
+            self.create_likes(user_ids, post_ids, options['likes'])
+            self.create_comments(user_ids, post_ids, options['comments'])
+
+        call_command('recount', batch_size=self.batch_size, stdout=self.stdout)
+        call_command('reindex_posts', batch_size=self.batch_size, stdout=self.stdout)
+        if options['timelines']:
+            call_command('rebuild_timelines', stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS("Seeding done."))
+
+    # -- distributions -------------------------------------------------------
+
+    def activity(self, mean, cap):
+        """Heavy-tailed count with the given mean (before the cap)."""
+        scale = mean * (ACTIVITY_ALPHA - 1) / ACTIVITY_ALPHA
+        return min(cap, int(self.rng.paretovariate(ACTIVITY_ALPHA) * scale))
+
+    def popular(self, n):
+        """Index in [0, n), strongly biased towards the start."""
+        return int(n * self.rng.random() ** POPULARITY_SKEW)
+
+    def distinct_popular(self, n, k, exclude=None):
+        """Up to k distinct popular indexes, never `exclude`."""
+        picked = set()
+        for _ in range(k * 3):  # The skew repeats picks; give up rather than spin on tiny sets
+            if len(picked) >= k:
+                break
+            index = self.popular(n)
+            if index != exclude:
+                picked.add(index)
+        return picked
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high)))
+
+    def age(self, within=None):
+        """Seconds before now, uniform over the window or over the last `within` seconds."""
+        return self.rng.random() * (self.window if within is None else within)
+
+    def at(self, age):
+        return self.now - timedelta(seconds=age)
+
+    # -- writers -------------------------------------------------------------
+
+    @contextmanager
+    def explicit_timestamps(self, model):
+        """Let bulk_create keep the created_at/updated_at the rows were given, instead of stamping them now."""
+        fields = [
+            (field, field.auto_now, field.auto_now_add) for field in model._meta.concrete_fields
+            if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+        ]
+        for field, _, _ in fields:
+            field.auto_now = field.auto_now_add = False
+        try:
+            yield
+        finally:
+            for field, auto_now, auto_now_add in fields:
+                field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+    def insert(self, model, rows):
+        """bulk_create rows from an iterator in batches; returns how many were written."""
+        started = time.perf_counter()
+        written = 0
+        with self.explicit_timestamps(model):
+            while True:
+                batch = list(islice(rows, self.batch_size))
+                if not batch:
+                    break
+                model.objects.bulk_create(batch, batch_size=self.batch_size)
+                written += len(batch)
+        self.stdout.write(f"{model._meta.verbose_name_plural}: {written} in {time.perf_counter() - started:.1f}s")
+        return written
+
+    def new_ids(self, model, after):
+        """Ids of the rows created after `after`, in order (bulk_create can't return them on every backend)."""
+        ids = array('q')
+        ids.extend(model.objects.filter(pk__gt=after).order_by('pk').values_list('pk', flat=True).iterator(self.batch_size))
+        return ids
+
+    def create_users(self, count, prefix, password):
+        password = make_password(password)  # Hashing once instead of per user
+        last_id = User.objects.aggregate(last=Max('pk'))['last'] or 0
+        self.insert(User, (
+            User(username=f'{prefix}_{i}', email=f'{prefix}_{i}@example.com', password=password)
+            for i in range(count)
+        ))
+        user_ids = self.new_ids(User, last_id)
+        self.insert(Profile, (Profile(user_id=user_id) for user_id in user_ids))
+        return user_ids
+
+    def new_post(self, user_id):
+        age = self.age()
+        self.post_ages.append(age)
+        created_at = self.at(age)
+        return Post(author_id=user_id, content=self.text(5, 40), created_at=created_at, updated_at=created_at)
+
+    def create_posts(self, user_ids, mean):
+        last_id = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+        cap = max(1, int(mean * 100))
+        self.insert(Post, (
+            self.new_post(user_id)
+            for user_id in user_ids
+            for _ in range(self.activity(mean, cap))
+        ))
+        return self.new_ids(Post, last_id)
+
+    def create_follows(self, user_ids, mean):
+        n = len(user_ids)
+        self.insert(Follow, (
+            Follow(follower_id=user_ids[i], following_id=user_ids[j], created_at=self.at(self.age()))
+            for i in range(n)
+            for j in self.distinct_popular(n, self.activity(mean, n - 1), exclude=i)
+        ))
+
+    def create_likes(self, user_ids, post_ids, mean):
+        n = len(post_ids)
+        self.insert(Like, (
+            Like(user_id=user_id, post_id=post_ids[j], created_at=self.at(self.age(self.post_ages[j])))
+            for user_id in user_ids
+            for j in self.distinct_popular(n, self.activity(mean, n))
+        ))
+
+    def create_comments(self, user_ids, post_ids, mean):
+        n = len(post_ids)
+        cap = max(1, int(mean * 100))
+        self.insert(Comment, (
+            self.new_comment(user_id, post_ids, self.popular(n))
+            for user_id in user_ids
+            for _ in range(self.activity(mean, cap))
+        ))
+
+    def new_comment(self, user_id, post_ids, j):
+        created_at = self.at(self.age(self.post_ages[j]))
+        return Comment(author_id=user_id, post_id=post_ids[j], content=self.text(3, 25), created_at=created_at)
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:06
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def create_missing_profiles(apps, schema_editor):
+    # Follower counters live on Profile, so every user needs one
+    User = apps.get_model('auth', 'User')
+    Profile = apps.get_model('DevConnect', 'Profile')
+    missing = User.objects.filter(profile__isnull=True).values_list('id', flat=True)
+    Profile.objects.bulk_create(
+        [Profile(user_id=user_id) for user_id in missing.iterator()],
+        batch_size=1000,
+    )
+
+
+def count_of(model, field, outer='pk'):
+    counted = (
+        model.objects.filter(**{field: OuterRef(outer)})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(counted, output_field=IntegerField()), Value(0))
+
+
+def backfill_counters(apps, schema_editor):
+    # The new columns start at 0; count what already exists (as `manage.py recount` does)
+    Comment = apps.get_model('DevConnect', 'Comment')
+    Follow = apps.get_model('DevConnect', 'Follow')
+    Like = apps.get_model('DevConnect', 'Like')
+    Post = apps.get_model('DevConnect', 'Post')
+    Profile = apps.get_model('DevConnect', 'Profile')
+    Post.objects.update(like_count=count_of(Like, 'post'), comment_count=count_of(Comment, 'post'))
+    Profile.objects.update(
+        follower_count=count_of(Follow, 'following', outer='user_id'),
+        following_count=count_of(Follow, 'follower', outer='user_id'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DevConnect', '0002_timelineentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='comment_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(create_missing_profiles, migrations.RunPython.noop),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+from django.db import migrations
+
+
+# The search index is vendor specific; see DevConnect/search.py
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE DevConnect_post ADD FULLTEXT INDEX post_content_fulltext (content)')
+    elif vendor == 'sqlite':
+        schema_editor.execute('CREATE VIRTUAL TABLE DevConnect_post_fts USING fts5(content)')
+        schema_editor.execute('INSERT INTO DevConnect_post_fts (rowid, content) SELECT id, content FROM DevConnect_post')
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'mysql':
+        schema_editor.execute('ALTER TABLE DevConnect_post DROP INDEX post_content_fulltext')
+    elif vendor == 'sqlite':
+        schema_editor.execute('DROP TABLE DevConnect_post_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DevConnect', '0003_denormalized_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
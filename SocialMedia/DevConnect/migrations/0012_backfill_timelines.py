@@ -0,0 +1,82 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+BATCH_SIZE = 1000
+# Frozen copies of DevConnect.feed's defaults, so this migration always replays the same way
+FEED_BACKFILL_SIZE = 50
+FEED_CELEBRITY_THRESHOLD = 10000
+CACHED_AUTHORS = 100000  # Authors whose recent post ids are kept between batches
+
+
+def backfill_timelines(apps, schema_editor):
+    # Timelines are only written for posts and follows made after 0002. Fill them in
+    # for the ones that already existed, the way rebuild_timelines does, without
+    # touching entries already there. Users are read BATCH_SIZE at a time, and each
+    # followed author's recent posts are fetched once and shared by all its followers.
+    User = apps.get_model('auth', 'User')
+    Follow = apps.get_model('DevConnect', 'Follow')
+    Post = apps.get_model('DevConnect', 'Post')
+    Profile = apps.get_model('DevConnect', 'Profile')
+    TimelineEntry = apps.get_model('DevConnect', 'TimelineEntry')
+
+    celebrities = set(
+        Profile.objects.filter(follower_count__gte=FEED_CELEBRITY_THRESHOLD).values_list('user_id', flat=True)
+    )
+    recent_posts = {}  # author id -> ids of their FEED_BACKFILL_SIZE newest posts
+    users = User.objects.order_by('pk').values_list('pk', flat=True)
+    last = 0
+    while True:
+        user_ids = list(users.filter(pk__gt=last)[:BATCH_SIZE])
+        if not user_ids:
+            return
+
+        followees = defaultdict(list)
+        for follower_id, following_id in Follow.objects.filter(follower_id__in=user_ids).values_list(
+            'follower_id', 'following_id',
+        ):
+            if following_id not in celebrities:
+                followees[follower_id].append(following_id)
+
+        missing = {author_id for ids in followees.values() for author_id in ids} - recent_posts.keys()
+        if len(recent_posts) + len(missing) > CACHED_AUTHORS:
+            recent_posts.clear()
+            missing = {author_id for ids in followees.values() for author_id in ids}
+        for author_id in missing:
+            recent_posts[author_id] = []
+        newest_first = Window(RowNumber(), partition_by=F('author_id'), order_by=F('id').desc())
+        for author_id, post_id in (
+            Post.objects.filter(author_id__in=missing).annotate(rank=newest_first)
+            .filter(rank__lte=FEED_BACKFILL_SIZE).values_list('author_id', 'id')
+        ):
+            recent_posts[author_id].append(post_id)
+
+        entries = [
+            TimelineEntry(owner_id=author_id, post_id=post_id)
+            for author_id, post_id in Post.objects.filter(author_id__in=user_ids).values_list('author_id', 'id')
+        ]
+        entries.extend(
+            TimelineEntry(owner_id=user_id, post_id=post_id)
+            for user_id, author_ids in followees.items()
+            for author_id in author_ids
+            for post_id in recent_posts[author_id]
+        )
+        TimelineEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        if len(user_ids) < BATCH_SIZE:
+            return
+        last = user_ids[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DevConnect', '0011_data_export'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import F
+from django.db.models.functions import Round
+
+SCORE_SCALE = 10 ** 6  # trending.SCORE_SCALE when this was written
+
+
+def to_integer_units(apps, schema_editor):
+    TrendingScore = apps.get_model('DevConnect', 'TrendingScore')
+    TrendingScore.objects.update(score=Round(F('score') * SCORE_SCALE))
+
+
+def to_points(apps, schema_editor):
+    TrendingScore = apps.get_model('DevConnect', 'TrendingScore')
+    TrendingScore.objects.update(score=F('score') / float(SCORE_SCALE))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('DevConnect', '0012_backfill_timelines'),
+    ]
+
+    operations = [
+        migrations.RunPython(to_integer_units, to_points),
+        migrations.AlterField(
+            model_name='trendingscore',
+            name='score',
+            field=models.BigIntegerField(),
+        ),
+    ]
@@ -2,9 +2,37 @@ from django.db import models
 from django.contrib.auth.models import User
 # from PIL import Image
 
-class Profile(models.Model):
+
+class CounterModel(models.Model):
+    """Model whose counter_fields are only changed through F() updates.
+
+    save() on an existing row leaves those columns out, so writing back an
+    instance loaded before a like/follow can't overwrite the stored count.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get('force_insert') and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Profile(CounterModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     bio = models.TextField(blank=True, null=True)
+    # Denormalized counters, kept current by DevConnect/signals.py (fix drift with `manage.py recount`)
+    follower_count = models.IntegerField(default=0)
+    following_count = models.IntegerField(default=0)
+    # Bumped to revoke every JWT issued so far (DevConnect/authentication.py)
+    token_version = models.IntegerField(default=0)
+
+    counter_fields = ('follower_count', 'following_count', 'token_version')
     # profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
 
     def __str__(self):
@@ -21,19 +49,36 @@ class Profile(models.Model):
     #             img.thumbnail(output_size)
     #             img.save(self.profile_picture.path)
 
+class PostQuerySet(models.QuerySet):
+    def with_is_liked(self, user):
+        """Annotate is_liked for user as one EXISTS subquery inside the page query."""
+        if user is None or not user.is_authenticated:
+            return self.annotate(is_liked=models.Value(False, output_field=models.BooleanField()))
+        return self.annotate(is_liked=models.Exists(Like.objects.filter(post=models.OuterRef('pk'), user=user)))
+
+
 # Post model
-class Post(models.Model):
+class Post(CounterModel):
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, kept current by DevConnect/signals.py (fix drift with `manage.py recount`)
+    like_count = models.IntegerField(default=0)
+    comment_count = models.IntegerField(default=0)
+
+    counter_fields = ('like_count', 'comment_count')
+
+    objects = PostQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['author', '-created_at'], name='post_author_recent_idx'),  # Posts by author, newest first
+        ]
 
     def __str__(self):
         return f"{self.author.username} - {self.content[:30]}"
 
-    def like_count(self):
-        return self.likes.count()
-
 # Like model
 class Like(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -42,6 +87,9 @@ class Like(models.Model):
 
     class Meta: 
         unique_together = ('user', 'post')  # Prevent duplicate likes
+        indexes = [
+            models.Index(fields=['post', 'created_at'], name='like_post_created_idx'),  # Likes on a post by recency
+        ]
 
     def __str__(self):
         return f"{self.user.username} liked {self.post}"
@@ -53,6 +101,11 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', 'created_at'], name='comment_post_created_idx'),  # Comments on a post in time order
+        ]
+
     def __str__(self):
         return f"{self.author.username} on {self.post}: {self.content[:30]}"
 
@@ -64,6 +117,90 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'following')  # Prevent duplicate follow entries
+        indexes = [
+            models.Index(fields=['following', 'created_at'], name='follow_following_created_idx'),  # Followers by recency
+            models.Index(fields=['follower', 'created_at'], name='follow_follower_created_idx'),  # Followings by recency
+        ]
 
     def __str__(self):
         return f"{self.follower.username} follows {self.following.username}"
+
+# Timeline model
+class TimelineEntry(models.Model):
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('owner', 'post')  # Also serves the (owner, post DESC) keyset scan
+
+    def __str__(self):
+        return f"post {self.post_id} in {self.owner_id}'s timeline"
+
+# Who-to-follow suggestion, precomputed by DevConnect/suggestions.py
+class Suggestion(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='suggestions')
+    candidate = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.IntegerField()  # Accounts the user follows that follow the candidate
+
+    class Meta:
+        unique_together = ('user', 'candidate')
+        indexes = [
+            models.Index(fields=['user', '-score', 'candidate'], name='suggestion_user_score_idx'),  # Best first
+        ]
+
+    def __str__(self):
+        return f"suggest {self.candidate_id} to {self.user_id} ({self.score})"
+
+# Trending score of a recent post, maintained by DevConnect/trending.py
+class TrendingScore(models.Model):
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    score = models.BigIntegerField()  # Decayed engagement in millionths, scaled to TrendingState.epoch
+    post_created_at = models.DateTimeField()  # Copied from the post, to prune old rows without a join
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-score'], name='trending_score_idx'),  # Hottest first
+            models.Index(fields=['post_created_at'], name='trending_post_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"post {self.post_id} trending {self.score:.2f}"
+
+
+class TrendingState(models.Model):
+    """Single row: how far the trending table has read the Like/Comment tables, and its score epoch."""
+    last_like_id = models.BigIntegerField(default=0)
+    last_comment_id = models.BigIntegerField(default=0)
+    epoch = models.DateTimeField()
+
+# Single row written to the primary and read back from each replica to measure replication lag (DevConnect/db_router.py)
+class ReplicaHeartbeat(models.Model):
+    beat = models.DateTimeField()
+
+
+# A user's personal data export, written by DevConnect/exports.py
+class DataExport(models.Model):
+    PENDING, RUNNING, DONE, FAILED = 'pending', 'running', 'done', 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='data_exports')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)  # Last checkpoint; an old one on a running export means its worker died
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Checkpoint: the sections before `section` are complete, and this one's file holds
+    # its rows up to last_id in its first `offset` bytes
+    section = models.PositiveSmallIntegerField(default=0)
+    last_id = models.BigIntegerField(default=0)
+    offset = models.BigIntegerField(default=0)
+    rows_written = models.BigIntegerField(default=0)
+    rows_total = models.BigIntegerField(null=True, blank=True)  # Counted when the export starts
+    error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'heartbeat'], name='dataexport_status_idx'),  # Exports to run or resume
+        ]
+
+    def __str__(self):
+        return f"export {self.pk} of {self.user_id} ({self.status})"
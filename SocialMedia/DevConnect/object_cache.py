@@ -0,0 +1,179 @@
+"""
+Read-through cache of serialized posts and user cards.
+
+Entries live in the Django cache named by OBJECT_CACHE_ALIAS (locmem in
+development and tests, any shared backend in production) and are dropped by
+the signal handlers in DevConnect/signals.py whenever the rows behind them
+change. OBJECT_CACHE_VERSION is passed as the cache key version; bump it when
+the shape of a cached dict changes so old entries are never read back.
+"""
+import copy
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from .models import Post
+
+OBJECT_CACHE_ALIAS = getattr(settings, 'OBJECT_CACHE_ALIAS', 'default')
+OBJECT_CACHE_TIMEOUT = getattr(settings, 'OBJECT_CACHE_TIMEOUT', 300)
+OBJECT_CACHE_VERSION = 1
+
+_local = ContextVar('object_cache_local', default=None)  # Set by local_scope()
+
+
+def _cache():
+    return caches[OBJECT_CACHE_ALIAS]
+
+
+def post_key(post_id):
+    return f'post:{post_id}'
+
+
+def user_card_key(user_id):
+    return f'user_card:{user_id}'
+
+
+def username_key(username):
+    return f'username:{username}'
+
+
+@contextmanager
+def local_scope():
+    """
+    Also keep what is read through the cache in a dict for the rest of the block,
+    so reading the same objects again (the sub-requests of one batch) skips the
+    cache round trip. Invalidations in the block drop entries from it as well.
+    """
+    token = _local.set({})
+    try:
+        yield
+    finally:
+        _local.reset(token)
+
+
+def _read_through(ids, key_func, load):
+    """Fetch ids from the cache in one round trip, load the misses with one query and store them."""
+    keys = {key_func(obj_id): obj_id for obj_id in ids}
+    local = _local.get()
+    result = {}
+    if local is not None:
+        # Callers may change what they get, so the scope hands out and keeps copies
+        result = {obj_id: copy.deepcopy(local[key]) for key, obj_id in keys.items() if key in local}
+        keys = {key: obj_id for key, obj_id in keys.items() if key not in local}
+    if not keys:
+        return result
+
+    found = _cache().get_many(keys, version=OBJECT_CACHE_VERSION)
+    result.update({keys[key]: value for key, value in found.items()})
+
+    missing = [obj_id for key, obj_id in keys.items() if key not in found]
+    loaded = load(missing) if missing else {}
+    if loaded:
+        _cache().set_many(
+            {key_func(obj_id): value for obj_id, value in loaded.items()},
+            OBJECT_CACHE_TIMEOUT,
+            version=OBJECT_CACHE_VERSION,
+        )
+        result.update(loaded)
+
+    if local is not None:
+        local.update({key: copy.deepcopy(result[obj_id]) for key, obj_id in keys.items() if obj_id in result})
+    return result
+
+
+def _load_posts(post_ids):
+    from .serializers import PostSerializer
+
+    data = {}
+    # Cache fills read the primary: a row from a lagging replica would be cached long after invalidation
+    for post in Post.objects.using(DEFAULT_DB_ALIAS).filter(id__in=post_ids).select_related('author'):
+        card = dict(PostSerializer(post).data)
+        # The author is stitched back in from the user card cache on read and
+        # is_liked depends on the viewer, so neither is stored with the post
+        card.pop('is_liked')
+        card['author'] = post.author_id
+        data[post.id] = card
+    return data
+
+
+def _load_user_cards(user_ids):
+    cards = {}
+    for user in User.objects.using(DEFAULT_DB_ALIAS).filter(id__in=user_ids).select_related('profile'):
+        profile = getattr(user, 'profile', None)
+        cards[user.id] = {
+            "id": user.id,
+            "username": user.username,
+            "email": user.email,
+            "bio": profile.bio if profile else None,
+            "follower_count": profile.follower_count if profile else 0,
+            "following_count": profile.following_count if profile else 0,
+        }
+    return cards
+
+
+def get_posts(post_ids):
+    """Return {post_id: serialized post} for the given ids; unknown ids are left out."""
+    posts = _read_through(post_ids, post_key, _load_posts)
+    authors = get_user_cards({post['author'] for post in posts.values()})
+    return {
+        post_id: dict(post, author={
+            field: authors[post['author']][field] for field in ('id', 'username', 'email')
+        })
+        for post_id, post in posts.items()
+        if post['author'] in authors
+    }
+
+
+def get_post(post_id):
+    return get_posts([post_id]).get(post_id)
+
+
+def get_user_cards(user_ids):
+    """Return {user_id: user card} for the given ids; unknown ids are left out."""
+    return _read_through(user_ids, user_card_key, _load_user_cards)
+
+
+def get_user_card(user_id):
+    return get_user_cards([user_id]).get(user_id)
+
+
+def get_user_card_by_username(username):
+    user_id = _cache().get(username_key(username), version=OBJECT_CACHE_VERSION)
+    card = get_user_card(user_id) if user_id is not None else None
+
+    # A missing mapping, or one left behind by a rename, is resolved again from the database
+    if card is None or card['username'] != username:
+        user_id = User.objects.filter(username=username).values_list('id', flat=True).first()
+        if user_id is None:
+            return None
+        _cache().set(username_key(username), user_id, OBJECT_CACHE_TIMEOUT, version=OBJECT_CACHE_VERSION)
+        card = get_user_card(user_id)
+
+    return card
+
+
+def _delete_after_commit(keys):
+    local = _local.get()
+
+    def forget_local():
+        for key in keys:
+            local.pop(key, None)
+
+    if local is not None:
+        # Right away, so the rest of the scope sees its own writes, and again once what it read meanwhile is stale
+        forget_local()
+        transaction.on_commit(forget_local)
+    # Deleting before commit would let a concurrent read cache the old row again
+    transaction.on_commit(lambda: _cache().delete_many(keys, version=OBJECT_CACHE_VERSION))
+
+
+def invalidate_posts(*post_ids):
+    _delete_after_commit([post_key(post_id) for post_id in post_ids])
+
+
+def invalidate_users(*user_ids):
+    _delete_after_commit([user_card_key(user_id) for user_id in user_ids])
@@ -0,0 +1,175 @@
+"""
+Bulk account provisioning from CSV or NDJSON.
+
+Used by `manage.py import_users` and POST /api/admin/users/import/. Rows
+(username, email, password and an optional bio) are read lazily from the
+input and handled one batch at a time:
+
+1. validated against a set of the existing usernames, loaded with one query
+   up front, plus those already taken earlier in the input. Usernames are
+   case-sensitive, as at signup;
+2. passwords hashed, in a process pool when the command runs, since PBKDF2 is
+   CPU-bound by design and one core would take hours for a big organisation
+   (a blank password gives an unusable one, for accounts that will go through
+   password reset). The endpoint hashes in the web worker, without a pool, so
+   it takes at most IMPORT_API_MAX_ROWS rows; bigger imports go through the
+   command;
+3. inserted with two bulk_creates, users then profiles, in one transaction.
+
+bulk_create sends no signals, so the Profile rows the signup path gets from
+signals.create_profile are written here. If a username was taken concurrently,
+the batch is retried row by row so only that row fails. Problems are
+reported per row, with the line number in the input.
+"""
+import codecs
+import csv
+import json
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+
+from .models import Profile
+
+IMPORT_BATCH_SIZE = getattr(settings, 'IMPORT_BATCH_SIZE', 1000)
+IMPORT_HASH_WORKERS = getattr(settings, 'IMPORT_HASH_WORKERS', multiprocessing.cpu_count())  # For the command
+IMPORT_API_MAX_ROWS = getattr(settings, 'IMPORT_API_MAX_ROWS', 1000)
+IMPORT_MAX_REPORTED_ERRORS = getattr(settings, 'IMPORT_MAX_REPORTED_ERRORS', 1000)
+
+FORMATS = ('csv', 'ndjson')
+EMAIL_RE = re.compile(r"[^@]+@[^@]+\.[^@]+")  # The signup view's check
+USERNAME_MAX_LENGTH = User._meta.get_field('username').max_length
+
+
+class ImportFormatError(ValueError):
+    pass
+
+
+@dataclass
+class ImportResult:
+    processed: int = 0
+    created: int = 0
+    failed: int = 0
+    errors: list = field(default_factory=list)  # [(line, message)], the first IMPORT_MAX_REPORTED_ERRORS
+
+    def error(self, line, message):
+        self.failed += 1
+        if len(self.errors) < IMPORT_MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def guess_format(name, content_type=''):
+    if name.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'json' in content_type:
+        return 'ndjson'
+    return 'csv'
+
+
+def read_rows(stream, fmt):
+    """(line, row dict or error message) for every record of a binary stream."""
+    text = codecs.getreader('utf-8')(stream)
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        if reader.fieldnames is None or 'username' not in reader.fieldnames:
+            raise ImportFormatError("CSV input needs a header row with at least a username column.")
+        for row in reader:
+            yield reader.line_num, row
+    elif fmt == 'ndjson':
+        for line, record in enumerate(text, start=1):
+            if not record.strip():
+                continue
+            try:
+                row = json.loads(record)
+            except ValueError:
+                yield line, "not valid JSON"
+                continue
+            yield line, row if isinstance(row, dict) else "not a JSON object"
+    else:
+        raise ImportFormatError(f"Unknown format {fmt!r}, use one of: {', '.join(FORMATS)}.")
+
+
+def _clean(row, taken):
+    """(username, email, password, bio) from one row, or an error message."""
+    if isinstance(row, str):
+        return row
+    username = str(row.get('username') or '').strip()
+    email = str(row.get('email') or '').strip()
+    if not username:
+        return "username is required"
+    if len(username) > USERNAME_MAX_LENGTH:
+        return f"username is longer than {USERNAME_MAX_LENGTH} characters"
+    if not EMAIL_RE.match(email):
+        return "invalid email"
+    if username in taken:
+        return f"username {username!r} already exists"
+    taken.add(username)
+    password, bio = row.get('password'), row.get('bio')
+    return username, email, str(password) if password else None, str(bio) if bio else ''
+
+
+def _hash(passwords, pool, workers):
+    if pool is None:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _insert(accounts):
+    """Write users and their profiles in one transaction; returns the created users."""
+    users = [User(username=username, email=email, password=password) for username, email, password, _ in accounts]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        if users and users[0].pk is None:  # Backends that can't return ids from a bulk insert
+            ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'pk'))
+            for user in users:
+                user.pk = ids[user.username]
+        Profile.objects.bulk_create([Profile(user=user, bio=account[3]) for user, account in zip(users, accounts)])
+    return users
+
+
+def import_users(rows, batch_size=IMPORT_BATCH_SIZE, workers=1, progress=None):
+    """
+    Create accounts from (line, row) pairs as given by read_rows(), hashing with
+    workers processes (1: in this process). progress, if given, is called with
+    the ImportResult after every batch. Returns the result.
+    """
+    result = ImportResult()
+    taken = set(User.objects.values_list('username', flat=True).iterator(10000))
+
+    # Spawned, not forked: forking a threaded server process is unsafe
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn')) if workers > 1 else None
+    try:
+        rows = iter(rows)
+        while batch := list(islice(rows, batch_size)):
+            result.processed += len(batch)
+            lines, accounts = [], []
+            for line, row in batch:
+                cleaned = _clean(row, taken)
+                if isinstance(cleaned, str):
+                    result.error(line, cleaned)
+                else:
+                    lines.append(line)
+                    accounts.append(cleaned)
+
+            hashes = _hash([account[2] for account in accounts], pool, workers)
+            accounts = [(username, email, hashed, bio) for (username, email, _, bio), hashed in zip(accounts, hashes)]
+            try:
+                result.created += len(_insert(accounts))
+            except IntegrityError:
+                # Someone signed up with one of these names meanwhile: find which, one row at a time
+                for line, account in zip(lines, accounts):
+                    try:
+                        _insert([account])
+                        result.created += 1
+                    except IntegrityError:
+                        result.error(line, f"username {account[0]!r} already exists")
+            if progress:
+                progress(result)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    return result
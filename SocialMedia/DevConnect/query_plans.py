@@ -0,0 +1,123 @@
+"""
+EXPLAIN-based regression check for the queries our views run.
+
+check_views() requests each read endpoint with the test client, captures the
+SQL it executes and runs EXPLAIN on every SELECT. A plan that reads a whole
+table or sorts rows outside an index (MySQL "type: ALL" / "Using filesort",
+SQLite "SCAN <table>" / "USE TEMP B-TREE FOR ORDER BY") is reported, so a
+missing or unused index fails the test or the explain_queries command long
+before the table is big enough to hurt.
+"""
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from .models import Post
+
+# Endpoints whose plans are not checked, and why
+EXEMPT_VIEWS = {
+    'api_post_list': "returns the whole table by design",
+    'user-list': "returns the whole table by design",
+    'api_profile_list': "returns the whole table by design",
+    'api_search_posts': "ranking has to sort the matching rows by relevance",
+}
+
+
+class NothingToExplain(Exception):
+    pass
+
+
+def explain(sql, params, using=connection):
+    """Return a list of human readable problems in the plan of one SELECT."""
+    with using.cursor() as cursor:
+        if using.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0].lower() for column in cursor.description]
+            problems = []
+            for row in cursor.fetchall():
+                step = dict(zip(columns, row))
+                table = step.get('table') or ''
+                extra = step.get('extra') or ''
+                if step.get('type') == 'ALL' and not table.startswith('<'):
+                    problems.append(f"full scan of {table}")
+                if 'Using filesort' in extra:
+                    problems.append(f"filesort on {table}")
+            return problems
+
+        if using.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            problems = []
+            derived = set()  # Subqueries SQLite evaluates first; scanning their output is fine
+            for row in cursor.fetchall():
+                detail = row[-1]
+                for prefix in ('CO-ROUTINE ', 'MATERIALIZE '):
+                    if detail.startswith(prefix):
+                        derived.add(detail[len(prefix):])
+                scanned = detail[len('SCAN '):] if detail.startswith('SCAN ') else None
+                if scanned and scanned not in derived and 'VIRTUAL TABLE' not in detail and ' INDEX ' not in detail:
+                    problems.append(detail)
+                if 'TEMP B-TREE FOR ORDER BY' in detail:
+                    problems.append(detail)
+            return problems
+
+    raise NotImplementedError(f"No EXPLAIN support for {using.vendor}")
+
+
+def view_requests(user, post, other):
+    """The read endpoints to check, as (url name, path) pairs."""
+    return [
+        ('api_feed', reverse('api_feed')),
+        ('api_post_list', reverse('api_post_list')),
+        ('api-post-detail', reverse('api-post-detail', args=[post.id])),
+        ('api_mypost_list', reverse('api_mypost_list')),
+        ('api_comment_list', reverse('api_comment_list', args=[post.id])),
+        ('api_like_post', reverse('api_like_post', args=[post.id])),
+        ('api_post_state', reverse('api_post_state') + f'?ids={post.id}'),
+        ('api_follow_list', reverse('api_follow_list', args=[other.id])),
+        ('api_user_followers', reverse('api_user_followers', args=[other.id])),
+        ('api_user_following', reverse('api_user_following', args=[user.id])),
+        ('get_user_profile', reverse('get_user_profile', args=[other.username])),
+        ('user-list', reverse('user-list')),
+        ('api_suggested_users', reverse('api_suggested_users')),
+        ('api_search_posts', reverse('api_search_posts') + '?q=hello'),
+        ('api_trending_posts', reverse('api_trending_posts')),
+        ('home', reverse('home')),
+        ('myposts', reverse('myposts')),
+        ('profile', reverse('profile')),
+    ]
+
+
+def check_views(user=None, post=None, other=None):
+    """
+    Run every read view and EXPLAIN what it executed.
+    Returns {url name: [(sql, [problems])]} for the queries with problems.
+    Raises NothingToExplain if the database has no user or no post to request.
+    """
+    user = user or User.objects.order_by('id').first()
+    post = post or Post.objects.order_by('-id').first()
+    if user is None or post is None:
+        raise NothingToExplain("need at least one user and one post to explain")
+    other = other or User.objects.exclude(pk=user.pk).order_by('id').first() or user
+
+    client = APIClient()
+    client.force_authenticate(user)  # API views
+    client.force_login(user)  # Template views
+
+    report = {}
+    for name, path in view_requests(user, post, other):
+        with CaptureQueriesContext(connection) as captured:
+            client.get(path)
+        if name in EXEMPT_VIEWS:
+            continue
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            # Captured SQL already has its parameters inlined
+            problems = explain(sql, None)
+            if problems:
+                report.setdefault(name, []).append((sql, problems))
+    return report
+
@@ -0,0 +1,238 @@
+"""
+Real-time activity push.
+
+Signal handlers publish compact delta events (post.liked, comment.added,
+post.created, ...) to topics such as "post:42" or "author:7". The SSE view in
+async_views.py subscribes a client to the topics it watches and streams what
+arrives.
+
+Delivery inside a process goes through `broker`. Each subscriber has a bounded
+queue; when a slow client lets it fill up, new events for that client are
+dropped and it is told to resync, so a publisher never waits on a consumer.
+How events get from the publishing process to every worker is up to the
+backend named by REALTIME_BACKEND:
+
+* LocalBackend: single process, events go straight to the broker.
+* RedisBackend: events go through Redis pub/sub (REALTIME_REDIS_URL) and a
+  listener thread in every worker hands them to its broker. When the
+  connection drops the listener reconnects, backing off up to
+  REALTIME_RECONNECT_MAX seconds, and tells every subscriber to resync, since
+  events published in the meantime are lost.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.module_loading import import_string
+
+REALTIME_BACKEND = getattr(settings, 'REALTIME_BACKEND', 'DevConnect.realtime.LocalBackend')
+REALTIME_QUEUE_SIZE = getattr(settings, 'REALTIME_QUEUE_SIZE', 100)
+REALTIME_MAX_TOPICS = getattr(settings, 'REALTIME_MAX_TOPICS', 200)
+REALTIME_HEARTBEAT = getattr(settings, 'REALTIME_HEARTBEAT', 15)
+REALTIME_RECONNECT_MAX = getattr(settings, 'REALTIME_RECONNECT_MAX', 30)  # Seconds between Redis reconnects, at most
+
+logger = logging.getLogger(__name__)
+
+
+def post_topic(post_id):
+    return f'post:{post_id}'
+
+
+def author_topic(user_id):
+    return f'author:{user_id}'
+
+
+class Subscription:
+    """One client's view of the broker: the topics it watches and a bounded queue of events."""
+
+    def __init__(self, topics, maxsize=REALTIME_QUEUE_SIZE):
+        self.topics = frozenset(topics)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, event):
+        # Runs on the subscriber's event loop
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    def lost(self):
+        # Runs on the subscriber's event loop; reported like events dropped from a full queue
+        self.dropped += 1
+
+    async def next_event(self, timeout):
+        """Return the next event, or None if nothing arrived within timeout seconds."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """Fans events out to the subscriptions in this process. Safe to publish to from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_topic = defaultdict(set)
+
+    def subscribe(self, topics):
+        subscription = Subscription(topics)
+        with self._lock:
+            for topic in subscription.topics:
+                self._by_topic[topic].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for topic in subscription.topics:
+                subscribers = self._by_topic.get(topic)
+                if subscribers:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._by_topic[topic]
+
+    def lagged(self):
+        """Tell every subscription it missed events, so each client resyncs."""
+        with self._lock:
+            subscriptions = set().union(*self._by_topic.values())
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.lost)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def dispatch(self, topics, event):
+        with self._lock:
+            subscriptions = set().union(*(self._by_topic.get(topic, ()) for topic in topics))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:  # The client's event loop is gone
+                self.unsubscribe(subscription)
+
+
+class LocalBackend:
+    """Delivers events to this process only. Fine for development or a single ASGI worker."""
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, topics, event):
+        self.broker.dispatch(topics, event)
+
+    def start(self):
+        pass
+
+
+class RedisBackend:
+    """Shares events between worker processes through one Redis pub/sub channel."""
+
+    channel = 'devconnect:events'
+
+    def __init__(self, broker):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured("RedisBackend needs the 'redis' package.")
+        url = getattr(settings, 'REALTIME_REDIS_URL', 'redis://localhost:6379/0')
+        self.broker = broker
+        self.client = redis.Redis.from_url(url)
+        self._listener = None
+        self._lock = threading.Lock()
+
+    def publish(self, topics, event):
+        self.client.publish(self.channel, json.dumps({"topics": list(topics), "event": event}))
+
+    def start(self):
+        if self._listener is not None and self._listener.is_alive():
+            return
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self.listen, name='realtime-redis', daemon=True)
+                self._listener.start()
+
+    def listen(self, stop=None):
+        """Hand events from the channel to the broker until stop is set, reconnecting whenever Redis goes away."""
+        delay = 1
+        while not (stop and stop.is_set()):
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.channel)
+                delay = 1
+                while not (stop and stop.is_set()):
+                    message = pubsub.get_message(timeout=1)
+                    if message is not None:
+                        self._deliver(message)
+            except Exception:
+                logger.exception("Lost the realtime Redis channel, reconnecting in %s s", delay)
+                self.broker.lagged()
+                time.sleep(delay)
+                delay = min(delay * 2, REALTIME_RECONNECT_MAX)
+            finally:
+                pubsub.close()
+
+    def _deliver(self, message):
+        try:
+            payload = json.loads(message['data'])
+            topics, event = payload['topics'], payload['event']
+        except (ValueError, TypeError, KeyError):
+            logger.warning("Skipping an undecodable realtime event: %r", message.get('data'))
+            return
+        self.broker.dispatch(topics, event)
+
+
+broker = Broker()
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = import_string(REALTIME_BACKEND)(broker)
+    return _backend
+
+
+def publish(topics, event):
+    get_backend().publish(topics, event)
+
+
+def subscribe(topics):
+    """Subscribe the calling event loop to topics. Pair with unsubscribe()."""
+    topics = list(topics)
+    if not topics or len(topics) > REALTIME_MAX_TOPICS:
+        raise ValueError(f"Watch between 1 and {REALTIME_MAX_TOPICS} topics.")
+    get_backend().start()
+    return broker.subscribe(topics)
+
+
+def unsubscribe(subscription):
+    broker.unsubscribe(subscription)
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+async def event_stream(subscription):
+    """Server-Sent Events body for one subscription; ends (and unsubscribes) when the client goes away."""
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            event = await subscription.next_event(REALTIME_HEARTBEAT)
+            if subscription.dropped:
+                # Events were lost to a full queue, the client should refetch what it shows
+                yield format_sse({"type": "stream.lagged", "dropped": subscription.dropped})
+                subscription.dropped = 0
+            if event is None:
+                yield ': keep-alive\n\n'
+            else:
+                yield format_sse(event)
+    finally:
+        unsubscribe(subscription)
@@ -0,0 +1,171 @@
+"""
+Full-text search over post content.
+
+The index lives in the database next to the posts:
+
+* MySQL: a FULLTEXT index on DevConnect_post.content, kept current by InnoDB
+  itself and queried with MATCH ... AGAINST.
+* SQLite (development and tests): an FTS5 table, DevConnect_post_fts, whose
+  rowid is the post id. Signal handlers update it on post create/edit/delete.
+
+Both are created by migration 0004. Pick another backend with SEARCH_BACKEND
+(dotted path to a SearchBackend subclass). Results are ranked by relevance
+and paginated with an opaque (score, id) keyset cursor. Relevance is a float
+that a database need not compute bit for bit the same on every query, so it
+is ranked and compared as an integer, rounded to 1/SCORE_SCALE: equal
+relevance then always compares equal, and ties fall to the id.
+"""
+import base64
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import BigIntegerField, Q
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+SEARCH_PAGE_SIZE = getattr(settings, 'SEARCH_PAGE_SIZE', 20)
+SEARCH_MAX_PAGE_SIZE = getattr(settings, 'SEARCH_MAX_PAGE_SIZE', 100)
+
+FTS_TABLE = 'DevConnect_post_fts'
+SCORE_SCALE = 10 ** 6  # Search scores are relevance in millionths
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(score, post_id):
+    """An opaque cursor for the (integer score, post id) of the last row of a page."""
+    return base64.urlsafe_b64encode(f'{score}:{post_id}'.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        score, post_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(score), int(post_id)
+    except (ValueError, UnicodeDecodeError):
+        raise InvalidCursor(cursor)
+
+
+class SearchBackend:
+    """Maintains the post index and answers ranked queries with post ids, best match first."""
+
+    def index(self, post):
+        """Add or refresh one post."""
+
+    def remove(self, post_id):
+        """Drop one post."""
+
+    def reindex(self, batch_size=1000):
+        """Rebuild the whole index, batch_size posts at a time; returns the number of posts indexed."""
+        raise NotImplementedError
+
+    def search(self, query, after=None, limit=SEARCH_PAGE_SIZE):
+        """
+        Return [(post_id, score), ...] for one page, best match first, with
+        integer scores (relevance * SCORE_SCALE, rounded).
+        `after` is the (score, post_id) of the last result on the previous page.
+        """
+        raise NotImplementedError
+
+
+class MySQLFullTextBackend(SearchBackend):
+    """InnoDB keeps the FULLTEXT index in step with the table, so index/remove/reindex have nothing to do."""
+
+    def reindex(self, batch_size=1000):
+        # Nothing to rebuild: the index already holds every post. (OPTIMIZE TABLE would
+        # recreate the whole posts table on InnoDB, so it is left to the DBA.)
+        return Post.objects.count()
+
+    def search(self, query, after=None, limit=SEARCH_PAGE_SIZE):
+        score = RawSQL(
+            f'CAST(ROUND(MATCH (content) AGAINST (%s IN NATURAL LANGUAGE MODE) * {SCORE_SCALE}) AS SIGNED)',
+            (query,), output_field=BigIntegerField(),
+        )
+        matches = Post.objects.annotate(score=score).filter(score__gt=0)
+        if after is not None:
+            last_score, last_id = after
+            matches = matches.filter(Q(score__lt=last_score) | Q(score=last_score, id__lt=last_id))
+        return list(matches.order_by('-score', '-id').values_list('id', 'score')[:limit])
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """FTS5 ranks with bm25(), where lower is better; scores are negated so higher means better everywhere."""
+
+    def index(self, post):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post.id])
+            cursor.execute(f'INSERT INTO {FTS_TABLE} (rowid, content) VALUES (%s, %s)', [post.id, post.content])
+
+    def remove(self, post_id):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [post_id])
+
+    def reindex(self, batch_size=1000):
+        indexed = 0
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            rows = Post.objects.order_by('id').values_list('id', 'content').iterator(chunk_size=batch_size)
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, content) VALUES (%s, %s)', batch)
+                    indexed += len(batch)
+                    batch = []
+            if batch:
+                cursor.executemany(f'INSERT INTO {FTS_TABLE} (rowid, content) VALUES (%s, %s)', batch)
+                indexed += len(batch)
+        return indexed
+
+    def search(self, query, after=None, limit=SEARCH_PAGE_SIZE):
+        # Quote every term so user input can't inject FTS5 query syntax
+        match = ' '.join('"{}"'.format(term.replace('"', '""')) for term in query.split())
+        score = f'CAST(ROUND(-rank * {SCORE_SCALE}) AS INTEGER)'
+        sql = f'SELECT rowid, {score} FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s'
+        params = [match]
+        if after is not None:
+            last_score, last_id = after
+            sql += f' AND ({score} < %s OR ({score} = %s AND rowid < %s))'
+            params += [last_score, last_score, last_id]
+        sql += f' ORDER BY {score} DESC, rowid DESC LIMIT %s'
+        params.append(limit)
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+
+BACKENDS = {
+    'mysql': MySQLFullTextBackend,
+    'sqlite': SQLiteFTS5Backend,
+}
+
+_backend = None
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        path = getattr(settings, 'SEARCH_BACKEND', None)
+        if path:
+            _backend = import_string(path)()
+        elif connection.vendor in BACKENDS:
+            _backend = BACKENDS[connection.vendor]()
+        else:
+            raise ImproperlyConfigured(f"No post search backend for database vendor '{connection.vendor}'.")
+    return _backend
+
+
+def search_posts(query, cursor=None, limit=SEARCH_PAGE_SIZE):
+    """Return (ranked post ids, next cursor) for one page of results."""
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+    after = decode_cursor(cursor) if cursor else None
+    hits = get_backend().search(query, after=after, limit=limit)
+    next_cursor = None
+    if len(hits) == limit:
+        last_id, last_score = hits[-1]
+        next_cursor = encode_cursor(last_score, last_id)
+    return [post_id for post_id, score in hits], next_cursor
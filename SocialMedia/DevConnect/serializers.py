@@ -1,6 +1,43 @@
 from rest_framework import serializers
+from django.db.models import BooleanField, Exists, OuterRef, Value
 from .models import Profile, Post, Like, Comment, Follow
 from django.contrib.auth.models import User
+from django.utils import timezone
+
+
+class QuerysetAwareMixin:
+    """
+    Lets a serializer declare the joins its nested fields need.
+
+    List views pass their queryset through setup_queryset() so serializing a
+    page costs the same number of queries whether it holds 10 rows or 1,000.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    # The .values() columns a whole-table list streams (renderers.stream_values), and
+    # stream_row() turns each into what to_representation() would give
+    stream_fields = ()
+
+    @classmethod
+    def setup_queryset(cls, queryset, viewer=None):
+        if cls.select_related_fields:
+            queryset = queryset.select_related(*cls.select_related_fields)
+        if cls.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*cls.prefetch_related_fields)
+        return cls.annotate_for_viewer(queryset, viewer)
+
+    @classmethod
+    def annotate_for_viewer(cls, queryset, viewer):
+        """Add per-viewer flags (is_liked, is_following) to the page query."""
+        return queryset
+
+    @classmethod
+    def stream_queryset(cls, queryset, viewer=None):
+        return cls.annotate_for_viewer(queryset, viewer).values(*cls.stream_fields)
+
+    @staticmethod
+    def stream_row(row):
+        return row
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -9,7 +46,38 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 
-class ProfileSerializer(serializers.ModelSerializer):
+class UserListSerializer(QuerysetAwareMixin, UserSerializer):
+    stream_fields = ('id', 'username', 'email', 'viewer_follows')
+
+    is_following = serializers.SerializerMethodField()
+
+    class Meta(UserSerializer.Meta):
+        fields = UserSerializer.Meta.fields + ['is_following']
+
+    @classmethod
+    def annotate_for_viewer(cls, queryset, viewer):
+        if viewer is None or not viewer.is_authenticated:
+            return queryset.annotate(viewer_follows=Value(False, output_field=BooleanField()))
+        return queryset.annotate(
+            viewer_follows=Exists(Follow.objects.filter(follower=viewer, following=OuterRef('pk')))
+        )
+
+    @staticmethod
+    def stream_row(row):
+        return {"id": row['id'], "username": row['username'], "email": row['email'], "is_following": row['viewer_follows']}
+
+    def get_is_following(self, obj):
+        if hasattr(obj, 'viewer_follows'):
+            return obj.viewer_follows
+        request = self.context.get('request')
+        if request and request.user.is_authenticated:
+            return Follow.objects.filter(follower=request.user, following=obj).exists()
+        return False
+
+
+class ProfileSerializer(QuerysetAwareMixin, serializers.ModelSerializer):
+    select_related_fields = ('user',)
+
     user = UserSerializer()
 
     class Meta:
@@ -19,7 +87,11 @@ class ProfileSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         user_data = validated_data.pop('user')
         user = User.objects.create(**user_data)
-        profile = Profile.objects.create(user=user, **validated_data)
+        # The profile row is created by the User post_save signal
+        profile = user.profile
+        for attr, value in validated_data.items():
+            setattr(profile, attr, value)
+        profile.save()
         return profile
 
     def update(self, instance, validated_data):
@@ -40,22 +112,57 @@ class ProfileSerializer(serializers.ModelSerializer):
 
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(QuerysetAwareMixin, serializers.ModelSerializer):
+    select_related_fields = ('author',)
+    stream_fields = (
+        'id', 'author_id', 'author__username', 'author__email', 'content', 'created_at', 'updated_at',
+        'like_count', 'comment_count', 'is_liked',
+    )
+
     author = UserSerializer(read_only=True)
     like_count = serializers.IntegerField( read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    is_liked = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'content', 'created_at', 'updated_at', 'like_count',]
-        
-        def get_is_liked(self, obj):
-            request = self.context.get('request')
-            if request and request.user.is_authenticated:
-                return obj.likes.filter(user=request.user).exists()
+        fields = ['id', 'author', 'content', 'created_at', 'updated_at', 'like_count', 'comment_count', 'is_liked',]
+
+    @classmethod
+    def annotate_for_viewer(cls, queryset, viewer):
+        return queryset.with_is_liked(viewer)
+
+    @staticmethod
+    def stream_row(row):
+        return {
+            "id": row['id'],
+            "author": {"id": row['author_id'], "username": row['author__username'], "email": row['author__email']},
+            "content": row['content'],
+            # DateTimeField renders in the current time zone
+            "created_at": timezone.localtime(row['created_at']),
+            "updated_at": timezone.localtime(row['updated_at']),
+            "like_count": row['like_count'],
+            "comment_count": row['comment_count'],
+            "is_liked": row['is_liked'],
+        }
+
+    def get_is_liked(self, obj):
+        # List views annotate the whole page; single posts fall back to one EXISTS,
+        # remembered per request so nested posts (comments on one post) ask once.
+        if hasattr(obj, 'is_liked'):
+            return obj.is_liked
+        request = self.context.get('request')
+        if not (request and request.user.is_authenticated):
             return False
+        liked = self.context.setdefault('liked_posts', {})
+        if obj.pk not in liked:
+            liked[obj.pk] = obj.likes.filter(user=request.user).exists()
+        return liked[obj.pk]
+
 
+class LikeSerializer(QuerysetAwareMixin, serializers.ModelSerializer):
+    select_related_fields = ('user', 'post__author')
 
-class LikeSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     post = PostSerializer(read_only=True)
 
@@ -64,7 +171,9 @@ class LikeSerializer(serializers.ModelSerializer):
         fields = ['id', 'user', 'post', 'created_at']
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(QuerysetAwareMixin, serializers.ModelSerializer):
+    select_related_fields = ('author', 'post__author')
+
     author = UserSerializer(read_only=True)
     post = PostSerializer(read_only=True)
 
@@ -73,7 +182,9 @@ class CommentSerializer(serializers.ModelSerializer):
         fields = ['id', 'author', 'post', 'content', 'created_at']
 
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(QuerysetAwareMixin, serializers.ModelSerializer):
+    select_related_fields = ('follower', 'following')
+
     follower = UserSerializer(read_only=True)
     following = UserSerializer(read_only=True)
 
@@ -0,0 +1,176 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Profile, Post, Like, Comment, Follow
+from . import authentication, conditional, feed, object_cache, realtime, search, suggestions
+
+
+# Every user gets a profile, it holds their follower counters
+@receiver(post_save, sender=User)
+def create_profile(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.get_or_create(user=instance)
+
+
+# Push new posts into follower timelines once the post is committed. This and the
+# other after-commit work below is robust: a failure is logged rather than raised,
+# since the write itself has already committed (rebuild_timelines repairs timelines).
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: feed.fan_out_post(instance), robust=True)
+
+
+# Counter updates run in the same transaction as the row that caused them
+@receiver(post_save, sender=Like)
+def count_like(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(like_count=F('like_count') + 1)
+
+
+@receiver(post_delete, sender=Like)
+def uncount_like(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(like_count=F('like_count') - 1)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') + 1)
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    Post.objects.filter(pk=instance.post_id).update(comment_count=F('comment_count') - 1)
+
+
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, **kwargs):
+    if created:
+        Profile.objects.filter(user_id=instance.following_id).update(follower_count=F('follower_count') + 1)
+        Profile.objects.filter(user_id=instance.follower_id).update(following_count=F('following_count') + 1)
+        transaction.on_commit(lambda: feed.backfill_follow(instance.follower_id, instance.following_id), robust=True)
+
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    Profile.objects.filter(user_id=instance.following_id).update(follower_count=F('follower_count') - 1)
+    Profile.objects.filter(user_id=instance.follower_id).update(following_count=F('following_count') - 1)
+    feed.remove_follow(instance.follower_id, instance.following_id)
+
+
+# Keep who-to-follow lists current once the follow is committed
+@receiver(post_save, sender=Follow)
+def suggest_on_follow(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: suggestions.follow_changed(instance.follower_id, instance.following_id, +1), robust=True)
+
+
+@receiver(post_delete, sender=Follow)
+def suggest_on_unfollow(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggestions.follow_changed(instance.follower_id, instance.following_id, -1), robust=True)
+
+
+# Drop cached posts and user cards once the rows behind them change
+@receiver([post_save, post_delete], sender=Post)
+def invalidate_post(sender, instance, **kwargs):
+    object_cache.invalidate_posts(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Comment)
+def invalidate_post_counts(sender, instance, **kwargs):
+    object_cache.invalidate_posts(instance.post_id)
+
+
+@receiver([post_save, post_delete], sender=User)
+def invalidate_user(sender, instance, **kwargs):
+    object_cache.invalidate_users(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=Profile)
+def invalidate_profile(sender, instance, **kwargs):
+    object_cache.invalidate_users(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def invalidate_follow_counts(sender, instance, **kwargs):
+    object_cache.invalidate_users(instance.follower_id, instance.following_id)
+
+
+# A new version of the post list for conditional GETs, on anything it shows
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Like)
+@receiver([post_save, post_delete], sender=Comment)
+def bump_post_list(sender, instance, **kwargs):
+    conditional.bump_post_list()
+
+
+@receiver([post_save, post_delete], sender=User)
+def bump_post_list_author(sender, instance, update_fields=None, **kwargs):
+    # Posts show their author's username and email; a login only saves last_login
+    if update_fields is None or {'username', 'email'} & set(update_fields):
+        conditional.bump_post_list()
+
+
+# Cached auth state must follow the user row. A new password also revokes the user's tokens:
+# set_password() leaves the raw password in _password until the save that stores the hash.
+@receiver(post_save, sender=User)
+def refresh_auth_state(sender, instance, created, **kwargs):
+    if not created and getattr(instance, '_password', None) is not None:
+        authentication.revoke_tokens(instance.pk)
+    else:
+        authentication.forget_state(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def drop_auth_state(sender, instance, **kwargs):
+    authentication.forget_state(instance.pk)
+
+
+# Keep the full-text search index in step with post content
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    transaction.on_commit(lambda: search.get_backend().index(instance), robust=True)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    post_id = instance.pk
+    transaction.on_commit(lambda: search.get_backend().remove(post_id), robust=True)
+
+
+# Push activity to real-time subscribers once it is committed
+@receiver(post_save, sender=Post)
+def publish_post(sender, instance, created, **kwargs):
+    if created:
+        event = {"type": "post.created", "post_id": instance.pk, "author_id": instance.author_id}
+        transaction.on_commit(lambda: realtime.publish([realtime.author_topic(instance.author_id)], event), robust=True)
+
+
+@receiver(post_save, sender=Like)
+def publish_like(sender, instance, created, **kwargs):
+    if created:
+        event = {"type": "post.liked", "post_id": instance.post_id, "user_id": instance.user_id}
+        transaction.on_commit(lambda: realtime.publish([realtime.post_topic(instance.post_id)], event), robust=True)
+
+
+@receiver(post_delete, sender=Like)
+def publish_unlike(sender, instance, **kwargs):
+    event = {"type": "post.unliked", "post_id": instance.post_id, "user_id": instance.user_id}
+    transaction.on_commit(lambda: realtime.publish([realtime.post_topic(instance.post_id)], event), robust=True)
+
+
+@receiver(post_save, sender=Comment)
+def publish_comment(sender, instance, created, **kwargs):
+    if created:
+        event = {
+            "type": "comment.added",
+            "post_id": instance.post_id,
+            "comment_id": instance.pk,
+            "author_id": instance.author_id,
+        }
+        transaction.on_commit(lambda: realtime.publish([realtime.post_topic(instance.post_id)], event), robust=True)
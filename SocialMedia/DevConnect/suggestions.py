@@ -0,0 +1,211 @@
+"""
+"Who to follow" suggestions from friends of friends.
+
+A candidate for user U is anyone followed by the accounts U follows, scored by
+how many of them follow it (the mutual count), minus U and the accounts U
+already follows. The top SUGGESTIONS_PER_USER candidates per user are stored
+in the Suggestion table, so GET /api/users/suggested/ is one read of the
+(user, -score, candidate) index.
+
+The graph is held as CSR-style arrays rather than ORM objects: the followers
+that have out-edges, sorted, and for each of them one slice of a flat array of
+followee ids. A full rebuild (`manage.py rebuild_suggestions`) reads the
+Follow table in keyset pages on (follower_id, following_id), appending each
+page to the arrays before the next is read, and scores every user against the
+one graph. Between
+rebuilds, lists are kept current incrementally by follow_changed(): when A
+follows or unfollows B, A's scores for B's followees move by one, and A's most
+recent followers have their score for B moved by one (or get B as a new
+candidate). Accounts new to a list are stored with their full mutual count,
+and every list touched is cut back to its top SUGGESTIONS_PER_USER. Both sides
+read at most SUGGESTIONS_MAX_FANOUT accounts, so a follow costs the same however
+connected A and B are; followers past the cap catch up at the next rebuild.
+"""
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Follow, Suggestion
+
+SUGGESTIONS_PER_USER = getattr(settings, 'SUGGESTIONS_PER_USER', 50)
+SUGGESTED_PAGE_SIZE = getattr(settings, 'SUGGESTED_PAGE_SIZE', 20)
+# Followees of a followee looked at, so one account following millions doesn't dominate the work
+SUGGESTIONS_MAX_FANOUT = getattr(settings, 'SUGGESTIONS_MAX_FANOUT', 1000)
+SUGGESTIONS_BATCH_SIZE = getattr(settings, 'SUGGESTIONS_BATCH_SIZE', 1000)
+
+
+class FollowGraph:
+    """Compressed sparse rows of follower -> followee ids."""
+
+    def __init__(self, edges):
+        """edges: (follower_id, following_id) pairs sorted by follower_id."""
+        self.ids = array('q')  # Followers with at least one followee, ascending
+        self.indptr = array('q', [0])  # Followees of ids[i] are indices[indptr[i]:indptr[i + 1]]
+        self.indices = array('q')
+        for follower_id, following_id in edges:
+            if not self.ids or self.ids[-1] != follower_id:
+                if self.ids:
+                    self.indptr.append(len(self.indices))
+                self.ids.append(follower_id)
+            self.indices.append(following_id)
+        if self.ids:
+            self.indptr.append(len(self.indices))
+
+    @classmethod
+    def from_queryset(cls, follows, chunk_size=10000):
+        return cls(_edge_pages(follows, chunk_size))
+
+    def followees(self, user_id):
+        i = bisect_left(self.ids, user_id)
+        if i == len(self.ids) or self.ids[i] != user_id:
+            return self.indices[0:0]
+        return self.indices[self.indptr[i]:self.indptr[i + 1]]
+
+    def candidates(self, user_id, limit=SUGGESTIONS_PER_USER):
+        """Top friends-of-friends of user_id as [(candidate_id, mutual_count)], best first."""
+        followed = set(self.followees(user_id))
+        scores = Counter()
+        for followee_id in followed:
+            for candidate_id in self.followees(followee_id)[:SUGGESTIONS_MAX_FANOUT]:
+                if candidate_id != user_id and candidate_id not in followed:
+                    scores[candidate_id] += 1
+        # Ties go to the older account, so lists are stable between runs
+        return heapq.nlargest(limit, scores.items(), key=lambda item: (item[1], -item[0]))
+
+
+def _edge_pages(follows, chunk_size):
+    """
+    The (follower_id, following_id) pairs of follows in order, one keyset page per
+    query on the unique (follower, following) index. .iterator() would have MySQL
+    buffer the whole table client-side first.
+    """
+    edges = follows.order_by('follower_id', 'following_id').values_list('follower_id', 'following_id')
+    last = None
+    while True:
+        page = list((edges if last is None else edges.filter(
+            Q(follower_id__gt=last[0]) | Q(follower_id=last[0], following_id__gt=last[1])
+        ))[:chunk_size])
+        yield from page
+        if len(page) < chunk_size:
+            return
+        last = page[-1]
+
+
+def _store(graph, user_ids):
+    """Replace the stored lists of user_ids with fresh ones from graph."""
+    rows = [
+        Suggestion(user_id=user_id, candidate_id=candidate_id, score=score)
+        for user_id in user_ids
+        for candidate_id, score in graph.candidates(user_id)
+    ]
+    with transaction.atomic():
+        Suggestion.objects.filter(user_id__in=user_ids).delete()
+        Suggestion.objects.bulk_create(rows, batch_size=SUGGESTIONS_BATCH_SIZE)
+
+
+def rebuild_all():
+    """Recompute every user's list from one in-memory graph. Returns the number of users with suggestions."""
+    graph = FollowGraph.from_queryset(Follow.objects.all())
+    # Users who follow nobody have no friends of friends; drop any list they had
+    Suggestion.objects.exclude(user_id__in=Follow.objects.values('follower_id')).delete()
+    for start in range(0, len(graph.ids), SUGGESTIONS_BATCH_SIZE):
+        _store(graph, list(graph.ids[start:start + SUGGESTIONS_BATCH_SIZE]))
+    return len(graph.ids)
+
+
+def _trim(user_ids):
+    """Cut the stored lists of user_ids back to their top SUGGESTIONS_PER_USER, ranked as the API ranks them."""
+    rank = Window(RowNumber(), partition_by=F('user_id'), order_by=(F('score').desc(), F('candidate_id').asc()))
+    cut = list(
+        Suggestion.objects.filter(user_id__in=user_ids).annotate(rank=rank)
+        .filter(rank__gt=SUGGESTIONS_PER_USER).values_list('pk', flat=True)
+    )
+    if cut:
+        Suggestion.objects.filter(pk__in=cut).delete()
+
+
+def _move_paths(user_id, followee_id, delta):
+    """Move user_id's scores for the followees of followee_id by delta, now that user_id (un)follows it."""
+    # The same followees FollowGraph.candidates() counts: the first SUGGESTIONS_MAX_FANOUT by id
+    candidate_ids = list(
+        Follow.objects.filter(follower_id=followee_id)
+        .order_by('following_id')
+        .values_list('following_id', flat=True)[:SUGGESTIONS_MAX_FANOUT]
+    )
+    followed = set(
+        Follow.objects.filter(follower_id=user_id, following_id__in=candidate_ids)
+        .values_list('following_id', flat=True)
+    )
+    candidate_ids = [
+        candidate_id for candidate_id in candidate_ids if candidate_id != user_id and candidate_id not in followed
+    ]
+
+    own = Suggestion.objects.filter(user_id=user_id)
+    own.filter(candidate_id__in=candidate_ids).update(score=F('score') + delta)
+    if delta > 0:
+        own.filter(candidate_id=followee_id).delete()  # Followed now, no longer a candidate
+        listed = set(own.filter(candidate_id__in=candidate_ids).values_list('candidate_id', flat=True))
+        # Not listed (never, or cut from the list): stored with every path to them, not just this one
+        mutual = (
+            Follow.objects.filter(
+                following_id__in=[candidate_id for candidate_id in candidate_ids if candidate_id not in listed],
+                follower_id__in=Follow.objects.filter(follower_id=user_id).values('following_id'),
+            )
+            .values_list('following_id').annotate(score=Count('pk'))
+        )
+        Suggestion.objects.bulk_create(
+            [Suggestion(user_id=user_id, candidate_id=candidate_id, score=score) for candidate_id, score in mutual],
+            batch_size=SUGGESTIONS_BATCH_SIZE,
+            ignore_conflicts=True,  # Added since by a concurrent update, which counted this path
+        )
+    else:
+        own.filter(score__lte=0).delete()
+        # The unfollowed account is a candidate again if other followees follow it
+        mutual = Follow.objects.filter(
+            following_id=followee_id, follower_id__in=Follow.objects.filter(follower_id=user_id).values('following_id'),
+        ).count()
+        if mutual:
+            Suggestion.objects.update_or_create(user_id=user_id, candidate_id=followee_id, defaults={'score': mutual})
+    _trim([user_id])
+
+
+def follow_changed(follower_id, following_id, delta):
+    """Bring stored lists up to date after follower_id (un)followed following_id (delta +1 / -1)."""
+    _move_paths(follower_id, following_id, delta)
+
+    # Everyone following the follower now has one more (or one fewer) path to following_id. Only the
+    # most recent followers are updated now, the rest pick it up at the next rebuild.
+    audience = list(
+        Follow.objects.filter(following_id=follower_id)
+        .exclude(follower_id=following_id)
+        .order_by('-created_at')
+        .values_list('follower_id', flat=True)[:SUGGESTIONS_MAX_FANOUT]
+    )
+    affected = Suggestion.objects.filter(user_id__in=audience, candidate_id=following_id)
+    if delta < 0:
+        affected.update(score=F('score') + delta)
+        affected.filter(score__lte=0).delete()
+        return
+
+    listed = set(affected.values_list('user_id', flat=True))
+    affected.update(score=F('score') + delta)
+    # ...and it is a new candidate, with every path to it, for the ones that don't follow it yet
+    mutual = (
+        Follow.objects.filter(follower_id__in=[user_id for user_id in audience if user_id not in listed])
+        .exclude(follower_id__in=Follow.objects.filter(following_id=following_id).values('follower_id'))
+        .filter(Exists(Follow.objects.filter(follower_id=OuterRef('following_id'), following_id=following_id)))
+        .values_list('follower_id').annotate(score=Count('pk'))
+    )
+    rows = [Suggestion(user_id=user_id, candidate_id=following_id, score=score) for user_id, score in mutual]
+    Suggestion.objects.bulk_create(
+        rows,
+        batch_size=SUGGESTIONS_BATCH_SIZE,
+        ignore_conflicts=True,  # Added since by a concurrent update, which counted this path
+    )
+    _trim([row.user_id for row in rows])
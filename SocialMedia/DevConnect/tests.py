@@ -1,3 +1,2025 @@
-from django.test import TestCase
+import asyncio
+import copy
+import gzip
+import importlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+from io import StringIO
 
-# Create your tests here.
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, connections, transaction
+from django.db.models import F, QuerySet
+from django.http import HttpResponse
+from django.test import AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from . import (
+    authentication, batch, compression, db_router, exports, feed, interactions, like_buffer, object_cache,
+    provisioning, query_plans, realtime, renderers, search, suggestions, trending,
+)
+from .instrumentation import RequestTimingMiddleware
+from .interactions import toggle_follow, toggle_like
+from .models import (
+    Post, Like, Comment, DataExport, Follow, Profile, ReplicaHeartbeat, Suggestion, TimelineEntry, TrendingScore,
+    TrendingState,
+)
+from .serializers import PostSerializer, UserListSerializer
+
+
+def read_json(response):
+    """response.json(), for streamed responses too."""
+    return json.loads(b''.join(response.streaming_content) if response.streaming else response.content)
+
+
+class TimelineTests(TestCase):
+    """New posts are pushed to followers' timelines; celebrities' posts are pulled in when the timeline is read."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.celebrity = User.objects.create_user(username='celebrity', password='pass')
+        self.reader = User.objects.create_user(username='reader', password='pass')
+        self.fan = User.objects.create_user(username='fan', password='pass')
+        patch = mock.patch.object(feed, 'FEED_CELEBRITY_THRESHOLD', 3)
+        patch.start()
+        self.addCleanup(patch.stop)
+        with self.captureOnCommitCallbacks(execute=True):
+            for follower in (self.reader, self.fan, self.author):
+                Follow.objects.create(follower=follower, following=self.celebrity)
+            Follow.objects.create(follower=self.reader, following=self.author)
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def timeline(self, user):
+        return set(TimelineEntry.objects.filter(owner=user).values_list('post_id', flat=True))
+
+    def test_fan_out_on_write(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, content='pushed')
+        self.assertEqual(self.timeline(self.reader), {post.pk})
+        self.assertEqual(self.timeline(self.author), {post.pk})
+        self.assertEqual(self.timeline(self.fan), set())
+
+    def test_celebrity_posts_are_pulled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            posts = [
+                Post.objects.create(author=author, content=f'{author.username} {i}')
+                for i in range(3) for author in (self.author, self.celebrity)
+            ]
+        # Only the author's own timeline gets the celebrity's posts written
+        self.assertEqual(self.timeline(self.celebrity), {p.pk for p in posts if p.author == self.celebrity})
+        self.assertEqual(self.timeline(self.fan), set())
+
+        first = self.client.get(reverse('api_feed'), {'limit': 4}).json()
+        second = self.client.get(reverse('api_feed'), {'limit': 4, 'cursor': first['next_cursor']}).json()
+        self.assertEqual(
+            [p['id'] for p in first['results'] + second['results']], [p.pk for p in reversed(posts)],
+        )
+        self.assertIsNone(second['next_cursor'])
+
+        self.client.force_authenticate(self.fan)
+        data = self.client.get(reverse('api_feed')).json()
+        self.assertEqual([p['content'] for p in data['results']], ['celebrity 2', 'celebrity 1', 'celebrity 0'])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.author, content='earlier')
+            Follow.objects.create(follower=self.fan, following=self.author)
+        self.assertEqual(self.timeline(self.fan), {post.pk})
+
+        Follow.objects.get(follower=self.fan, following=self.author).delete()
+        self.assertEqual(self.timeline(self.fan), set())
+
+    def test_backfill_migration(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            own = Post.objects.create(author=self.reader, content='mine')
+            followed = Post.objects.create(author=self.author, content='followed')
+            Post.objects.create(author=self.celebrity, content='pulled')
+        TimelineEntry.objects.all().delete()
+
+        migration = importlib.import_module('DevConnect.migrations.0012_backfill_timelines')
+        with mock.patch.object(migration, 'FEED_CELEBRITY_THRESHOLD', 3):
+            with self.assertNumQueries(6):  # Celebrities, then users, follows, followees' posts, own posts, insert
+                migration.backfill_timelines(apps, connection.schema_editor())
+            migration.backfill_timelines(apps, connection.schema_editor())  # Safe to run again
+        self.assertEqual(self.timeline(self.reader), {own.pk, followed.pk})
+        self.assertEqual(self.timeline(self.fan), set())
+        self.assertEqual(TimelineEntry.objects.count(), 4)  # Each author also sees their own post
+
+
+class CounterTests(TestCase):
+    """Like, comment and follower counters move with the rows they count; recount repairs drift."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass')
+        self.other = User.objects.create_user(username='bob', password='pass')
+        self.post = Post.objects.create(author=self.other, content='post')
+
+    def counts(self):
+        self.post.refresh_from_db()
+        profiles = {p.user_id: (p.follower_count, p.following_count) for p in Profile.objects.all()}
+        return (self.post.like_count, self.post.comment_count), profiles[self.user.pk], profiles[self.other.pk]
+
+    def test_counters_follow_writes(self):
+        like = Like.objects.create(user=self.user, post=self.post)
+        Like.objects.create(user=self.other, post=self.post)
+        comment = Comment.objects.create(author=self.user, post=self.post, content='hi')
+        follow = Follow.objects.create(follower=self.user, following=self.other)
+        self.assertEqual(self.counts(), ((2, 1), (0, 1), (1, 0)))
+
+        like.delete()
+        comment.delete()
+        follow.delete()
+        self.assertEqual(self.counts(), ((1, 0), (0, 0), (0, 0)))
+
+    def test_failed_counter_update_rolls_back_the_comment(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = reverse('api_comment_list', args=[self.post.pk])
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError("lost connection")):
+            with self.assertRaises(DatabaseError):
+                client.post(url, {'content': 'hi'}, format='json')
+        self.assertFalse(Comment.objects.exists())
+
+        self.client.force_login(self.user)
+        with mock.patch.object(QuerySet, 'update', side_effect=DatabaseError("lost connection")):
+            with self.assertRaises(DatabaseError):
+                self.client.post(reverse('comment_post', args=[self.post.pk]), {'content': 'hi'})
+        self.assertFalse(Comment.objects.exists())
+
+        client.post(url, {'content': 'hi'}, format='json')
+        self.assertEqual(self.counts()[0], (0, 1))
+
+    def test_recount(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Follow.objects.create(follower=self.user, following=self.other)
+        Post.objects.update(like_count=7, comment_count=3)
+        Profile.objects.filter(user=self.other).update(follower_count=0)
+
+        out = StringIO()
+        call_command('recount', '--batch-size', '1', stdout=out)
+        self.assertIn("Posts fixed: 1", out.getvalue())
+        self.assertIn("Profiles fixed: 1", out.getvalue())
+        self.assertEqual(self.counts(), ((1, 0), (0, 1), (1, 0)))
+
+    def test_migration_backfills_counters(self):
+        Like.objects.create(user=self.user, post=self.post)
+        Comment.objects.create(author=self.user, post=self.post, content='hi')
+        Follow.objects.create(follower=self.user, following=self.other)
+        Post.objects.update(like_count=0, comment_count=0)
+        Profile.objects.update(follower_count=0, following_count=0)
+
+        migration = importlib.import_module('DevConnect.migrations.0003_denormalized_counters')
+        migration.backfill_counters(apps, connection.schema_editor())
+        self.assertEqual(self.counts(), ((1, 1), (0, 1), (1, 0)))
+
+
+class QueryBudgetTests(TestCase):
+    """List endpoints must cost the same number of queries at any page size."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_rows(self, n):
+        authors = User.objects.bulk_create([User(username=f'author{i}') for i in range(n)])
+        posts = Post.objects.bulk_create([Post(author=author, content='post') for author in authors])
+        Comment.objects.bulk_create([Comment(author=author, post=posts[0], content='comment') for author in authors])
+        Like.objects.bulk_create([Like(user=author, post=posts[0]) for author in authors])
+        Follow.objects.bulk_create([Follow(follower=author, following=self.user) for author in authors])
+        Post.objects.bulk_create([Post(author=self.user, content='mine') for _ in range(n)])
+        return posts[0]
+
+    def assertQueryBudget(self, num, url_for_post):
+        for n in (10, 1000):
+            with self.subTest(rows=n):
+                Post.objects.all().delete()
+                User.objects.exclude(pk=self.user.pk).delete()
+                post = self.make_rows(n)
+                with self.assertNumQueries(num):
+                    response = self.client.get(url_for_post(post))
+                    read_json(response)  # Streamed lists query as they are read
+                self.assertEqual(response.status_code, 200)
+
+    def test_post_list(self):
+        # The ETag's version is in the cache, and all 2,000 posts fit one keyset page
+        with mock.patch.object(renderers, 'STREAM_CHUNK_SIZE', 5000):
+            self.assertQueryBudget(1, lambda post: reverse('api_post_list'))
+
+    def test_mypost_list(self):
+        self.assertQueryBudget(1, lambda post: reverse('api_mypost_list'))
+
+    def test_comment_list(self):
+        # post version (with the viewer's like of the shared post), comments page
+        self.assertQueryBudget(2, lambda post: reverse('api_comment_list', args=[post.id]))
+
+    def test_like_details(self):
+        self.assertQueryBudget(2, lambda post: reverse('api_like_post', args=[post.id]))
+
+    def test_follow_details(self):
+        # stored counts, first page of followers
+        self.assertQueryBudget(2, lambda post: reverse('api_follow_list', args=[self.user.id]))
+
+    def test_followers_page(self):
+        self.assertQueryBudget(2, lambda post: reverse('api_user_followers', args=[self.user.id]))
+
+    def test_user_list(self):
+        self.assertQueryBudget(1, lambda post: reverse('user-list'))
+
+
+class FollowListTests(TestCase):
+    """Followers/following are keyset-paginated; the toggle answers with state and counts only."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.others = [User.objects.create_user(username=f'user{i}') for i in range(7)]
+        # bulk_create gives every row the same created_at, so pages must break ties on id
+        Follow.objects.bulk_create([Follow(follower=other, following=self.user) for other in self.others])
+        Follow.objects.bulk_create([Follow(follower=self.user, following=other) for other in self.others[:2]])
+        call_command('recount', stdout=StringIO())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        usernames, cursor = [], None
+        while True:
+            data = self.client.get(url, {'limit': 3, **({'cursor': cursor} if cursor else {})}).json()
+            self.assertLessEqual(len(data['results']), 3)
+            usernames += [row['username'] for row in data['results']]
+            cursor = data['next_cursor']
+            if cursor is None:
+                return data['count'], usernames
+
+    def test_followers_pages(self):
+        count, usernames = self.walk(reverse('api_user_followers', args=[self.user.id]))
+        self.assertEqual(count, 7)
+        self.assertEqual(usernames, [f'user{i}' for i in reversed(range(7))])
+
+    def test_following_pages(self):
+        count, usernames = self.walk(reverse('api_user_following', args=[self.user.id]))
+        self.assertEqual((count, usernames), (2, ['user1', 'user0']))
+
+    def test_bad_cursor_and_unknown_user(self):
+        response = self.client.get(reverse('api_user_followers', args=[self.user.id]), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(reverse('api_user_following', args=[999999]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_toggle_returns_state_only(self):
+        target = self.others[5]
+        response = self.client.post(reverse('api_follow_list', args=[target.id]))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {"message": "Followed successfully", "follower_count": 1, "is_following": True})
+        response = self.client.post(reverse('api_follow_list', args=[target.id]))
+        self.assertEqual((response.json()['is_following'], response.json()['follower_count']), (False, 0))
+
+    def test_toggle_requires_login(self):
+        target = self.others[5]
+        response = APIClient().post(reverse('api_follow_list', args=[target.id]))
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Follow.objects.filter(following=target).exists())
+        self.assertEqual(APIClient().get(reverse('api_follow_list', args=[target.id])).status_code, 200)
+
+
+class ViewerStateTests(TestCase):
+    """is_liked / is_following are computed for the whole page in the list query."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.other = User.objects.create_user(username='other', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_is_liked(self):
+        liked = Post.objects.create(author=self.other, content='liked')
+        Post.objects.create(author=self.other, content='not liked')
+        Like.objects.create(user=self.user, post=liked)
+
+        data = read_json(self.client.get(reverse('api_post_list')))
+        self.assertEqual({p['content']: p['is_liked'] for p in data}, {'liked': True, 'not liked': False})
+
+        detail = self.client.get(reverse('api-post-detail', args=[liked.id])).json()
+        self.assertTrue(detail['is_liked'])
+
+    def test_is_liked_on_feed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, following=self.other)
+            posts = [Post.objects.create(author=self.other, content=str(i)) for i in range(60)]
+        Like.objects.create(user=self.user, post=posts[-1])
+
+        # timeline ids, celebrity followees, the annotated page of posts
+        with self.assertNumQueries(3):
+            data = self.client.get(reverse('api_feed'), {'limit': 60}).json()
+        self.assertEqual([p['is_liked'] for p in data['results']], [True] + [False] * 59)
+
+    def test_is_following(self):
+        User.objects.create_user(username='stranger', password='pass')
+        Follow.objects.create(follower=self.user, following=self.other)
+
+        data = read_json(self.client.get(reverse('user-list')))
+        self.assertEqual({u['username']: u['is_following'] for u in data}, {'other': True, 'stranger': False})
+
+
+class ObjectCacheTests(TestCase):
+    """Hot posts and profiles are served from the cache and dropped when they change."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_post_detail_is_cached(self):
+        url = reverse('api-post-detail', args=[self.post.id])
+        self.client.get(url)
+        with self.assertNumQueries(1):  # Only the viewer's is_liked check
+            response = self.client.get(url)
+        self.assertEqual(response.json()['author']['username'], 'author')
+
+    def test_like_invalidates_post(self):
+        url = reverse('api-post-detail', args=[self.post.id])
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.create(user=self.user, post=self.post)
+        data = self.client.get(url).json()
+        self.assertEqual((data['like_count'], data['is_liked']), (1, True))
+
+    def test_profile_is_cached_and_invalidated(self):
+        url = reverse('get_user_profile', args=['author'])
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, following=self.author)
+        self.assertEqual(self.client.get(url).json()['follower_count'], 1)
+
+    def test_user_cards_multi_get(self):
+        ids = [self.user.id, self.author.id]
+        object_cache.get_user_cards(ids)
+        with self.assertNumQueries(0):
+            cards = object_cache.get_user_cards(ids)
+        self.assertEqual({card['username'] for card in cards.values()}, {'viewer', 'author'})
+
+
+class PaginatedPagesTests(TestCase):
+    """Template views render one page of posts and serve the rest as fragments."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.posts = [Post.objects.create(author=self.user, content=f'post {i}') for i in range(25)]
+        self.client.force_login(self.user)
+
+    def test_home_pages(self):
+        first = self.client.get(reverse('home'))
+        self.assertEqual(first.content.count(b'class="post"'), 20)
+        self.assertContains(first, 'post 24')
+        self.assertNotContains(first, 'post 4<')
+
+        cursor = first.context['next_cursor']
+        more = self.client.get(reverse('home_more'), {'cursor': cursor})
+        self.assertEqual(more.content.count(b'class="post"'), 5)
+        self.assertNotContains(more, '<html')
+
+    def test_myposts_pages(self):
+        first = self.client.get(reverse('myposts'))
+        more = self.client.get(reverse('myposts_more'), {'cursor': first.context['next_cursor']})
+        self.assertContains(more, 'post 0')
+        self.assertIsNone(more.context['next_cursor'])
+
+    def test_fragments_follow_username_changes(self):
+        for name in ('home', 'myposts', 'profile'):
+            self.assertContains(self.client.get(reverse(name)), '<strong>viewer</strong>')
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+        for name in ('home', 'myposts', 'profile'):
+            response = self.client.get(reverse(name))
+            self.assertContains(response, '<strong>renamed</strong>')
+            self.assertNotContains(response, '<strong>viewer</strong>')
+
+
+class PostStateTests(TestCase):
+    """One request returns interaction state for a whole screen of posts."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def make_posts(self, n):
+        likers = User.objects.bulk_create([User(username=f'liker{n}-{i}') for i in range(5)])
+        posts = Post.objects.bulk_create([Post(author=self.user, content='post') for _ in range(n)])
+        Like.objects.bulk_create([Like(user=liker, post=post) for post in posts for liker in likers])
+        return posts
+
+    def test_fixed_query_count(self):
+        for n in (10, 100):
+            with self.subTest(posts=n):
+                ids = ','.join(str(post.id) for post in self.make_posts(n))
+                with self.assertNumQueries(2):
+                    response = self.client.get(reverse('api_post_state'), {'ids': ids, 'likers': 3})
+                self.assertEqual(len(response.json()['results']), n)
+                self.assertTrue(all(len(post['likers']) == 3 for post in response.json()['results']))
+
+    def test_state(self):
+        liked, other = self.make_posts(2)
+        Like.objects.create(user=self.user, post=liked)
+        Post.objects.filter(pk=liked.pk).update(like_count=6, comment_count=2)
+
+        results = self.client.get(reverse('api_post_state'), {'ids': f'{other.id},{liked.id}'}).json()['results']
+        self.assertEqual([post['post_id'] for post in results], [other.id, liked.id])
+        self.assertEqual((results[1]['like_count'], results[1]['comment_count'], results[1]['is_liked']), (6, 2, True))
+        self.assertFalse(results[0]['is_liked'])
+
+    def test_too_many_ids(self):
+        ids = ','.join(str(i) for i in range(1, 102))
+        self.assertEqual(self.client.get(reverse('api_post_state'), {'ids': ids}).status_code, 400)
+
+
+class SearchTests(TestCase):
+    """Post search is served from the full-text index and kept current by signals."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_post(self, content):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=self.user, content=content)
+
+    def search(self, q, **params):
+        return self.client.get(reverse('api_search_posts'), {'q': q, **params}).json()
+
+    def test_ranked_results(self):
+        self.create_post('django tips')
+        best = self.create_post('django django django orm tricks')
+        self.create_post('nothing relevant')
+
+        results = self.search('django')['results']
+        self.assertEqual(len(results), 2)
+        self.assertEqual(results[0]['id'], best.id)
+
+    def test_incremental_updates(self):
+        post = self.create_post('old words')
+        post.content = 'fresh words'
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        self.assertEqual(self.search('old')['results'], [])
+        self.assertEqual(len(self.search('fresh')['results']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertEqual(self.search('fresh')['results'], [])
+
+    def test_index_failure_does_not_fail_the_write(self):
+        backend = mock.Mock(**{'index.side_effect': RuntimeError, 'remove.side_effect': RuntimeError})
+        with mock.patch('DevConnect.search.get_backend', return_value=backend), \
+                self.assertLogs(level='ERROR'):
+            post = self.create_post('unindexed')
+            with self.captureOnCommitCallbacks(execute=True):
+                post.delete()
+        self.assertEqual(backend.index.call_count, 1)
+        self.assertEqual(backend.remove.call_count, 1)
+
+    def test_reindex(self):
+        self.create_post('python post')
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {search.FTS_TABLE}')
+        self.assertEqual(self.search('python')['results'], [])
+        call_command('reindex_posts', '--batch-size', '1', stdout=StringIO())
+        self.assertEqual(len(self.search('python')['results']), 1)
+
+        # The MySQL index is maintained by InnoDB; reindex must not touch the posts table
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(search.MySQLFullTextBackend().reindex(), 1)
+        self.assertEqual(len(queries), 1)
+        self.assertTrue(queries[0]['sql'].startswith('SELECT COUNT'))
+
+    def test_pages_across_ties(self):
+        posts = [self.create_post('same words') for _ in range(5)]
+        self.assertEqual(len({score for _, score in search.get_backend().search('same', limit=10)}), 1)
+
+        seen, page = [], self.search('same', limit=2)
+        while True:
+            seen += [post['id'] for post in page['results']]
+            if not page['next_cursor']:
+                break
+            page = self.search('same', limit=2, cursor=page['next_cursor'])
+        self.assertEqual(seen, sorted((post.pk for post in posts), reverse=True))
+
+    def test_cursor_pagination(self):
+        for i in range(5):
+            self.create_post(f'python post {i}')
+
+        seen = []
+        page = self.search('python', limit=2)
+        while True:
+            seen += [post['id'] for post in page['results']]
+            if not page['next_cursor']:
+                break
+            page = self.search('python', limit=2, cursor=page['next_cursor'])
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+
+class AsyncViewTests(TestCase):
+    """The async endpoints authenticate with JWT and share state with the sync views."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.post = Post.objects.create(author=self.user, content='hello')
+        Comment.objects.create(author=self.user, post=self.post, content='first')
+        token = RefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    async def test_like_toggle(self):
+        url = reverse('async_api_like_post', args=[self.post.id])
+        response = await self.async_client.post(url, headers=self.headers)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['like_count'], 1)
+
+        response = await self.async_client.post(url, headers=self.headers)
+        self.assertEqual((response.status_code, response.json()['like_count']), (200, 0))
+
+    async def test_requires_token(self):
+        response = await self.async_client.post(reverse('async_api_like_post', args=[self.post.id]))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_session_requires_csrf_token(self):
+        client = AsyncClient(enforce_csrf_checks=True)
+        await sync_to_async(client.force_login)(self.user)
+        like_url = reverse('async_api_like_post', args=[self.post.id])
+        follow_url = reverse('async_api_follow_list', args=[self.user.id])
+        for url in (like_url, follow_url):
+            response = await client.post(url)
+            self.assertEqual(response.status_code, 403)
+            self.assertIn('CSRF Failed', response.json()['detail'])
+        self.assertFalse(await Like.objects.filter(post=self.post).aexists())
+
+        # The same session with its CSRF token, and a token request without one, both go through
+        client.cookies[settings.CSRF_COOKIE_NAME] = secret = 'a' * 32
+        response = await client.post(like_url, headers={'X-CSRFToken': secret})
+        self.assertEqual(response.status_code, 201)
+        response = await AsyncClient(enforce_csrf_checks=True).post(like_url, headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+
+    async def test_post_detail_and_comments(self):
+        await Like.objects.acreate(user=self.user, post=self.post)
+
+        detail = await self.async_client.get(reverse('async_api_post_detail', args=[self.post.id]), headers=self.headers)
+        self.assertTrue(detail.json()['is_liked'])
+
+        comments = await self.async_client.get(reverse('async_api_comment_list', args=[self.post.id]), headers=self.headers)
+        self.assertEqual([c['content'] for c in comments.json()], ['first'])
+        self.assertTrue(comments.json()[0]['post']['is_liked'])
+
+
+class RealtimeTests(TestCase):
+    """Activity is published to subscribers without letting slow ones block publishers."""
+
+    async def test_like_and_comment_events(self):
+        user = await User.objects.acreate(username='viewer')
+        post = await Post.objects.acreate(author=user, content='hello')
+
+        def like_and_comment():
+            with self.captureOnCommitCallbacks(execute=True):
+                Like.objects.create(user=user, post=post)
+                Comment.objects.create(author=user, post=post, content='hi')
+
+        subscription = realtime.subscribe([realtime.post_topic(post.id)])
+        try:
+            await sync_to_async(like_and_comment)()
+            types = [(await subscription.next_event(1))['type'] for _ in range(2)]
+        finally:
+            realtime.unsubscribe(subscription)
+        self.assertEqual(types, ['post.liked', 'comment.added'])
+
+    async def test_slow_consumer_drops_instead_of_blocking(self):
+        subscription = realtime.subscribe(['post:1'])
+        try:
+            for i in range(realtime.REALTIME_QUEUE_SIZE + 5):
+                realtime.publish(['post:1', 'post:2'], {"type": "post.liked", "post_id": 1})
+            await asyncio.sleep(0)  # Let the queued offers run
+            self.assertEqual(subscription.queue.qsize(), realtime.REALTIME_QUEUE_SIZE)
+            self.assertEqual(subscription.dropped, 5)
+        finally:
+            realtime.unsubscribe(subscription)
+
+    async def test_redis_listener_survives_disconnects_and_bad_payloads(self):
+        stop = threading.Event()
+        good = json.dumps({"topics": ["post:1"], "event": {"type": "post.liked", "post_id": 1}})
+        messages = iter([{'data': b'not json'}, {'data': json.dumps({"event": {}})}, {'data': good}])
+
+        def get_message(timeout):
+            message = next(messages, None)
+            if message is None:
+                stop.set()
+            return message
+
+        dropped_connection = mock.Mock(**{'subscribe.side_effect': ConnectionError("Redis went away")})
+        connected = mock.Mock(**{'get_message.side_effect': get_message})
+        with mock.patch.dict('sys.modules', {'redis': mock.Mock()}):
+            backend = realtime.RedisBackend(realtime.broker)
+        backend.client = mock.Mock(**{'pubsub.side_effect': [dropped_connection, connected]})
+
+        subscription = realtime.subscribe(['post:1'])
+        try:
+            with mock.patch.object(realtime.time, 'sleep') as sleep, self.assertLogs(realtime.logger) as logs:
+                backend.listen(stop)
+            sleep.assert_called_once_with(1)
+            self.assertEqual(len(logs.records), 3)  # The disconnect and both bad payloads
+            event = await subscription.next_event(1)
+            self.assertEqual(event['type'], 'post.liked')
+            self.assertEqual(subscription.dropped, 1)  # Told to resync after the disconnect
+            self.assertTrue(dropped_connection.close.called and connected.close.called)
+        finally:
+            realtime.unsubscribe(subscription)
+
+        # A listener thread that died is started again
+        backend.listen = lambda: None
+        backend.start()
+        dead = backend._listener
+        dead.join()
+        backend.start()
+        self.assertIsNot(backend._listener, dead)
+
+
+class QueryPlanTests(TestCase):
+    """Every read view's queries are served by an index, without full scans or filesorts."""
+
+    def test_no_full_scans_or_filesorts(self):
+        cache.clear()
+        user = User.objects.create_user(username='viewer', password='pass')
+        other = User.objects.create_user(username='other', password='pass')
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=user, following=other)
+            post = Post.objects.create(author=other, content='hello')
+            Post.objects.create(author=user, content='hello again')
+        Like.objects.create(user=user, post=post)
+        Comment.objects.create(author=user, post=post, content='hi')
+
+        self.assertEqual(query_plans.check_views(user, post, other), {})
+
+    def test_empty_database(self):
+        with self.assertRaisesMessage(CommandError, "need at least one user and one post to explain"):
+            call_command('explain_queries', stdout=StringIO())
+        User.objects.create_user(username='viewer')
+        with self.assertRaisesMessage(CommandError, "need at least one user and one post to explain"):
+            call_command('explain_queries', stdout=StringIO())
+
+
+class SeedSocialTests(TestCase):
+    """seed_social builds a consistent data set: profiles, counters and search index included."""
+
+    def test_seed_small_graph(self):
+        started = timezone.now()
+        call_command(
+            'seed_social', users=50, posts=4, follows=6, likes=8, comments=3, days=10, batch_size=40, stdout=StringIO(),
+        )
+
+        users = User.objects.filter(username__startswith='seed_')
+        self.assertEqual(users.count(), 50)
+        self.assertEqual(Profile.objects.filter(user__in=users).count(), 50)
+        self.assertTrue(Post.objects.exists() and Follow.objects.exists() and Like.objects.exists())
+        self.assertFalse(Follow.objects.filter(follower=F('following')).exists())
+
+        user = users.first()
+        self.assertTrue(user.check_password('devconnect'))
+        self.assertEqual(user.profile.follower_count, Follow.objects.filter(following=user).count())
+        post = Post.objects.order_by('id').first()
+        self.assertEqual(post.like_count, Like.objects.filter(post=post).count())
+        self.assertEqual(post.comment_count, Comment.objects.filter(post=post).count())
+
+        # Spread over the window, and engagement never before the post it is on
+        for model in (Post, Follow, Like, Comment):
+            oldest = model.objects.order_by('created_at').values_list('created_at', flat=True).first()
+            self.assertGreater(started - oldest, timedelta(days=2), model.__name__)
+            self.assertLess(started - oldest, timedelta(days=10), model.__name__)
+        self.assertFalse(Like.objects.filter(created_at__lt=F('post__created_at')).exists())
+        self.assertFalse(Comment.objects.filter(created_at__lt=F('post__created_at')).exists())
+        self.assertFalse(Post.objects.exclude(updated_at=F('created_at')).exists())
+
+        with self.assertRaises(CommandError):
+            call_command('seed_social', users=5, stdout=StringIO())
+
+
+TIMING_MIDDLEWARE = settings.MIDDLEWARE + ['DevConnect.instrumentation.RequestTimingMiddleware']
+
+
+@override_settings(MIDDLEWARE=TIMING_MIDDLEWARE)
+class InstrumentationTests(TestCase):
+    """RequestTimingMiddleware reports queries and timings, logs slow requests and flags N+1s."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.post = Post.objects.create(author=self.user, content='hello')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('api_comment_list', args=[self.post.id]))
+        timing = response['Server-Timing']
+        for metric in ('db;dur=', 'serialize;dur=', 'template;dur=', 'total;dur='):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="\d+ queries"')
+        self.assertNotIn('n-plus-one', timing)
+
+    def slow_dumps(self):
+        dumps = renderers.dumps
+
+        def slow(obj):
+            time.sleep(0.02)
+            return dumps(obj)
+        return mock.patch.object(renderers, 'dumps', slow)
+
+    def test_default_renderer_is_timed(self):
+        with self.slow_dumps():
+            response = self.client.get(reverse('api-post-detail', args=[self.post.id]))
+        serialize = re.search(r'serialize;dur=([\d.]+)', response['Server-Timing'])
+        self.assertGreaterEqual(float(serialize.group(1)), 20)
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0)
+    def test_streamed_response_is_reported_once_sent(self):
+        Post.objects.bulk_create([Post(author=self.user, content=str(i)) for i in range(4)])
+        with self.slow_dumps(), self.assertNoLogs('DevConnect.instrumentation', 'WARNING'):
+            response = self.client.get(reverse('api_post_list'), {'format': 'ndjson'})
+        self.assertTrue(response.streaming)
+        with self.slow_dumps(), self.assertLogs('DevConnect.instrumentation', 'WARNING') as logs:
+            self.assertEqual(len(b''.join(response.streaming_content).splitlines()), 5)
+        record = logs.records[0].request_profile
+        self.assertGreaterEqual(record['serialize_ms'], 5 * 20)
+        self.assertIn('DevConnect_post', ' '.join(query['sql'] for query in record['slowest_queries']))
+
+    @override_settings(MIDDLEWARE=TIMING_MIDDLEWARE, INSTRUMENTATION_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_profiled(self):
+        response = self.client.get(reverse('api_comment_list', args=[self.post.id]))
+        self.assertNotIn('Server-Timing', response)
+
+    @override_settings(INSTRUMENTATION_SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('DevConnect.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('api_comment_list', args=[self.post.id]))
+        record = logs.records[0].request_profile
+        self.assertEqual(record['path'], reverse('api_comment_list', args=[self.post.id]))
+        self.assertEqual(record['status'], 200)
+        self.assertGreater(record['queries'], 0)
+        self.assertTrue(record['slowest_queries'])
+
+    def test_repeated_queries_flagged(self):
+        def n_plus_one_view(request):
+            for _ in range(6):
+                User.objects.get(pk=self.user.pk)
+            return HttpResponse()
+
+        middleware = RequestTimingMiddleware(n_plus_one_view)
+        with self.assertLogs('DevConnect.instrumentation', 'WARNING') as logs:
+            response = middleware(RequestFactory().get('/'))
+        self.assertIn('n-plus-one;desc="6x same query"', response['Server-Timing'])
+        self.assertEqual(logs.records[0].request_profile['repeated_queries'][0]['count'], 6)
+
+
+class ToggleConcurrencyTests(TransactionTestCase):
+    """Toggles hammered from many threads leave rows and counters in agreement."""
+
+    THREADS = 8
+    TOGGLES = 15  # Odd, so every user ends up liking/following
+
+    def setUp(self):
+        # The in-memory test database is SQLite in shared-cache mode, which has no busy
+        # timeout: lock conflicts a server database would queue fail at once, so allow
+        # the toggles to retry them for longer
+        if connection.vendor == 'sqlite':
+            retries = mock.patch.object(interactions, 'TOGGLE_RETRIES', 100)
+            retries.start()
+            self.addCleanup(retries.stop)
+
+    def hammer(self, users, toggle):
+        errors = []
+
+        def worker(user):
+            try:
+                for _ in range(self.TOGGLES):
+                    toggle(user)
+            except Exception as e:  # Surface failures from the threads in the test
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_unlike_is_one_delete(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, content='post')
+        toggle_like(author, post.id)
+        with CaptureQueriesContext(connection) as queries, \
+                mock.patch.object(interactions.post_delete, 'send', wraps=interactions.post_delete.send) as send:
+            self.assertEqual(toggle_like(author, post.id), (False, 0))
+        statements = [query['sql'] for query in queries if 'DevConnect_like' in query['sql']]
+        self.assertEqual(len(statements), 1)
+        self.assertTrue(statements[0].startswith('DELETE'))
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(interactions._delete(Like(user_id=author.pk, post_id=post.id), 'default'), 0)
+
+    def test_concurrent_likes(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, content='hot post')
+        users = [User.objects.create_user(username=f'fan{i}') for i in range(self.THREADS)]
+
+        self.hammer(users, lambda user: toggle_like(user, post.id))
+
+        post.refresh_from_db()
+        self.assertEqual(Like.objects.filter(post=post).count(), self.THREADS)
+        self.assertEqual(post.like_count, self.THREADS)
+
+    def test_concurrent_follows(self):
+        star = User.objects.create_user(username='star')
+        users = [User.objects.create_user(username=f'fan{i}') for i in range(self.THREADS)]
+
+        self.hammer(users, lambda user: toggle_follow(user, star.id))
+
+        self.assertEqual(Follow.objects.filter(following=star).count(), self.THREADS)
+        self.assertEqual(Profile.objects.get(user=star).follower_count, self.THREADS)
+        self.assertEqual(Profile.objects.get(user=users[0]).following_count, 1)
+
+    def test_double_tap_from_one_user(self):
+        author = User.objects.create_user(username='author')
+        post = Post.objects.create(author=author, content='hot post')
+        fan = User.objects.create_user(username='fan')
+
+        # The same user toggling from many threads at once: whatever the final state, the counter agrees
+        self.hammer([fan] * self.THREADS, lambda user: toggle_like(user, post.id))
+
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, Like.objects.filter(post=post).count())
+        self.assertLessEqual(post.like_count, 1)
+
+
+class LikeBufferTests(TestCase):
+    """Write-behind likes: immediate state and count, batched flush, crash replay, bounded staleness."""
+
+    def setUp(self):
+        cache.clear()
+        self.journal = os.path.join(tempfile.mkdtemp(), 'likes.journal')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.journal))
+        for name, value in {
+            'LIKE_BUFFER_ENABLED': True,
+            'LIKE_BUFFER_HOT_THRESHOLD': 0,
+            'LIKE_BUFFER_FLUSH_THREAD': False,
+            'LIKE_BUFFER_MAX_STALENESS': 60,
+            '_backend': like_buffer.LocalBackend(self.journal),
+        }.items():
+            patcher = mock.patch.object(like_buffer, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(author=self.author, content='viral')
+        self.fans = [User.objects.create_user(username=f'fan{i}') for i in range(3)]
+        self.client = APIClient()
+
+    def like(self, user):
+        self.client.force_authenticate(user)
+        return self.client.post(reverse('api_like_post', args=[self.post.id])).json()
+
+    def test_push_failure_does_not_fail_the_like(self):
+        with mock.patch.object(realtime, 'publish', side_effect=ConnectionError("broker down")) as publish, \
+                self.assertLogs(level='ERROR'), self.captureOnCommitCallbacks(execute=True):
+            data = self.like(self.fans[0])
+        self.assertEqual((data['is_liked'], data['like_count']), (True, 1))
+        self.assertEqual(publish.call_count, 1)
+        self.assertEqual(like_buffer.pending_delta(self.post.id), 1)
+
+    def test_state_served_before_flush(self):
+        for fan in self.fans:
+            data = self.like(fan)
+        self.assertEqual((data['is_liked'], data['like_count']), (True, 3))
+        self.assertFalse(Like.objects.exists())
+
+        detail = self.client.get(reverse('api-post-detail', args=[self.post.id])).json()
+        self.assertEqual((detail['is_liked'], detail['like_count']), (True, 3))
+
+        self.assertEqual(like_buffer.flush(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 3)
+        self.assertEqual(self.post.like_count, 3)
+        self.assertEqual(like_buffer.pending_delta(self.post.id), 0)
+
+    def test_unlike_of_flushed_like(self):
+        self.like(self.fans[0])
+        like_buffer.flush()
+        data = self.like(self.fans[0])
+        self.assertEqual((data['is_liked'], data['like_count']), (False, 0))
+        like_buffer.flush()
+        self.assertFalse(Like.objects.exists())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+
+    def test_replay_after_crash(self):
+        self.like(self.fans[0])
+        like_buffer.get_backend().drain()  # The flush "crashes" after taking the intents
+        self.like(self.fans[1])
+
+        restarted = like_buffer.LocalBackend(self.journal)
+        self.assertEqual(restarted.state(self.post.id, self.fans[0].id), True)
+        self.assertEqual(restarted.state(self.post.id, self.fans[1].id), True)
+        with mock.patch.object(like_buffer, '_backend', restarted):
+            self.assertEqual(like_buffer.flush(), 2)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 2)
+        self.assertFalse(os.path.exists(self.journal) or os.path.exists(self.journal + '.inflight'))
+
+    def test_flush_moves_counts_by_the_net_change(self):
+        Post.objects.filter(pk=self.post.pk).update(like_count=1000)  # Stands in for likes already stored
+        Like.objects.create(user=self.fans[2], post=self.post)
+        for fan in self.fans:
+            self.like(fan)  # Two likes and an unlike
+        intents = like_buffer.get_backend().drain()
+        with CaptureQueriesContext(connection) as queries:
+            like_buffer._apply(intents)
+        self.assertFalse([query for query in queries if 'COUNT(' in query['sql']])
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1002)
+
+        # Intents replayed after a crash that followed the commit change nothing
+        like_buffer._apply(intents)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1002)
+
+    def test_interleaved_flushes(self):
+        self.like(self.fans[0])
+        apply = like_buffer._apply
+
+        def apply_while_another_flushes(intents):
+            self.like(self.fans[1])
+            self.assertEqual(like_buffer.flush(blocking=False), 0)  # Must not take or ack these intents
+            apply(intents)
+
+        with mock.patch.object(like_buffer, '_apply', apply_while_another_flushes):
+            self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(like_buffer.get_backend().state(self.post.id, self.fans[1].id), True)
+        self.assertEqual(like_buffer.flush(), 1)
+        self.assertEqual(set(Like.objects.values_list('user_id', flat=True)), {self.fans[0].id, self.fans[1].id})
+        self.assertEqual(like_buffer.pending_delta(self.post.id), 0)
+
+    def test_max_staleness_flushes_inline(self):
+        with mock.patch.object(like_buffer, 'LIKE_BUFFER_MAX_STALENESS', 0):
+            data = self.like(self.fans[0])
+        self.assertEqual((data['is_liked'], data['like_count']), (True, 1))
+        self.assertTrue(Like.objects.filter(post=self.post, user=self.fans[0]).exists())
+
+    def test_cold_posts_write_through(self):
+        with mock.patch.object(like_buffer, 'LIKE_BUFFER_HOT_THRESHOLD', 10):
+            self.like(self.fans[0])
+        self.assertTrue(Like.objects.filter(post=self.post, user=self.fans[0]).exists())
+
+
+class RedisLikeBufferTests(TestCase):
+    """Workers sharing the Redis buffer flush one at a time. Needs a Redis server at LIKE_BUFFER_REDIS_URL."""
+
+    def setUp(self):
+        prefix = mock.patch.object(like_buffer.RedisBackend, 'prefix', 'devconnect-test:likebuf')
+        prefix.start()
+        self.addCleanup(prefix.stop)
+        try:
+            self.workers = [like_buffer.RedisBackend(), like_buffer.RedisBackend()]
+            self.workers[0].client.ping()
+        except Exception as e:
+            self.skipTest(f"Redis unavailable: {e}")
+        client = self.workers[0].client
+        self.addCleanup(lambda: client.delete(*self.workers[0].keys.values()))
+
+    def test_interleaved_flushes(self):
+        first, second = self.workers
+        first.record(1, 1, True, 1)
+        with first.flushing() as flushing:
+            self.assertTrue(flushing)
+            self.assertEqual(first.drain(), {(1, 1): True})
+            second.record(1, 2, True, 1)
+            with second.flushing(blocking=False) as flushing:
+                self.assertFalse(flushing)
+            first.ack()
+        self.assertEqual(second.state(1, 2), True)
+        with second.flushing(blocking=False) as flushing:
+            self.assertTrue(flushing)
+            self.assertEqual(second.drain(), {(1, 2): True})
+
+    def test_ack_after_lost_lease_keeps_intents(self):
+        first, second = self.workers
+        first.record(1, 1, True, 1)
+        with first.flushing():
+            first.drain()
+            first.client.delete(first.keys['lock'])  # The lease ran out
+            with second.flushing(blocking=False) as flushing:
+                self.assertTrue(flushing)
+                first.ack()
+                self.assertEqual(second.drain(), {(1, 1): True})
+
+
+class SuggestionTests(TestCase):
+    """Friends-of-friends suggestions: scored by mutual count, stored, kept current on (un)follow."""
+
+    def setUp(self):
+        self.users = {name: User.objects.create_user(username=name) for name in 'abcdef'}
+        self.client = APIClient()
+        self.client.force_authenticate(self.users['a'])
+
+    def follow(self, follower, following):
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_follow(self.users[follower], self.users[following].id)
+
+    def suggested(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('api_suggested_users'))
+        return [(row['username'], row['mutual_count']) for row in response.json()]
+
+    def test_graph_candidates(self):
+        edges = sorted([(1, 2), (1, 3), (2, 4), (3, 4), (3, 5), (2, 1)])
+        graph = suggestions.FollowGraph(edges)
+        self.assertEqual(list(graph.followees(3)), [4, 5])
+        self.assertEqual(list(graph.followees(9)), [])
+        self.assertEqual(graph.candidates(1), [(4, 2), (5, 1)])
+
+    def test_graph_is_read_in_keyset_pages(self):
+        for follower, following in ('ab', 'ac', 'ad', 'bc', 'bd', 'ce', 'cf'):
+            Follow.objects.create(follower=self.users[follower], following=self.users[following])
+        with CaptureQueriesContext(connection) as queries:
+            graph = suggestions.FollowGraph.from_queryset(Follow.objects.all(), chunk_size=2)
+        self.assertEqual(len(queries), 4)  # 7 edges, 2 per query
+        self.assertTrue(all('LIMIT 2' in query['sql'] for query in queries))
+        a, b, c = (self.users[name].id for name in 'abc')
+        self.assertEqual(list(graph.ids), [a, b, c])
+        self.assertEqual(list(graph.followees(a)), sorted(self.users[name].id for name in 'bcd'))
+        self.assertEqual(graph.candidates(a), [(self.users['e'].id, 1), (self.users['f'].id, 1)])
+
+    def test_incremental_updates(self):
+        self.follow('b', 'd')
+        self.follow('c', 'd')
+        self.follow('c', 'e')
+        self.follow('a', 'b')
+        self.assertEqual(self.suggested(), [('d', 1)])
+        self.follow('a', 'c')
+        self.assertEqual(self.suggested(), [('d', 2), ('e', 1)])
+
+        # a's followee b follows more accounts: new paths for a
+        self.follow('b', 'f')
+        self.follow('b', 'e')
+        self.assertEqual(self.suggested(), [('d', 2), ('e', 2), ('f', 1)])
+
+        # Following a candidate removes it; unfollowing drops its paths
+        self.follow('a', 'd')
+        self.assertEqual(self.suggested(), [('e', 2), ('f', 1)])
+        self.follow('c', 'e')
+        self.assertEqual(self.suggested(), [('e', 1), ('f', 1)])
+
+    def test_unfollowed_account_becomes_a_candidate(self):
+        for follower, following in [('b', 'd'), ('c', 'd'), ('a', 'b'), ('a', 'c'), ('a', 'd')]:
+            self.follow(follower, following)
+        self.assertEqual(self.suggested(), [])
+        self.follow('a', 'd')
+        self.assertEqual(self.suggested(), [('d', 2)])
+
+    def test_follow_reads_a_bounded_neighbourhood(self):
+        for name in 'cdef':
+            self.follow('b', name)
+        with mock.patch.object(suggestions, 'SUGGESTIONS_MAX_FANOUT', 2):
+            Follow.objects.create(follower=self.users['a'], following=self.users['b'])
+            # b's first two followees, a's follows among them, update, delete, listed, mutual counts, insert,
+            # trim; a's followers (none, so nothing more)
+            with self.assertNumQueries(9):
+                suggestions.follow_changed(self.users['a'].id, self.users['b'].id, +1)
+        self.assertEqual(self.suggested(), [('c', 1), ('d', 1)])
+
+    def test_new_candidates_get_every_path(self):
+        for follower, following in [('c', 'd'), ('b', 'd'), ('a', 'c'), ('e', 'a'), ('e', 'c'), ('c', 'b')]:
+            self.follow(follower, following)
+        Suggestion.objects.all().delete()  # As if cut from the lists earlier
+        self.follow('a', 'b')
+        self.assertEqual(self.suggested(), [('d', 2)])  # Through b and c, not just the new path
+        self.assertEqual(Suggestion.objects.get(user=self.users['e'], candidate=self.users['b']).score, 2)
+
+    def test_follow_keeps_lists_and_audience_bounded(self):
+        for follower, following in [('b', 'c'), ('b', 'd'), ('b', 'e'), ('e', 'a'), ('f', 'a')]:
+            self.follow(follower, following)
+        Suggestion.objects.create(user=self.users['e'], candidate=self.users['b'], score=1)
+        with mock.patch.object(suggestions, 'SUGGESTIONS_PER_USER', 2), \
+                mock.patch.object(suggestions, 'SUGGESTIONS_MAX_FANOUT', 1):
+            self.follow('a', 'b')
+        # Only a's most recent follower, f, is updated now; e waits for the rebuild
+        self.assertEqual(
+            set(Suggestion.objects.filter(candidate=self.users['b']).values_list('user__username', 'score')),
+            {('e', 1), ('f', 1)},
+        )
+
+        # a's list is cut back to its top two of c, d and e
+        Suggestion.objects.all().delete()
+        with mock.patch.object(suggestions, 'SUGGESTIONS_PER_USER', 2):
+            suggestions.follow_changed(self.users['a'].id, self.users['b'].id, +1)
+        self.assertEqual(self.suggested(), [('c', 1), ('d', 1)])
+
+    def test_rebuild_matches_incremental(self):
+        for follower, following in [('b', 'd'), ('c', 'd'), ('c', 'e'), ('a', 'b'), ('a', 'c'), ('d', 'f')]:
+            self.follow(follower, following)
+        before = set(Suggestion.objects.values_list('user_id', 'candidate_id', 'score'))
+        Suggestion.objects.all().delete()
+        call_command('rebuild_suggestions', stdout=StringIO())
+        self.assertEqual(set(Suggestion.objects.values_list('user_id', 'candidate_id', 'score')), before)
+
+    def test_requires_login(self):
+        self.assertEqual(APIClient().get(reverse('api_suggested_users')).status_code, 401)
+
+
+@mock.patch.object(trending, 'TRENDING_SETTLE', 0)
+class TrendingTests(TestCase):
+    """Trending: weighted, decayed engagement folded in incrementally from watermarks."""
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'fan{i}') for i in range(4)]
+        self.quiet, self.liked, self.discussed = (
+            Post.objects.create(author=self.users[0], content=name) for name in ('quiet', 'liked', 'discussed')
+        )
+        self.client = APIClient()
+
+    def trending(self, **params):
+        response = self.client.get(reverse('api_trending_posts'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_ranks_by_weighted_engagement(self):
+        for user in self.users[:2]:
+            Like.objects.create(user=user, post=self.liked)
+        Comment.objects.create(author=self.users[0], post=self.discussed, content='!')
+        self.assertEqual(trending.refresh(), 3)
+
+        body = self.trending()
+        self.assertEqual([post['content'] for post in body['results']], ['discussed', 'liked'])
+        self.assertAlmostEqual(body['results'][0]['trending_score'], 3.0, places=2)
+        self.assertIsNone(body['next_cursor'])
+
+        # Only events after the watermarks are read
+        self.assertEqual(trending.refresh(), 0)
+        Like.objects.create(user=self.users[3], post=self.liked)
+        Like.objects.create(user=self.users[2], post=self.liked)
+        self.assertEqual(trending.refresh(), 2)
+        self.assertEqual([post['content'] for post in self.trending()['results']], ['liked', 'discussed'])
+
+    def test_older_engagement_counts_less(self):
+        for user in self.users[:3]:
+            Like.objects.create(user=user, post=self.liked)
+        Like.objects.filter(post=self.liked).update(created_at=timezone.now() - timedelta(seconds=trending.TRENDING_HALF_LIFE))
+        Like.objects.create(user=self.users[0], post=self.quiet)
+        trending.refresh()
+
+        scores = {post['content']: post['trending_score'] for post in self.trending()['results']}
+        self.assertAlmostEqual(scores['liked'], 1.5, places=2)
+        self.assertAlmostEqual(scores['quiet'], 1.0, places=2)
+
+    def test_rebase_keeps_scores(self):
+        Like.objects.create(user=self.users[0], post=self.liked)
+        trending.refresh()
+        TrendingState.objects.update(epoch=timezone.now() - timedelta(seconds=trending.TRENDING_HALF_LIFE * 2))
+        TrendingScore.objects.update(score=4 * trending.SCORE_SCALE)  # The same like, counted against the older epoch
+
+        with mock.patch.object(trending, 'TRENDING_REBASE_AFTER', trending.TRENDING_HALF_LIFE):
+            trending.refresh()
+        self.assertAlmostEqual(TrendingScore.objects.get().score / trending.SCORE_SCALE, 1.0, places=2)
+        self.assertAlmostEqual(self.trending()['results'][0]['trending_score'], 1.0, places=2)
+
+    def test_pages_across_ties(self):
+        posts = Post.objects.bulk_create([Post(author=self.users[0], content=f'tie {i}') for i in range(5)])
+        Like.objects.bulk_create([Like(user=self.users[1], post=post) for post in posts])
+        Like.objects.update(created_at=timezone.now() - timedelta(seconds=60))  # Equal scores
+        trending.refresh()
+        self.assertEqual(TrendingScore.objects.values('score').distinct().count(), 1)
+
+        seen, body = [], self.trending(limit=2)
+        while True:
+            seen += [post['id'] for post in body['results']]
+            if not body['next_cursor']:
+                break
+            body = self.trending(limit=2, cursor=body['next_cursor'])
+        self.assertEqual(seen, sorted((post.pk for post in posts), reverse=True))
+
+    def test_old_posts_drop_out(self):
+        Like.objects.create(user=self.users[0], post=self.quiet)
+        Like.objects.create(user=self.users[0], post=self.liked)
+        trending.refresh()
+        Post.objects.filter(pk=self.quiet.pk).update(
+            created_at=timezone.now() - timedelta(seconds=trending.TRENDING_WINDOW + 60))
+        TrendingScore.objects.filter(pk=self.quiet.pk).update(post_created_at=Post.objects.get(pk=self.quiet.pk).created_at)
+
+        # New engagement on the old post is ignored, and its row is pruned
+        Like.objects.create(user=self.users[1], post=self.quiet)
+        trending.refresh()
+        self.assertFalse(TrendingScore.objects.filter(pk=self.quiet.pk).exists())
+        self.assertEqual([post['content'] for post in self.trending()['results']], ['liked'])
+
+    def test_unsettled_events_wait(self):
+        Like.objects.create(user=self.users[0], post=self.liked)
+        with mock.patch.object(trending, 'TRENDING_SETTLE', 60):
+            self.assertEqual(trending.refresh(), 0)
+        self.assertEqual(trending.refresh(), 1)
+
+    def test_pagination(self):
+        for i, post in enumerate([self.quiet, self.liked, self.discussed]):
+            for user in self.users[:i + 1]:
+                Like.objects.create(user=user, post=post)
+        call_command('refresh_trending', stdout=StringIO())
+
+        first = self.trending(limit=2)
+        second = self.trending(limit=2, cursor=first['next_cursor'])
+        self.assertEqual([post['content'] for post in first['results'] + second['results']],
+                         ['discussed', 'liked', 'quiet'])
+        self.assertIsNone(second['next_cursor'])
+        self.assertEqual(self.client.get(reverse('api_trending_posts'), {'cursor': 'nope'}).status_code, 400)
+
+
+class StatelessAuthTests(TestCase):
+    """JWTs carry the user's claims; requests check them against cached state instead of loading the user."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        self.client = APIClient()
+
+    def login(self):
+        response = self.client.post(reverse('token_obtain_pair'), {'username': 'alice', 'password': 'pass'})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def get(self, token):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.client.get(reverse('api_suggested_users'))
+
+    def test_no_user_query(self):
+        tokens = self.login()
+        self.assertEqual(self.get(tokens['access']).status_code, 200)  # Caches the user's state
+        with self.assertNumQueries(1):  # Only the suggestions
+            self.assertEqual(self.get(tokens['access']).status_code, 200)
+
+        # Access tokens from a refresh keep the claims
+        access = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).json()['access']
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(access).status_code, 200)
+
+        # Tokens without the claims still work, with the user lookup
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get(RefreshToken.for_user(self.user).access_token).status_code, 200)
+
+    def test_claims_user(self):
+        token = authentication.StatelessRefreshToken.for_user(self.user).access_token
+        user = authentication.claims_user(token)
+        with self.assertNumQueries(0):
+            self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, 'alice', True))
+            self.assertEqual(user, self.user)
+        with self.assertNumQueries(1):
+            self.assertEqual(user.email, 'alice@example.com')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.post(reverse('api_post_list'), {'content': 'stateless'})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Post.objects.get(content='stateless').author_id, self.user.pk)
+
+    def test_revocation(self):
+        access = self.login()['access']
+        self.assertEqual(self.get(access).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            authentication.revoke_tokens(self.user.pk)
+        response = self.get(access)
+        self.assertEqual((response.status_code, response.json()['code']), (401, 'token_revoked'))
+        self.assertEqual(self.get(self.login()['access']).status_code, 200)
+
+    def test_password_change_and_deactivation(self):
+        access = self.login()['access']
+        self.assertEqual(self.get(access).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('pass')
+            self.user.save()
+        self.assertEqual(self.get(access).status_code, 401)
+
+        access = self.login()['access']
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).save()  # Saves without a new password revoke nothing
+        self.assertEqual(self.get(access).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        response = self.get(access)
+        self.assertEqual((response.status_code, response.json()['code']), (401, 'user_inactive'))
+
+    async def test_async_views(self):
+        token = await sync_to_async(lambda: str(authentication.StatelessRefreshToken.for_user(self.user).access_token))()
+        post = await Post.objects.acreate(author=self.user, content='hello')
+        response = await self.async_client.post(reverse('async_api_like_post', args=[post.id]),
+                                                headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await Like.objects.filter(user=self.user, post=post).aexists())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+@mock.patch.object(provisioning, 'IMPORT_HASH_WORKERS', 1)
+class ImportUsersTests(TestCase):
+    """Bulk provisioning: validation against existing users, batched inserts, per-row errors."""
+
+    CSV = (
+        "username,email,password,bio\n"
+        "carol,carol@example.com,secret,Hi there\n"
+        "taken,taken@example.com,secret,\n"
+        "dave,not-an-email,secret,\n"
+        "carol,carol2@example.com,secret,\n"
+        "erin,erin@example.com,,\n"
+    )
+
+    def setUp(self):
+        self.admin = User.objects.create_user(username='taken', password='pass', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_command(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'users.csv')
+        with open(path, 'w') as f:
+            f.write(self.CSV)
+
+        out, err = StringIO(), StringIO()
+        call_command('import_users', path, batch_size=2, stdout=out, stderr=err)
+        self.assertIn("Created 2 users, 3 rows failed.", out.getvalue())
+        self.assertEqual(err.getvalue().splitlines(), [
+            "line 3: username 'taken' already exists",
+            "line 4: invalid email",
+            "line 5: username 'carol' already exists",
+        ])
+
+        carol = User.objects.get(username='carol')
+        self.assertTrue(carol.check_password('secret'))
+        self.assertEqual(carol.profile.bio, 'Hi there')
+        self.assertFalse(User.objects.get(username='erin').has_usable_password())
+
+        with self.assertRaises(CommandError):
+            call_command('import_users', os.path.join(directory, 'missing.csv'), stdout=StringIO())
+
+    def test_endpoint(self):
+        body = '{"username": "frank", "email": "frank@example.com", "password": "pw"}\n[1]\n{oops\n'
+        response = self.client.post(reverse('api_import_users'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.json(), {
+            "processed": 3, "created": 1, "failed": 2,
+            "errors": [{"line": 2, "error": "not a JSON object"}, {"line": 3, "error": "not valid JSON"}],
+        })
+
+        upload = StringIO(self.CSV)
+        upload.name = 'users.csv'
+        response = self.client.post(reverse('api_import_users'), {'file': upload}, format='multipart')
+        self.assertEqual((response.json()['created'], response.json()['failed']), (2, 3))
+        self.assertTrue(Profile.objects.filter(user__username='erin').exists())
+
+        response = self.client.post(reverse('api_import_users'), 'name\nx\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 400)
+
+        users = User.objects.count()
+        with mock.patch.object(provisioning, 'IMPORT_API_MAX_ROWS', 2):
+            body = 'username,email\nivan,ivan@example.com\njudy,judy@example.com\nkim,kim@example.com\n'
+            response = self.client.post(reverse('api_import_users'), body, content_type='text/csv')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(User.objects.count(), users)  # Nothing created over the cap
+
+        self.client.force_authenticate(User.objects.get(username='frank'))
+        self.assertEqual(self.client.post(reverse('api_import_users'), body, content_type='application/x-ndjson').status_code, 403)
+
+    def test_usernames_are_case_sensitive(self):
+        # As at signup; a database collation that folds case rejects the row at insert instead
+        result = provisioning.import_users([(1, {'username': 'Taken', 'email': 'taken@example.com'})])
+        self.assertEqual((result.created, result.errors), (1, []))
+
+    def test_concurrent_signup(self):
+        def rows():
+            yield 1, {'username': 'gina', 'email': 'gina@example.com'}
+            User.objects.create_user(username='hank')  # Signs up after the existing names were read
+            yield 2, {'username': 'hank', 'email': 'hank@example.com'}
+
+        result = provisioning.import_users(rows())
+        self.assertEqual((result.created, result.errors), (1, [(2, "username 'hank' already exists")]))
+        self.assertTrue(User.objects.filter(username='gina').exists())
+
+    @override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2PasswordHasher'])
+    def test_process_pool(self):
+        rows = [(i, {'username': f'pool{i}', 'email': f'pool{i}@example.com', 'password': f'pw{i}'}) for i in range(2)]
+        self.assertEqual(provisioning.import_users(rows, workers=2).created, 2)
+        self.assertTrue(User.objects.get(username='pool1').check_password('pw1'))
+
+
+class ReplicaRouterTests(TransactionTestCase):
+    """Reads go to replicas round-robin, except after the client writes or when a replica lags."""
+
+    REPLICAS = ['replica', 'replica2']
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # SQLite files standing in for replicas, each test starting from a copy of one migrated
+        # template. They are added after the test runner set up its databases, which would
+        # otherwise try to create test databases for them.
+        cls.databases = cls.databases | set(cls.REPLICAS)
+        cls.directory = tempfile.mkdtemp()
+        cls.template = os.path.join(cls.directory, 'template.sqlite3')
+        for alias in cls.REPLICAS:
+            connections.settings[alias] = {
+                **connections.settings['default'],
+                'ENGINE': 'django.db.backends.sqlite3',
+                'NAME': os.path.join(cls.directory, f'{alias}.sqlite3'),
+            }
+        connections.settings['replica']['NAME'] = cls.template
+        call_command('migrate', database='replica', verbosity=0)
+        connections['replica'].close()
+        connections.settings['replica']['NAME'] = os.path.join(cls.directory, 'replica.sqlite3')
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in cls.REPLICAS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(cls.directory)
+        super().tearDownClass()
+
+    def setUp(self):
+        for alias in self.REPLICAS:
+            connections[alias].close()
+            shutil.copy(self.template, connections.settings[alias]['NAME'])
+        cache.clear()
+        self.router = db_router.ReplicaRouter()
+        routers = override_settings(DATABASE_ROUTERS=[self.router])
+        routers.enable()
+        self.addCleanup(routers.disable)
+        for name, value in (('DATABASE_REPLICAS', self.REPLICAS), ('REPLICA_LAG_CHECK_THREAD', False)):
+            patch = mock.patch.object(db_router, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.user = User.objects.create_user(username='alice')
+        self.old = Post.objects.create(author=self.user, content='old')
+        beat = ReplicaHeartbeat.objects.create(pk=1, beat=timezone.now())  # Another process beat just now
+        self.replicate(self.user, self.user.profile, self.old, beat)
+        self.fresh = Post.objects.create(author=self.user, content='fresh')  # Not replicated yet
+        self.router.check()  # What the checker thread does
+
+        self.client = APIClient()
+        token = authentication.StatelessRefreshToken.for_user(self.user).access_token
+        self.headers = {'Authorization': f'Bearer {token}'}
+        self.client.credentials(HTTP_AUTHORIZATION=self.headers['Authorization'])
+
+    def replicate(self, *objects):
+        for alias in self.REPLICAS:
+            for obj in objects:
+                type(obj).objects.using(alias).bulk_create([copy.copy(obj)])
+
+    def contents(self):
+        response = self.client.get(reverse('api_post_list'))
+        self.assertEqual(response.status_code, 200)
+        return sorted(post['content'] for post in read_json(response))
+
+    def test_read_your_writes(self):
+        self.assertEqual(self.contents(), ['old'])
+
+        response = self.client.post(reverse('api_post_list'), {'content': 'new'})
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(Post.objects.using('replica').filter(content='new').exists())
+        # Pinned to the primary for a while: the new post is there
+        self.assertEqual(self.contents(), ['fresh', 'new', 'old'])
+
+        cache.clear()  # The pin runs out
+        self.assertEqual(self.contents(), ['old'])
+
+    def test_round_robin_outside_transactions_only(self):
+        token = db_router._request.set(db_router.RequestState(pinned=False))
+        self.addCleanup(db_router._request.reset, token)
+        self.assertEqual([self.router.db_for_read(Post) for _ in range(4)], ['replica', 'replica2'] * 2)
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+        with transaction.atomic():
+            self.assertEqual(self.router.db_for_read(Post), 'default')
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+        self.assertEqual(self.router.db_for_read(Post), 'default')  # The request wrote
+
+        db_router._request.set(None)
+        self.assertEqual(self.router.db_for_read(Post), 'default')  # Not in a request
+        self.assertFalse(self.router.allow_migrate('replica', 'DevConnect'))
+
+    async def test_async_requests(self):
+        middleware = db_router.ReplicaRoutingMiddleware(self.async_client.handler.get_response_async)
+        self.assertTrue(iscoroutinefunction(middleware))
+
+        post_url = lambda post: reverse('async_api_post_detail', args=[post.id])
+        response = await self.async_client.get(post_url(self.fresh), headers=self.headers)
+        self.assertEqual(response.status_code, 404)  # Read from a replica
+        response = await self.async_client.post(
+            reverse('async_api_like_post', args=[self.old.id]), headers=self.headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        response = await self.async_client.get(post_url(self.fresh), headers=self.headers)
+        self.assertEqual(response.status_code, 200)  # Pinned to the primary after the like
+
+    def test_unmeasured_lag_is_unhealthy(self):
+        long_ago = timezone.now() - timedelta(hours=1)
+        for alias in ['default', *self.REPLICAS]:
+            ReplicaHeartbeat.objects.using(alias).update(beat=long_ago)  # Nobody beat for a while
+        self.assertEqual(self.router.check(), [])
+        self.assertEqual(self.contents(), ['fresh', 'old'])  # Every read on the primary
+
+        ReplicaHeartbeat.objects.all().delete()  # A fresh primary: the first beat has nothing to compare with
+        self.assertEqual(self.router.check(), [])
+
+    def test_lagging_replicas_are_skipped(self):
+        self.assertEqual(self.router.check(), self.REPLICAS)  # Caught up with the last beat
+        beat = ReplicaHeartbeat.objects.get()
+        ReplicaHeartbeat.objects.using('replica').update(beat=beat.beat)
+        ReplicaHeartbeat.objects.using('replica2').update(beat=beat.beat - timedelta(seconds=60))  # Fell behind
+        self.assertEqual(self.router.check(), ['replica'])
+
+        ReplicaHeartbeat.objects.using('replica').update(beat=beat.beat - timedelta(seconds=60))
+        self.assertEqual(self.router.check(), [])
+        self.assertEqual(self.contents(), ['fresh', 'old'])  # Every read on the primary
+
+    def test_lag_is_checked_off_the_request_path(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(self.router.healthy_replicas(), self.REPLICAS)
+
+        # A result too old to go by, from a checker that is stuck or died, sends reads to the primary
+        self.router._checked_at -= db_router.REPLICA_LAG_CHECK_INTERVAL + db_router.REPLICA_MAX_LAG + 1
+        self.assertEqual(self.router.healthy_replicas(), [])
+        self.assertEqual(self.contents(), ['fresh', 'old'])
+
+        # The checker keeps going after a failed check
+        stop = threading.Event()
+        failures = [DatabaseError('replica unreachable')]
+
+        def check():
+            if failures:
+                raise failures.pop()
+            stop.set()
+
+        with mock.patch.object(self.router, 'check', side_effect=check) as mocked, \
+                mock.patch.object(db_router, 'REPLICA_LAG_CHECK_INTERVAL', 0), self.assertLogs(db_router.logger):
+            self.router.run_checker(stop)
+        self.assertEqual(mocked.call_count, 2)
+
+
+class BatchTests(TestCase):
+    """POST /api/batch/ runs several API calls as one authenticated request."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='pass')
+        self.author = User.objects.create_user(username='bob', password='pass')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        token = authentication.StatelessRefreshToken.for_user(self.user).access_token
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def batch(self, *requests):
+        return self.client.post(reverse('api_batch'), {'requests': list(requests)}, format='json')
+
+    def test_profile_screen(self):
+        post_url = reverse('api-post-detail', args=[self.post.id])
+        with mock.patch.object(
+            authentication.StatelessJWTAuthentication, 'authenticate', autospec=True,
+            side_effect=authentication.StatelessJWTAuthentication.authenticate,
+        ) as authenticate:
+            response = self.batch(
+                {'method': 'GET', 'path': reverse('get_user_profile', args=['bob'])},
+                {'method': 'GET', 'path': post_url},
+                {'method': 'POST', 'path': reverse('api_like_post', args=[self.post.id])},
+                {'method': 'GET', 'path': post_url},
+                {'method': 'POST', 'path': reverse('api_post_list'), 'body': {'content': 'from a batch'}},
+                {'method': 'GET', 'path': reverse('api_user_following', args=[self.user.id]) + '?limit=5'},
+            )
+        self.assertEqual(authenticate.call_count, 1)  # The batch request only
+        self.assertEqual(response.status_code, 200)
+
+        responses = response.json()['responses']
+        self.assertEqual([r['status'] for r in responses], [200, 200, 201, 200, 201, 200])
+        self.assertEqual(responses[0]['body']['username'], 'bob')
+        self.assertEqual((responses[1]['body']['content'], responses[1]['body']['is_liked']), ('hello', False))
+        self.assertTrue(responses[3]['body']['is_liked'])  # Sees the like made before it
+        self.assertEqual(Post.objects.get(content='from a batch').author_id, self.user.pk)
+
+    def test_shared_reads(self):
+        post_url = reverse('api-post-detail', args=[self.post.id])
+        with mock.patch.object(object_cache, '_cache', wraps=object_cache._cache) as backend:
+            response = self.batch(*[{'method': 'GET', 'path': post_url}] * 3)
+        self.assertEqual([r['status'] for r in response.json()['responses']], [200] * 3)
+        # A get_many and a set_many for the post and for its author's card, all by the first read
+        self.assertEqual(backend.call_count, 4)
+
+    def test_local_scope(self):
+        with mock.patch.object(object_cache, '_load_posts', wraps=object_cache._load_posts) as load:
+            with object_cache.local_scope():
+                object_cache.get_post(self.post.id)['content'] = 'changed by a caller'
+                cache.clear()
+                self.assertEqual(object_cache.get_post(self.post.id)['content'], 'hello')
+                self.assertEqual(load.call_count, 1)
+
+                Post.objects.filter(pk=self.post.id).update(content='edited')
+                object_cache.invalidate_posts(self.post.id)
+                self.assertEqual(object_cache.get_post(self.post.id)['content'], 'edited')
+            object_cache.get_post(self.post.id)
+        self.assertEqual(load.call_count, 2)  # Not kept after the scope
+
+    def test_bad_sub_requests(self):
+        response = self.batch(
+            {'method': 'GET', 'path': '/home/'},
+            {'method': 'GET', 'path': '/api/nothing-here/'},
+            {'method': 'POST', 'path': reverse('api_batch'), 'body': {'requests': []}},
+            {'method': 'GET', 'path': reverse('async_api_post_detail', args=[self.post.id])},
+            {'method': 'TRACE', 'path': reverse('api_post_list')},
+            {'method': 'GET', 'path': reverse('api-post-detail', args=[self.post.id + 100])},
+            'not an object',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([r['status'] for r in response.json()['responses']], [400, 404, 400, 400, 405, 404, 400])
+
+    def test_limits(self):
+        spec = {'method': 'GET', 'path': reverse('api-post-detail', args=[self.post.id])}
+        self.assertEqual(self.batch(*[spec] * (batch.BATCH_MAX_REQUESTS + 1)).status_code, 400)
+        self.assertEqual(self.batch().status_code, 400)
+
+        with mock.patch.object(batch, 'BATCH_MAX_SECONDS', 0):
+            response = self.batch(spec, spec)
+        self.assertEqual([r['status'] for r in response.json()['responses']], [504, 504])
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.batch({'method': 'GET', 'path': reverse('api-post-detail', args=[self.post.id])})
+        self.assertEqual(response.status_code, 401)
+
+
+class ConditionalGetTests(TestCase):
+    """Read endpoints send validators and answer a current client copy with 304 Not Modified."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.author = User.objects.create_user(username='author', password='pass')
+        self.post = Post.objects.create(author=self.author, content='hello')
+        self.other = Post.objects.create(author=self.author, content='other')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def revalidate(self, url, response, status):
+        self.assertIn('ETag', response)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, status)
+        return again
+
+    def toggle(self, user, post):
+        with self.captureOnCommitCallbacks(execute=True):
+            toggle_like(user, post.id)
+
+    def test_post_detail(self):
+        url = reverse('api-post-detail', args=[self.post.id])
+        first = self.client.get(url)
+        self.assertIn('Last-Modified', first)
+        with self.assertNumQueries(1):
+            not_modified = self.revalidate(url, first, 304)
+        self.assertEqual((not_modified.content, not_modified['ETag']), (b'', first['ETag']))
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+        self.toggle(self.author, self.post)  # Someone else's like changes the count
+        second = self.revalidate(url, first, 200)
+        self.assertEqual(second.json()['like_count'], 1)
+        self.toggle(self.author, self.post)
+        self.toggle(self.user, self.post)  # Same count, but now the viewer likes it
+        self.assertTrue(self.revalidate(url, second, 200).json()['is_liked'])
+
+        # Viewers get their own ETags
+        self.client.force_authenticate(self.author)
+        self.revalidate(url, first, 200)
+
+        Post.objects.filter(pk=self.post.pk).update(updated_at=timezone.now() + timedelta(minutes=1))
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 200)
+
+    def test_post_list(self):
+        url = reverse('api_post_list')
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        with self.assertNumQueries(0):
+            self.revalidate(url, first, 304)
+
+        # A like on one post and an unlike on another leave the summed count unchanged
+        self.toggle(self.author, self.post)
+        second = self.revalidate(url, first, 200)
+        self.toggle(self.author, self.post)
+        self.toggle(self.author, self.other)
+        third = self.revalidate(url, second, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Comment.objects.create(author=self.author, post=self.post, content='hi')
+        fourth = self.revalidate(url, third, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.username = 'renamed'
+            self.author.save()
+        fifth = self.revalidate(url, fourth, 200)
+        self.assertEqual({post['author']['username'] for post in read_json(fifth)}, {'renamed'})
+        with self.captureOnCommitCallbacks(execute=True):
+            Post.objects.filter(pk=self.other.pk).delete()
+        sixth = self.revalidate(url, fifth, 200)
+        self.assertEqual(len(read_json(sixth)), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.last_login = timezone.now()
+            self.author.save(update_fields=['last_login'])
+        self.revalidate(url, sixth, 304)  # Not shown in the list
+        cache.clear()  # A lost version starts a new series, it doesn't repeat an old one
+        self.assertNotEqual(self.client.get(url)['ETag'], first['ETag'])
+
+    def test_comment_list(self):
+        url = reverse('api_comment_list', args=[self.post.id])
+        first = self.client.get(url)
+        with self.assertNumQueries(1):
+            self.revalidate(url, first, 304)
+        Comment.objects.create(author=self.author, post=self.post, content='hi')
+        self.assertEqual(len(self.revalidate(url, first, 200).json()), 1)
+        self.assertEqual(self.client.get(reverse('api_comment_list', args=[0]), HTTP_IF_NONE_MATCH='*').status_code, 404)
+
+    def test_profile(self):
+        url = reverse('get_user_profile', args=['author'])
+        first = self.client.get(url)
+        self.assertNotIn('Last-Modified', first)
+        with self.assertNumQueries(0):
+            self.revalidate(url, first, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, following=self.author)
+        self.assertEqual(self.revalidate(url, first, 200).json()['follower_count'], 1)
+
+    def test_writes_ignore_validators(self):
+        self.client.force_authenticate(self.author)
+        url = reverse('api-post-detail', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+        response = self.client.put(url, {'content': 'edited'}, HTTP_IF_NONE_MATCH=etag, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class StreamingResponseTests(TestCase):
+    """Whole-table lists stream as JSON or NDJSON, rendered and compressed like everything else."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', password='pass')
+        self.author = User.objects.create_user(username='ünïcode', email='a@example.com', password='pass')
+        posts = Post.objects.bulk_create([Post(author=self.author, content=f'post {i}  ') for i in range(30)])
+        Like.objects.create(user=self.user, post=posts[3])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for name, value in (('STREAM_CHUNK_SIZE', 7), ('STREAM_BUFFER_BYTES', 512)):
+            patch = mock.patch.object(renderers, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_same_json_as_serializers(self):
+        response = self.client.get(reverse('api_post_list'))
+        self.assertTrue(response.streaming)
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 1)
+
+        posts = PostSerializer.setup_queryset(Post.objects.all(), self.user)
+        expected = JSONRenderer().render(PostSerializer(posts, many=True).data)
+        self.assertEqual(b''.join(chunks), expected)
+
+        users = UserListSerializer.setup_queryset(User.objects.exclude(pk=self.user.pk), self.user)
+        self.assertEqual(read_json(self.client.get(reverse('user-list'))), UserListSerializer(users, many=True).data)
+
+    def test_reads_one_keyset_page_per_query(self):
+        response = self.client.get(reverse('api_post_list'))
+        with self.assertNumQueries(5):  # 30 posts, 7 a page
+            data = read_json(response)
+        self.assertEqual([post['id'] for post in data], list(Post.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertNotIn('_stream_pk', data[0])
+
+    def test_ndjson(self):
+        for kwargs in ({'HTTP_ACCEPT': 'application/x-ndjson'}, {'format': 'ndjson'}):
+            with self.subTest(**kwargs):
+                data = kwargs.pop('format', None)
+                response = self.client.get(reverse('api_profile_list'), {'format': data} if data else {}, **kwargs)
+                self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+                lines = b''.join(response.streaming_content).splitlines()
+                self.assertEqual([json.loads(line)['username'] for line in lines], ['viewer', 'ünïcode'])
+
+    def test_orjson_renderer(self):
+        data = {
+            'when': timezone.now(), 'amount': Decimal('1.50'), 'text': 'ünï  ', 'nested': [{'a': None}],
+            'lazy': gettext_lazy('hello'), 1: 'int key',
+        }
+        self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(renderers.ORJSONRenderer().render(None), b'')
+
+    def test_gzip(self):
+        response = self.client.get(reverse('api_post_list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+        chunks = list(response.streaming_content)
+        self.assertGreater(len(chunks), 2)  # Flushed as it goes
+        self.assertEqual(len(json.loads(gzip.decompress(b''.join(chunks)))), 30)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Follow.objects.create(follower=self.user, following=self.author)
+        response = self.client.get(reverse('api_feed'), {'limit': 30}, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(response.streaming)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(json.loads(gzip.decompress(response.content))['results']), 30)
+
+        response = self.client.get(reverse('api_post_list'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_gzip_is_padded_against_breach(self):
+        sizes = set()
+        for _ in range(10):
+            response = self.client.get(reverse('api_post_list'), HTTP_ACCEPT_ENCODING='gzip')
+            body = b''.join(response.streaming_content)
+            self.assertEqual(body[3], gzip.FNAME)
+            self.assertEqual(len(json.loads(gzip.decompress(body))), 30)
+            sizes.add(len(body))
+        self.assertGreater(len(sizes), 1)
+
+        # A page with a CSRF token is never brotli, which can't be padded
+        with mock.patch.object(compression, 'brotli', mock.Mock()):
+            self.assertEqual(compression.negotiate('br, gzip', allow_brotli=False), 'gzip')
+            response = self.client.get(reverse('login'), HTTP_ACCEPT_ENCODING='br, gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response.content[3], gzip.FNAME)
+        self.assertIn(b'csrfmiddlewaretoken', gzip.decompress(response.content))
+
+    def test_brotli_negotiation(self):
+        with mock.patch.object(compression, 'brotli', None):
+            self.assertEqual(compression.negotiate('br'), None)
+            self.assertEqual(compression.negotiate('br, gzip'), 'gzip')
+        if compression.brotli is not None:
+            self.assertEqual(compression.negotiate('gzip, br'), 'br')
+            response = self.client.get(reverse('api_post_list'), HTTP_ACCEPT_ENCODING='gzip, br')
+            self.assertEqual(response['Content-Encoding'], 'br')
+            data = compression.brotli.decompress(b''.join(response.streaming_content))
+            self.assertEqual(len(json.loads(data)), 30)
+
+
+class DataExportTests(TestCase):
+    """Personal data exports are written in checkpointed chunks and zipped; a dead worker's export resumes."""
+
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        for name, value in (('EXPORT_ROOT', root), ('EXPORT_THREAD', False), ('EXPORT_CHUNK_SIZE', 3)):
+            patch = mock.patch.object(exports, name, value)
+            patch.start()
+            self.addCleanup(patch.stop)
+
+        self.user = User.objects.create_user(username='alice', email='alice@example.com', password='pass')
+        self.other = User.objects.create_user(username='bob', password='pass')
+        posts = Post.objects.bulk_create([Post(author=self.user, content=f'post {i}') for i in range(7)])
+        others = Post.objects.bulk_create([Post(author=self.other, content=f'bob {i}') for i in range(5)])
+        Comment.objects.bulk_create([Comment(author=self.user, post=post, content='hi') for post in others[:4]])
+        Comment.objects.create(author=self.other, post=posts[0], content='not alice')
+        Like.objects.bulk_create([Like(user=self.user, post=post) for post in others])
+        Like.objects.create(user=self.other, post=posts[0])
+        Follow.objects.create(follower=self.user, following=self.other)
+        Follow.objects.create(follower=self.other, following=self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def archive(self, export):
+        with zipfile.ZipFile(exports.archive_path(export)) as archive:
+            return {
+                name: [json.loads(line) for line in archive.read(name).splitlines()] if name.endswith('.ndjson')
+                else json.loads(archive.read(name))
+                for name in archive.namelist()
+            }
+
+    def assertComplete(self, export):
+        self.assertEqual(export.status, DataExport.DONE)
+        files = self.archive(export)
+        self.assertEqual({name: len(rows) for name, rows in files.items() if name.endswith('.ndjson')}, {
+            'account.ndjson': 1, 'posts.ndjson': 7, 'comments.ndjson': 4, 'likes.ndjson': 5,
+            'following.ndjson': 1, 'followers.ndjson': 1,
+        })
+        self.assertEqual(files['manifest.json']['rows'], 19)
+        self.assertEqual(files['account.ndjson'][0]['username'], 'alice')
+        self.assertEqual([post['content'] for post in files['posts.ndjson']], [f'post {i}' for i in range(7)])
+        self.assertEqual(files['followers.ndjson'][0]['follower_username'], 'bob')
+        self.assertFalse(os.path.exists(exports.work_dir(export)))
+        return files
+
+    def test_export(self):
+        response = self.client.post(reverse('api_exports'))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['status'], 'pending')
+        export_id = response.json()['id']
+
+        seen = []
+        export = exports.run(export_id, report=lambda export: seen.append(exports.progress(export)['percent']))
+        self.assertComplete(export)
+        self.assertEqual(seen, sorted(seen))
+        self.assertEqual((seen[-1], exports.progress(export)['percent']), (100.0, 100.0))
+
+        detail = self.client.get(reverse('api_export_detail', args=[export_id])).json()
+        self.assertEqual((detail['status'], detail['rows_written'], detail['rows_total']), ('done', 19, 19))
+        response = self.client.get(detail['download'], HTTP_ACCEPT='application/zip')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        with open(exports.archive_path(export), 'rb') as f:
+            self.assertEqual(b''.join(response.streaming_content), f.read())
+
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(detail['download']).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_export_detail', args=[export_id])).status_code, 404)
+
+    def test_sections_are_read_in_keyset_pages(self):
+        export = exports.request_export(self.user)
+        DataExport.objects.filter(pk=export.pk).update(section=1)  # posts: 7 rows, chunks of 3
+        export.refresh_from_db()
+        os.makedirs(exports.work_dir(export))
+        with CaptureQueriesContext(connection) as queries:
+            exports.write_section(export)
+        selects = [query['sql'] for query in queries if query['sql'].startswith('SELECT')]
+        self.assertEqual(len(selects), 3)  # One query per chunk, each bounded, none reading the whole section
+        self.assertTrue(all('LIMIT 3' in sql for sql in selects))
+        self.assertEqual(len(queries), 3 + 3 + 1)  # And a checkpoint after each, then the next section
+        self.assertEqual((export.section, export.rows_written), (2, 7))
+
+    def test_resume_after_worker_died(self):
+        export = exports.request_export(self.user)
+        checkpoints = []
+
+        def die(export):
+            checkpoints.append(export.section)
+            if len(checkpoints) == 4:
+                # Rows written after the last checkpoint are lost with the worker
+                with open(os.path.join(exports.work_dir(export), 'posts.ndjson'), 'ab') as f:
+                    f.write(b'{"id": 99, "cont')
+                raise SystemExit
+
+        with self.assertRaises(SystemExit):
+            exports.run(export.pk, report=die)
+        export.refresh_from_db()
+        self.assertEqual((export.status, export.section), (DataExport.RUNNING, 1))
+        self.assertIsNone(exports.run(export.pk))  # Still looks alive
+
+        DataExport.objects.filter(pk=export.pk).update(heartbeat=timezone.now() - timedelta(hours=1))
+        self.assertEqual(exports.request_export(self.user).pk, export.pk)
+        self.assertComplete(exports.run(export.pk))
+
+    def test_failed_export_is_resumed(self):
+        export = exports.request_export(self.user)
+
+        def fail(export):
+            if export.section == 3:
+                raise OSError("disk full")
+
+        export = exports.run(export.pk, report=fail)
+        self.assertEqual(export.status, DataExport.FAILED)
+        self.assertIn('disk full', self.client.get(reverse('api_exports')).json()['results'][0]['error'])
+
+        response = self.client.post(reverse('api_exports'))
+        self.assertEqual((response.json()['id'], response.json()['status']), (export.pk, 'pending'))
+        self.assertComplete(exports.run(export.pk))
+        self.assertNotEqual(exports.request_export(self.user).pk, export.pk)  # Done: a new one
+
+    def test_command_and_expiry(self):
+        out = StringIO()
+        call_command('export_user_data', 'alice', stdout=out)
+        export = DataExport.objects.get(user=self.user)
+        self.assertIn(exports.archive_path(export), out.getvalue())
+        self.assertComplete(export)
+
+        DataExport.objects.filter(pk=export.pk).update(finished_at=timezone.now() - timedelta(days=30))
+        self.assertEqual(exports.delete_expired(), 1)
+        self.assertFalse(os.path.exists(exports.archive_path(export)))
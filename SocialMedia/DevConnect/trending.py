@@ -0,0 +1,132 @@
+"""
+Trending posts: engagement with exponential time decay, kept in a table.
+
+Every like is worth TRENDING_WEIGHTS['like'] and every comment
+TRENDING_WEIGHTS['comment'], halving every TRENDING_HALF_LIFE seconds. Decaying
+all scores as time passes would mean rewriting every row. Instead an event is
+added already scaled up by 2 ** ((event time - epoch) / half-life), the same
+factor for every post. Stored scores therefore rank exactly like the decayed
+ones, and an event changes only its own post's row. Multiplying by
+2 ** (-(now - epoch) / half-life) gives the decayed value. Once the epoch is
+TRENDING_REBASE_AFTER old, the table is scaled down and the epoch moved to now,
+so the numbers never overflow.
+
+Scores are stored as integers, in 1/SCORE_SCALE of a point, so the keyset
+cursor of the trending list compares exact stored values. A day between
+rebases keeps the growth factor at 16 at most, far from the integer limit,
+while a like at the edge of TRENDING_WINDOW is still worth a few hundred units.
+
+refresh() reads the Like and Comment rows created since the last run (primary
+key above a stored watermark, so it costs the number of new events, not the
+size of either table) and folds them into TrendingScore in one transaction.
+Posts older than TRENDING_WINDOW are ignored and pruned. Events younger than
+TRENDING_SETTLE seconds are left for the next run, so a row whose transaction
+commits after one with a higher id is not skipped. Run it every few seconds
+with `manage.py refresh_trending --loop`. Removing a like does not lower a
+score: trending counts engagement as it happened.
+"""
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BigIntegerField, F, Q
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+
+from .models import Comment, Like, TrendingScore, TrendingState
+from .search import decode_cursor, encode_cursor
+
+TRENDING_HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', 6 * 3600)
+TRENDING_WINDOW = getattr(settings, 'TRENDING_WINDOW', 3 * 24 * 3600)
+TRENDING_REBASE_AFTER = getattr(settings, 'TRENDING_REBASE_AFTER', 24 * 3600)
+TRENDING_WEIGHTS = getattr(settings, 'TRENDING_WEIGHTS', {'like': 1.0, 'comment': 3.0})
+TRENDING_SETTLE = getattr(settings, 'TRENDING_SETTLE', 2)
+TRENDING_BATCH_SIZE = getattr(settings, 'TRENDING_BATCH_SIZE', 5000)
+TRENDING_PAGE_SIZE = getattr(settings, 'TRENDING_PAGE_SIZE', 20)
+TRENDING_MAX_PAGE_SIZE = getattr(settings, 'TRENDING_MAX_PAGE_SIZE', 100)
+
+SCORE_SCALE = 10 ** 6  # Stored scores are in millionths of a point
+
+# Event tables read by refresh(): model, watermark field on TrendingState, weight name
+SOURCES = (
+    (Like, 'last_like_id', 'like'),
+    (Comment, 'last_comment_id', 'comment'),
+)
+
+
+def _growth(seconds):
+    return 2 ** (seconds / TRENDING_HALF_LIFE)
+
+
+def _state(now):
+    """The locked state row, rebased first if its epoch is too old."""
+    state, _ = TrendingState.objects.select_for_update().get_or_create(pk=1, defaults={'epoch': now})
+    age = (now - state.epoch).total_seconds()
+    if age > TRENDING_REBASE_AFTER:
+        TrendingScore.objects.update(score=Cast(Round(F('score') / _growth(age)), BigIntegerField()))
+        state.epoch = now
+    return state
+
+
+def refresh(batch_size=TRENDING_BATCH_SIZE):
+    """Fold up to batch_size new likes and up to batch_size new comments into the scores. Returns events read."""
+    now = timezone.now()
+    cutoff = now - timedelta(seconds=TRENDING_WINDOW)
+    settled = now - timedelta(seconds=TRENDING_SETTLE)
+    read = 0
+
+    with transaction.atomic():
+        state = _state(now)
+        deltas = defaultdict(float)
+        post_created = {}
+        for model, watermark, weight in SOURCES:
+            events = list(
+                model.objects.filter(pk__gt=getattr(state, watermark))
+                .order_by('pk')
+                .values_list('pk', 'post_id', 'created_at', 'post__created_at')[:batch_size]
+            )
+            for i, (_, post_id, created_at, post_created_at) in enumerate(events):
+                if created_at > settled:
+                    del events[i:]
+                    break
+                if post_created_at >= cutoff:
+                    deltas[post_id] += TRENDING_WEIGHTS[weight] * _growth((created_at - state.epoch).total_seconds())
+                    post_created[post_id] = post_created_at
+            if events:
+                setattr(state, watermark, events[-1][0])
+                read += len(events)
+
+        # Only this transaction writes scores (it holds the state row), so read-modify-write is safe
+        existing = TrendingScore.objects.in_bulk(list(deltas))
+        for post_id, score in existing.items():
+            score.score += round(deltas[post_id] * SCORE_SCALE)
+        TrendingScore.objects.bulk_update(existing.values(), ['score'], batch_size=500)
+        TrendingScore.objects.bulk_create([
+            TrendingScore(post_id=post_id, score=round(delta * SCORE_SCALE), post_created_at=post_created[post_id])
+            for post_id, delta in deltas.items() if post_id not in existing
+        ], batch_size=500)
+
+        TrendingScore.objects.filter(post_created_at__lt=cutoff).delete()
+        state.save()
+    return read
+
+
+def trending_page(cursor=None, limit=TRENDING_PAGE_SIZE):
+    """
+    One page of trending posts, hottest first: ([(post_id, decayed score)], next_cursor).
+    The cursor is the opaque (stored score, post id) of the last row, like search's.
+    """
+    limit = max(1, min(limit, TRENDING_MAX_PAGE_SIZE))
+
+    # No window filter here: refresh() prunes, and the read stays a plain walk down the score index
+    rows = TrendingScore.objects.all()
+    if cursor:
+        score, post_id = decode_cursor(cursor)
+        rows = rows.filter(Q(score__lt=score) | Q(score=score, post_id__lt=post_id))
+    rows = list(rows.order_by('-score', '-post_id').values_list('post_id', 'score')[:limit + 1])
+
+    next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit else None
+    state = TrendingState.objects.filter(pk=1).values_list('epoch', flat=True).first()
+    decay = 1 / _growth((timezone.now() - state).total_seconds()) if state else 1
+    return [(post_id, score / SCORE_SCALE * decay) for post_id, score in rows[:limit]], next_cursor
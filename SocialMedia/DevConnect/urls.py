@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, async_views
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from django.conf import settings
 from django.conf.urls.static import static
@@ -8,6 +8,11 @@ urlpatterns = [
     path('', views.home, name='home'),
     path('profile/', views.profile, name='profile'),
     path('myposts/', views.myposts, name='myposts'),
+
+    # Infinite scroll: next page of posts as an HTML fragment, ?cursor=
+    path('home/more/', views.home_more, name='home_more'),
+    path('profile/more/', views.profile_more, name='profile_more'),
+    path('myposts/more/', views.myposts_more, name='myposts_more'),
     
     path('edit/<int:post_id>/', views.edit_post, name='edit_post'),
     path('delete/<int:post_id>/', views.delete_post, name='delete_post'),
@@ -30,6 +35,12 @@ urlpatterns = [
      
     # path('api/follows/<int:user_id>/', views.api_follow_list, name='api_follow_list'),
     path('api/users/', views.get_users, name='user-list'),   #follow check
+    path('api/users/suggested/', views.api_suggested_users, name='api_suggested_users'), #who to follow, ?limit=
+    path('api/admin/users/import/', views.api_import_users, name='api_import_users'), #staff, CSV/NDJSON bulk signup
+    path('api/batch/', views.api_batch, name='api_batch'), #several API calls in one request
+    path('api/exports/', views.api_exports, name='api_exports'), #personal data export: POST to start, GET progress
+    path('api/exports/<int:export_id>/', views.api_export_detail, name='api_export_detail'),
+    path('api/exports/<int:export_id>/download/', views.api_export_download, name='api_export_download'), #zip of NDJSON
 
 
 
@@ -39,19 +50,32 @@ urlpatterns = [
     path('api/posts/', views.api_post_list, name='api_post_list'),
     path('api/posts/<int:pk>/', views.api_post_detail, name='api-post-detail'), #to edit, delete
     path('api/myposts/', views.api_mypost_list, name='api_mypost_list'), #myposts
+    path('api/feed/', views.api_feed, name='api_feed'), #home timeline, ?cursor=
+    path('api/search/posts/', views.api_search_posts, name='api_search_posts'), #full-text, ?q=&cursor=
+    path('api/posts/trending/', views.api_trending_posts, name='api_trending_posts'), #decayed engagement, ?cursor=
     
     
 
 
     # Like APIs
     path('api/posts/<int:post_id>/like/', views.api_like_post, name='api_like_post'),
+    path('api/posts/state/', views.api_post_state, name='api_post_state'), #likes/comments for many posts, ?ids=
 
     # Comment APIs
     path('api/posts/<int:post_id>/comments/', views.api_comment_list, name='api_comment_list'),
 
     # Follow APIs
     path('api/follows/<int:user_id>/', views.api_follow_list, name='api_follow_list'),
+    path('api/users/<int:user_id>/followers/', views.api_user_followers, name='api_user_followers'), #?cursor=&limit=
+    path('api/users/<int:user_id>/following/', views.api_user_following, name='api_user_following'), #?cursor=&limit=
     
+    # Async versions of the hottest endpoints, served by SocialMedia.asgi
+    path('api/async/posts/<int:pk>/', async_views.api_post_detail, name='async_api_post_detail'),
+    path('api/async/posts/<int:post_id>/like/', async_views.api_like_post, name='async_api_like_post'),
+    path('api/async/posts/<int:post_id>/comments/', async_views.api_comment_list, name='async_api_comment_list'),
+    path('api/async/follows/<int:user_id>/', async_views.api_follow_list, name='async_api_follow_list'),
+    path('api/stream/', async_views.api_stream, name='api_stream'), #SSE, ?posts=&authors=
+
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
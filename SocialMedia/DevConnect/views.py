@@ -1,34 +1,66 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Post, Comment,Like,User,Profile,Follow
+from .models import Post, Comment,Like,User,Profile
 from django.contrib.auth import authenticate, login, logout
+from django.db import transaction
+from django.urls import reverse
+from .feed import read_timeline, page_of_posts, FEED_PAGE_SIZE
+from .interactions import toggle_like, toggle_follow
+
+
+def _cursor(request):
+    """Keyset cursor from ?cursor=; a missing or malformed value starts from the newest post."""
+    try:
+        return int(request.GET['cursor'])
+    except (KeyError, ValueError):
+        return None
+
+
+# Each page renders its first batch of posts; the *_more views return the next
+# batch as an HTML fragment for infinite scroll (templates/*_posts.html).
+def _home_page(request):
+    posts, next_cursor = read_timeline(request.user, cursor=_cursor(request))
+    return {'posts': posts, 'next_cursor': next_cursor, 'more_url': reverse('home_more')}
+
+
+def _profile_page(request):
+    posts = Post.objects.filter(author=request.user).select_related('author')
+    posts, next_cursor = page_of_posts(posts, cursor=_cursor(request))
+    return {'user': request.user, 'posts': posts, 'next_cursor': next_cursor, 'more_url': reverse('profile_more')}
+
+
+def _myposts_page(request):
+    posts = request.user.posts.select_related('author')
+    posts, next_cursor = page_of_posts(posts, cursor=_cursor(request))
+    return {'posts': posts, 'next_cursor': next_cursor, 'more_url': reverse('myposts_more')}
+
 
 # Home page view
 @login_required
 def home(request):
-    posts = Post.objects.all().order_by('-created_at')
-    comments = {post.id: post.comments.all() for post in posts}
-    liked_posts = Like.objects.filter(user=request.user).values_list('post', flat=True)
-
-    return render(request, 'home.html', {
-        'posts': posts,
-        'comments': comments,
-        'liked_posts': liked_posts,
-    })
+    return render(request, 'home.html', _home_page(request))
+
+@login_required
+def home_more(request):
+    return render(request, 'home_posts.html', _home_page(request))
+
+@login_required
 def profile(request):
-    user = request.user
-    posts = Post.objects.filter(author=user)
-    return render(request, 'profile.html', {'user': user, 'posts': posts})
+    return render(request, 'profile.html', _profile_page(request))
+
+@login_required
+def profile_more(request):
+    return render(request, 'profile_posts.html', _profile_page(request))
 
 # Myposts page view
 @login_required
 def myposts(request):
-    posts = request.user.posts.all()
+    return render(request, 'myposts.html', _myposts_page(request))
 
-    return render(request, 'myposts.html', {
-        'posts': posts,
-    })
+@login_required
+def myposts_more(request):
+    return render(request, 'myposts_posts.html', _myposts_page(request))
     
 @login_required
 def edit_post(request, post_id):
@@ -126,67 +158,68 @@ def create_post(request):
 # Comment on a post view
 @login_required
 def comment_post(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = get_object_or_404(Post.objects.select_related('author'), id=post_id)
 
     if request.method == "POST":
         content = request.POST.get('content')
         if content:
-            comment = Comment(author=request.user, post=post, content=content)
-            comment.save()
+            with transaction.atomic():  # The comment and its post's comment_count commit together
+                Comment.objects.create(author=request.user, post=post, content=content)
             return redirect('comment_post', post_id=post.id)
         else:
             messages.error(request, "Comment content cannot be empty.")
             return redirect('comment_post', post_id=post.id)
 
-    comments = post.comments.all()  # Fetch comments for GET request
+    comments = post.comments.select_related('author').order_by('created_at')  # Fetch comments for GET request
     return render(request, 'comment_post.html', {'post': post, 'comments': comments})
 
 
 # Like a post view
 @login_required
 def like_post(request, post_id):
-    post = Post.objects.get(id=post_id)
-    like, created = Like.objects.get_or_create(user=request.user, post=post)
-
-    if not created:
-        like.delete()  # Remove like if already liked
+    post = get_object_or_404(Post, id=post_id)
+    toggle_like(request.user, post.id)  # Remove like if already liked
 
     return redirect('home')
 
 
 # --------------------------------------API VIEWS------------------------------------------------------------------------------------
 
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
 from rest_framework.response import Response
 from rest_framework import status
-from .serializers import ProfileSerializer, PostSerializer, LikeSerializer, CommentSerializer, FollowSerializer, UserSerializer
-from rest_framework.permissions import IsAuthenticated,AllowAny
+from . import batch, conditional, exports, like_buffer, object_cache, provisioning, renderers
+from .follows import follow_counts, follow_page, FOLLOW_PAGE_SIZE
+from .models import DataExport, Suggestion
+from .suggestions import SUGGESTED_PAGE_SIZE, SUGGESTIONS_PER_USER
+from .search import search_posts, InvalidCursor, SEARCH_PAGE_SIZE
+from .trending import trending_page, TRENDING_PAGE_SIZE
+from .serializers import ProfileSerializer, PostSerializer, LikeSerializer, CommentSerializer, FollowSerializer, UserListSerializer
+from rest_framework.permissions import IsAuthenticated,AllowAny,IsAdminUser
 from django.views.decorators.csrf import csrf_exempt
-from django.db import transaction
 import json
 import re
-from rest_framework_simplejwt.tokens import RefreshToken
+from itertools import islice
+from .authentication import StatelessRefreshToken
 from django.core.exceptions import ValidationError
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.http import FileResponse
+from rest_framework.settings import api_settings
 
+# Whole-table lists are streamed, and can be asked for as NDJSON too
+LIST_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, renderers.NDJSONRenderer]
 
 
 
 @api_view(['GET', 'POST'])
+@renderer_classes(LIST_RENDERER_CLASSES)
 def api_profile_list(request):
     """API view to list all profiles or create a new user profile (signup)."""
     
     if request.method == 'GET':
-        # Retrieve all user profiles
-        users = User.objects.all()
-        users_data = []
-        
-        for user in users:
-            users_data.append({
-                'username': user.username,
-                'email': user.email,
-            })
-        
-        return Response(users_data, status=status.HTTP_200_OK)
+        # Retrieve all user profiles, written out as they are read
+        return renderers.stream_values(request, User.objects.values('username', 'email'))
 
     elif request.method == 'POST':
         # Handle user signup
@@ -214,7 +247,7 @@ def api_profile_list(request):
             user.save()
 
             # Generate JWT tokens (access and refresh)
-            refresh = RefreshToken.for_user(user)
+            refresh = StatelessRefreshToken.for_user(user)
             access_token = str(refresh.access_token)
 
             # Return the tokens in the response
@@ -236,10 +269,11 @@ def api_profile_list(request):
 def api_profile_view(request):
     """Returns the profile of the logged-in user."""
     if request.user.is_authenticated:
+        card = object_cache.get_user_card(request.user.id)
         profile_data = {
-            "id": request.user.id,  # Adding the user's ID
-            "username": request.user.username,
-            "email": request.user.email,
+            "id": card["id"],  # Adding the user's ID
+            "username": card["username"],
+            "email": card["email"],
         }
         return Response(profile_data, status=200)
     else:
@@ -254,48 +288,146 @@ from django.contrib.auth.models import User
 @api_view(['GET'])
 def get_user_profile(request, username):
     """API view to return the profile of another user by username."""
-    try:
-        # Retrieve the user by username
-        user = User.objects.get(username=username)
-        
-        # Prepare the profile data
-        profile_data = {
-            "id": user.id, 
-            "username": user.username,
-            "email": user.email,
-            "bio": user.profile.bio if hasattr(user, 'profile') and user.profile else None,  # Safe check
-        }
-
-        return Response(profile_data, status=status.HTTP_200_OK)
-    
-    except User.DoesNotExist:
+    # Served from the user card cache, which holds id, username, email, bio and counters
+    profile_data = object_cache.get_user_card_by_username(username)
+    if profile_data is None:
         return Response({"error": "User not found."}, status=status.HTTP_404_NOT_FOUND)
+
+    # The card is the whole response, and has no timestamp for Last-Modified
+    etag = conditional.make_etag(*profile_data.values())
+    return conditional.not_modified(request, etag) or conditional.with_validators(
+        Response(profile_data, status=status.HTTP_200_OK), etag,
+    )
     
     
 
 @api_view(['GET'])
+@renderer_classes(LIST_RENDERER_CLASSES)
 def get_users(request):
     # Ensure the user is authenticated
     if not request.user.is_authenticated:
         return Response({"error": "You must be logged in to view users."}, status=403)
     
     # Get all users excluding the logged-in user
-    users = User.objects.exclude(id=request.user.id)
-    serializer = UserSerializer(users, many=True)
-    
-    return Response(serializer.data)
+    users = UserListSerializer.stream_queryset(User.objects.exclude(id=request.user.id), request.user)
+    return renderers.stream_values(request, users, UserListSerializer.stream_row)
 
 
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def api_import_users(request):
+    """
+    Create accounts in bulk (staff only). Send a CSV or NDJSON file as the
+    multipart field "file", or as the request body with Content-Type text/csv
+    or application/x-ndjson. See provisioning.py for the columns.
+    """
+    if request.content_type.startswith('multipart/form-data'):
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Upload the input as the 'file' field."}, status=status.HTTP_400_BAD_REQUEST)
+        stream, fmt = upload, provisioning.guess_format(upload.name, upload.content_type or '')
+    else:
+        stream, fmt = request.stream, provisioning.guess_format('', request.content_type)
+    if stream is None:
+        return Response({"error": "The request has no body."}, status=status.HTTP_400_BAD_REQUEST)
 
+    limit = provisioning.IMPORT_API_MAX_ROWS
+    try:
+        # Passwords are hashed in this worker, so the rows are capped; nothing is created over the cap
+        rows = list(islice(provisioning.read_rows(stream, fmt), limit + 1))
+        if len(rows) > limit:
+            return Response(
+                {"error": f"More than {limit} rows; import bigger files with `manage.py import_users`."},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+        result = provisioning.import_users(rows)
+    except (provisioning.ImportFormatError, UnicodeDecodeError) as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        "processed": result.processed,
+        "created": result.created,
+        "failed": result.failed,
+        "errors": [{"line": line, "error": message} for line, message in result.errors],
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def api_batch(request):
+    """
+    Run several API requests in one round trip, as the requesting user:
+    {"requests": [{"method", "path", "body"}, ...]} in, {"responses": [{"status", "body"}, ...]}
+    out, in the same order. See batch.py for the limits.
+    """
+    if not isinstance(request.data, dict):
+        return Response({"error": "Send a JSON object with a 'requests' list."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        responses = batch.run_batch(request, request.data.get('requests'))
+    except batch.BatchError as e:
+        return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({"responses": responses}, status=status.HTTP_200_OK)
 
 
 @api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def api_exports(request):
+    """
+    GET: the user's personal data exports, newest first, with their progress.
+    POST: export everything the user has posted, commented, liked and followed
+    as a zip of NDJSON files (or resume their unfinished export). It runs in
+    the background; poll api/exports/<id>/ until it is done. See exports.py.
+    """
+    if request.method == 'POST':
+        export = exports.request_export(request.user)
+        return Response(exports.progress(export), status=status.HTTP_202_ACCEPTED)
+
+    user_exports = DataExport.objects.filter(user=request.user).order_by('-pk')
+    return Response({"results": [exports.progress(export) for export in user_exports]}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_export_detail(request, export_id):
+    """Progress of one of the user's exports, with the download link once it is done."""
+    export = DataExport.objects.filter(pk=export_id, user=request.user).first()
+    if export is None:
+        return Response({"error": "Export not found."}, status=status.HTTP_404_NOT_FOUND)
+    data = exports.progress(export)
+    if export.status == DataExport.DONE:
+        data['download'] = reverse('api_export_download', args=[export.pk])
+    return Response(data, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, renderers.ZipRenderer])
+def api_export_download(request, export_id):
+    """The zip archive of a finished export, streamed from disk."""
+    export = DataExport.objects.filter(pk=export_id, user=request.user, status=DataExport.DONE).first()
+    if export is None:
+        return Response({"error": "Export not found or not finished."}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        archive = open(exports.archive_path(export), 'rb')
+    except FileNotFoundError:
+        return Response({"error": "The export has expired; request a new one."}, status=status.HTTP_410_GONE)
+    return FileResponse(archive, as_attachment=True, filename=f'devconnect-{request.user.username}-{export.pk}.zip')
+
+
+
+
+
+@api_view(['GET', 'POST'])
+@renderer_classes(LIST_RENDERER_CLASSES)
 def api_post_list(request):
     """API view to list all posts or create a new post."""
     if request.method == 'GET':
-        posts = Post.objects.all()
-        serializer = PostSerializer(posts, many=True, context={'request': request})  # Add request to the context
-        return Response(serializer.data)
+        etag = conditional.make_etag(request.user.pk, conditional.post_list_version())
+        if response := conditional.not_modified(request, etag):
+            return response
+
+        posts = PostSerializer.stream_queryset(Post.objects.all(), request.user)
+        response = renderers.stream_values(request, posts, PostSerializer.stream_row)
+        return conditional.with_validators(response, etag)
 
     elif request.method == 'POST':
         serializer = PostSerializer(data=request.data)
@@ -304,24 +436,100 @@ def api_post_list(request):
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-    
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_feed(request):
+    """Home timeline of the logged-in user, newest first, paginated with ?cursor=."""
+    try:
+        cursor = int(request.GET['cursor']) if request.GET.get('cursor') else None
+        limit = int(request.GET.get('limit', FEED_PAGE_SIZE))
+    except ValueError:
+        return Response({"error": "cursor and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+    posts, next_cursor = read_timeline(request.user, cursor=cursor, limit=limit)
+    serializer = PostSerializer(posts, many=True, context={'request': request})
+    return Response({
+        "results": serializer.data,
+        "next_cursor": next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def api_search_posts(request):
+    """Full-text search over post content, best match first, paginated with ?cursor=."""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({"error": "Query parameter 'q' is required."}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        limit = int(request.GET.get('limit', SEARCH_PAGE_SIZE))
+        post_ids, next_cursor = search_posts(query, cursor=request.GET.get('cursor'), limit=limit)
+    except (ValueError, InvalidCursor):
+        return Response({"error": "Invalid cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+    posts = PostSerializer.setup_queryset(Post.objects.filter(id__in=post_ids), request.user).in_bulk()
+    serializer = PostSerializer([posts[post_id] for post_id in post_ids if post_id in posts], many=True, context={'request': request})
+    return Response({
+        "results": serializer.data,
+        "next_cursor": next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def api_trending_posts(request):
+    """Posts with the most recent engagement, from the scores refresh_trending keeps; paginated with ?cursor=."""
+    try:
+        limit = int(request.GET.get('limit', TRENDING_PAGE_SIZE))
+        ranked, next_cursor = trending_page(cursor=request.GET.get('cursor'), limit=limit)
+    except (ValueError, InvalidCursor):
+        return Response({"error": "Invalid cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+    posts = PostSerializer.setup_queryset(Post.objects.filter(id__in=[post_id for post_id, _ in ranked]), request.user).in_bulk()
+    ranked = [(posts[post_id], score) for post_id, score in ranked if post_id in posts]
+    results = PostSerializer([post for post, _ in ranked], many=True, context={'request': request}).data
+    for data, (_, score) in zip(results, ranked):
+        data['trending_score'] = round(score, 3)
+    return Response({
+        "results": results,
+        "next_cursor": next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET', 'PUT', 'DELETE'])
 def api_post_detail(request, pk):
     """
     API view to retrieve, update, or delete a specific post.
     """
+    # Reads are served from the post cache; the database is only asked for the
+    # post's version, which also carries the viewer's like
+    if request.method == 'GET':
+        version = conditional.post_version(pk, request.user)
+        if version is None:
+            return Response({"error": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+        buffered = like_buffer.viewer_state(pk, request.user.pk) if request.user.is_authenticated else None
+        is_liked = buffered if buffered is not None else version['is_liked']
+        pending = like_buffer.pending_delta(pk)
+        etag = conditional.make_etag(request.user.pk, *version.values(), is_liked, pending)
+        last_modified = conditional.newest(version['updated_at'], version['last_like'], version['last_comment'])
+        if response := conditional.not_modified(request, etag, last_modified):
+            return response
+
+        data = object_cache.get_post(pk)
+        if data is None:
+            return Response({"error": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
+        data['is_liked'] = is_liked
+        data['like_count'] += pending
+        return conditional.with_validators(Response(data), etag, last_modified)
+
     try:
-        post = Post.objects.get(pk=pk)
+        post = Post.objects.select_related('author').get(pk=pk)
     except Post.DoesNotExist:
         return Response({"error": "Post not found."}, status=status.HTTP_404_NOT_FOUND)
 
-    # Retrieve a single post
-    if request.method == 'GET':
-        serializer = PostSerializer(post)
-        return Response(serializer.data)
-
     # Update a post
-    elif request.method == 'PUT':
+    if request.method == 'PUT':
         # Ensure the user is the author of the post
         if post.author != request.user:
             return Response({"error": "You do not have permission to edit this post."}, status=status.HTTP_403_FORBIDDEN)
@@ -350,8 +558,8 @@ def api_mypost_list(request):
     
     if request.method == 'GET':
         # Get posts for the logged-in user
-        posts = Post.objects.filter(author=request.user)  # Filter posts by the logged-in user
-        serializer = PostSerializer(posts, many=True)
+        posts = PostSerializer.setup_queryset(Post.objects.filter(author=request.user).order_by('-created_at'), request.user)  # Filter posts by the logged-in user
+        serializer = PostSerializer(posts, many=True, context={'request': request})
         return Response(serializer.data)
 
     elif request.method == 'POST':
@@ -372,7 +580,7 @@ def api_like_post(request, post_id):
     """
     API view to like/unlike a post and fetch like details.
     Handles:
-    - POST: Toggles like/unlike for the authenticated user.
+    - POST: Toggles like/unlike for the authenticated user; returns the new state and count.
     - GET: Retrieves the like count and list of users who liked the post.
     """
     try:
@@ -381,28 +589,19 @@ def api_like_post(request, post_id):
         return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'POST':
-        # Toggle like/unlike
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
-        if not created:
-            like.delete()  # Unlike the post
-            return Response({
-                "message": "Like removed",
-                "like_count": post.likes.count(),
-                "users": [{"id": like.user.id, "username": like.user.username} for like in post.likes.all()]
-            }, status=status.HTTP_200_OK)
-
+        # Toggle like/unlike; only the new state and count, a viral post has too many likers to list
+        created, like_count = toggle_like(request.user, post.id)
         return Response({
-            "message": "Post liked",
-            "like_count": post.likes.count(),
-            "users": [{"id": like.user.id, "username": like.user.username} for like in post.likes.all()]
-        }, status=status.HTTP_201_CREATED)
+            "message": "Post liked" if created else "Like removed",
+            "like_count": like_count,
+            "is_liked": created,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
     elif request.method == 'GET':
         # Retrieve like details
-        likes = Like.objects.filter(post=post)
+        likes = Like.objects.filter(post=post).select_related('user').order_by('-created_at')
         return Response({
-            "like_count": likes.count(),
+            "like_count": post.like_count,
             "users": [{"id": like.user.id, "username": like.user.username} for like in likes]
         }, status=status.HTTP_200_OK)
 
@@ -410,30 +609,98 @@ def api_like_post(request, post_id):
 
 
 
+POST_STATE_MAX_IDS = 100
+POST_STATE_MAX_LIKERS = 10
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_post_state(request):
+    """
+    Like count, comment count, viewer's like and first likers for a page of posts.
+    Replaces one GET /api/posts/<id>/like/ per visible post with a single request:
+    ?ids=1,2,3 (up to 100) and optional ?likers=N (newest N likers per post).
+    """
+    try:
+        ids = [int(post_id) for post_id in request.GET.get('ids', '').split(',') if post_id]
+        likers = int(request.GET.get('likers', 3))
+    except ValueError:
+        return Response({"error": "ids and likers must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+
+    if not ids or len(ids) > POST_STATE_MAX_IDS:
+        return Response({"error": f"Pass between 1 and {POST_STATE_MAX_IDS} post ids."}, status=status.HTTP_400_BAD_REQUEST)
+    likers = max(0, min(likers, POST_STATE_MAX_LIKERS))
+
+    # One query for counters and the viewer's like
+    posts = (
+        Post.objects.filter(id__in=ids)
+        .with_is_liked(request.user)
+        .values('id', 'like_count', 'comment_count', 'is_liked')
+    )
+    state = {
+        post['id']: {
+            "post_id": post['id'],
+            "like_count": post['like_count'],
+            "comment_count": post['comment_count'],
+            "is_liked": post['is_liked'],
+            "likers": [],
+        }
+        for post in posts
+    }
+
+    # One query for the newest likers of every post, ranked per post
+    if state and likers:
+        recent_likes = (
+            Like.objects.filter(post_id__in=state)
+            .annotate(rank=Window(RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').desc(), F('id').desc()]))
+            .filter(rank__lte=likers)
+            .values('post_id', 'user_id', 'user__username', 'rank')
+        )
+        # Sorted here rather than with ORDER BY, which would sort the whole window output again
+        for like in sorted(recent_likes, key=lambda like: (like['post_id'], like['rank'])):
+            state[like['post_id']]["likers"].append({"id": like['user_id'], "username": like['user__username']})
+
+    return Response({
+        "results": [state[post_id] for post_id in dict.fromkeys(ids) if post_id in state],
+    }, status=status.HTTP_200_OK)
+
+
 @api_view(['GET', 'POST'])
 # @permission_classes([IsAuthenticated])
 def api_comment_list(request, post_id):
     """API view to list all comments for a post or create a new comment."""
+    if request.method == 'GET':
+        # The post's version also tells whether it exists. The comments only
+        # change with it, since it includes the newest comment and the comment count
+        version = conditional.post_version(post_id, request.user)
+        if version is None:
+            return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
+        etag = conditional.make_etag(request.user.pk, *version.values())
+        last_modified = conditional.newest(version['updated_at'], version['last_like'], version['last_comment'])
+        if response := conditional.not_modified(request, etag, last_modified):
+            return response
+
+        # Retrieve all comments for the specified post
+        comments = CommentSerializer.setup_queryset(Comment.objects.filter(post_id=post_id).order_by('created_at'), request.user)
+        # The version already knows whether the viewer likes the post every comment nests
+        liked_posts = {post_id: version['is_liked']} if request.user.is_authenticated else {}
+        serializer = CommentSerializer(comments, many=True, context={'request': request, 'liked_posts': liked_posts})
+        return conditional.with_validators(Response(serializer.data, status=status.HTTP_200_OK), etag, last_modified)
+
     try:
         # Fetch the post by its ID
         post = Post.objects.get(id=post_id)
     except Post.DoesNotExist:
         return Response({"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    if request.method == 'GET':
-        # Retrieve all comments for the specified post
-        comments = Comment.objects.filter(post=post)
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
-
-    elif request.method == 'POST':
-        # Handle the creation of a new comment
-        serializer = CommentSerializer(data=request.data)
-        if serializer.is_valid():
-            # Save the comment with the logged-in user as the author and the post as the target
+    # Handle the creation of a new comment
+    serializer = CommentSerializer(data=request.data)
+    if serializer.is_valid():
+        # Save the comment with the logged-in user as the author and the post as the target,
+        # in one transaction with the post's comment_count
+        with transaction.atomic():
             serializer.save(author=request.user, post=post)
-            return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 from rest_framework.permissions import IsAuthenticated
 
@@ -443,43 +710,90 @@ def api_follow_list(request, user_id):
     """
     API view to toggle follow/unfollow and fetch follow details.
     Handles:
-    - POST: Toggles follow/unfollow for the authenticated user.
-    - GET: Retrieves the follower count and list of followers for a user.
+    - POST: Toggles follow/unfollow for the authenticated user; returns the new state and count.
+    - GET: Retrieves the follow counts and the first page of followers for a user.
+    The full lists are paginated by api_user_followers / api_user_following.
     """
-    try:
-        target_user = User.objects.get(id=user_id)
-    except User.DoesNotExist:
+    # Anyone can read the lists, only a signed-in user can follow
+    if request.method == 'POST' and not request.user.is_authenticated:
+        return Response({"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
+
+    counts = follow_counts(user_id)
+    if counts is None:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
     if request.method == 'POST':
         # Toggle follow/unfollow
-        follow, created = Follow.objects.get_or_create(follower=request.user, following=target_user)
-        
-        if not created:
-            follow.delete()  # Unfollow the user
-            return Response({
-                "message": "Unfollowed successfully",
-                "follower_count": Follow.objects.filter(following=target_user).count(),
-                "followers": [follow.follower.username for follow in Follow.objects.filter(following=target_user)]
-            }, status=status.HTTP_200_OK)
-
+        created, follower_count = toggle_follow(request.user, user_id)
         return Response({
-            "message": "Followed successfully",
-            "follower_count": Follow.objects.filter(following=target_user).count(),
-            "followers": [follow.follower.username for follow in Follow.objects.filter(following=target_user)]
-        }, status=status.HTTP_201_CREATED)
+            "message": "Followed successfully" if created else "Unfollowed successfully",
+            "follower_count": follower_count,
+            "is_following": created,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
 
     elif request.method == 'GET':
         # Retrieve follow details
-        followers = Follow.objects.filter(following=target_user)
+        followers, next_cursor = follow_page(user_id, 'followers')
         return Response({
-            "follower_count": followers.count(),
-            "followers": [follow.follower.username for follow in followers]
+            "follower_count": counts[0],
+            "following_count": counts[1],
+            "followers": [follower['username'] for follower in followers],
+            "next_cursor": next_cursor,
         }, status=status.HTTP_200_OK)
 
     return Response({"error": "Invalid request method"}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
+def _follow_list(request, user_id, direction):
+    counts = follow_counts(user_id)
+    if counts is None:
+        return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    try:
+        limit = int(request.GET.get('limit', FOLLOW_PAGE_SIZE))
+        users, next_cursor = follow_page(user_id, direction, cursor=request.GET.get('cursor'), limit=limit)
+    except (ValueError, InvalidCursor):
+        return Response({"error": "Invalid cursor or limit."}, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response({
+        "count": counts[0] if direction == 'followers' else counts[1],
+        "results": users,
+        "next_cursor": next_cursor,
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def api_suggested_users(request):
+    """Who to follow: friends of friends by mutual count, precomputed by suggestions.py."""
+    try:
+        limit = max(1, min(int(request.GET.get('limit', SUGGESTED_PAGE_SIZE)), SUGGESTIONS_PER_USER))
+    except ValueError:
+        return Response({"error": "limit must be an integer."}, status=status.HTTP_400_BAD_REQUEST)
+
+    suggested = (
+        Suggestion.objects.filter(user=request.user)
+        .order_by('-score', 'candidate_id')
+        .values('candidate_id', 'candidate__username', 'score')[:limit]
+    )
+    return Response([
+        {"id": row['candidate_id'], "username": row['candidate__username'], "mutual_count": row['score']}
+        for row in suggested
+    ], status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def api_user_followers(request, user_id):
+    """Users following user_id, most recent first, paginated with ?cursor=&limit=."""
+    return _follow_list(request, user_id, 'followers')
+
+
+@api_view(['GET'])
+def api_user_following(request, user_id):
+    """Users that user_id follows, most recent first, paginated with ?cursor=&limit=."""
+    return _follow_list(request, user_id, 'following')
+
+
 # @api_view(['GET', 'POST'])
 # def api_follow_list(request, user_id):
 #     """
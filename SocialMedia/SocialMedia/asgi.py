@@ -3,6 +3,10 @@ ASGI config for SocialMedia project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve the project through this module (uvicorn/daphne) to use the async API
+views and the /api/stream/ Server-Sent Events push channel, which hold a
+connection open per client without tying up a worker thread.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
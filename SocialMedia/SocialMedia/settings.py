@@ -56,6 +56,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'DevConnect.compression.CompressionMiddleware',  # brotli or gzip, see below
+    'DevConnect.db_router.ReplicaRoutingMiddleware',  # Only active with DATABASE_REPLICAS
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -63,6 +65,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # 'DevConnect.instrumentation.RequestTimingMiddleware',  # Query/serialize/template timings, see below
 ]
 
 ROOT_URLCONF = 'SocialMedia.urls'
@@ -146,7 +149,13 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Tokens it issues carry the user's claims, so requests skip the user query
+        'DevConnect.authentication.StatelessJWTAuthentication',
+    ),
+    'DEFAULT_RENDERER_CLASSES': (
+        # DRF's JSONRenderer output, through orjson; 'rest_framework.renderers.JSONRenderer' to go back
+        'DevConnect.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ),
 }
 
@@ -162,10 +171,102 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),  # Refresh token lifetime
     'ROTATE_REFRESH_TOKENS': False,  # Disable token rotation (optional)
     'BLACKLIST_AFTER_ROTATION': False,  # Optional: Blacklist refresh tokens after rotation
+    'TOKEN_OBTAIN_SERIALIZER': 'DevConnect.authentication.StatelessTokenObtainPairSerializer',
 }
 
 import os
 
 # Media settings
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Home timeline (DevConnect/feed.py)
+FEED_PAGE_SIZE = 20
+FEED_CELEBRITY_THRESHOLD = 10000  # Authors with more followers are merged in at read time
+
+
+# Object cache (DevConnect/object_cache.py). Local memory is fine for development
+# and tests; point this at a shared backend (Redis, Memcached) in production.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+OBJECT_CACHE_TIMEOUT = 300
+
+
+# Real-time push (DevConnect/realtime.py). Use RedisBackend with more than one worker process.
+REALTIME_BACKEND = 'DevConnect.realtime.LocalBackend'
+# REALTIME_BACKEND = 'DevConnect.realtime.RedisBackend'
+# REALTIME_REDIS_URL = 'redis://localhost:6379/0'
+
+
+# Request instrumentation (DevConnect/instrumentation.py), used when its middleware is enabled
+INSTRUMENTATION_SAMPLE_RATE = 1.0  # Fraction of requests profiled; e.g. 0.01 in production
+INSTRUMENTATION_SLOW_REQUEST_MS = 500  # Log requests slower than this
+INSTRUMENTATION_N_PLUS_ONE_THRESHOLD = 5  # Log when the same SQL runs this many times in one request
+INSTRUMENTATION_SERVER_TIMING = True
+
+
+# Write-behind likes on viral posts (DevConnect/like_buffer.py). Off by default;
+# use the RedisBackend with more than one worker process.
+LIKE_BUFFER_ENABLED = False
+LIKE_BUFFER_HOT_THRESHOLD = 1000  # Buffer likes on posts with at least this many
+LIKE_BUFFER_MAX_STALENESS = 2.0  # Seconds before buffered likes must be in the database
+LIKE_BUFFER_BACKEND = 'DevConnect.like_buffer.LocalBackend'
+# LIKE_BUFFER_JOURNAL = BASE_DIR / 'like_buffer.journal'  # LocalBackend crash replay
+# LIKE_BUFFER_BACKEND = 'DevConnect.like_buffer.RedisBackend'
+# LIKE_BUFFER_REDIS_URL = 'redis://localhost:6379/0'
+# LIKE_BUFFER_FLUSH_LEASE = 60  # RedisBackend: seconds a flush may hold the lock shared by workers
+
+
+# Who-to-follow suggestions (DevConnect/suggestions.py); run `manage.py rebuild_suggestions` periodically
+SUGGESTIONS_PER_USER = 50
+
+
+# Trending posts (DevConnect/trending.py); keep `manage.py refresh_trending --loop` running
+TRENDING_HALF_LIFE = 6 * 3600  # Seconds for a like or comment to lose half its weight
+TRENDING_WINDOW = 3 * 24 * 3600  # Posts older than this are not trending
+TRENDING_WEIGHTS = {'like': 1.0, 'comment': 3.0}
+# TRENDING_REBASE_AFTER = 24 * 3600  # Seconds between rescaling the stored scores; keep it short, they are integers
+
+
+# Stateless JWT authentication (DevConnect/authentication.py): seconds a user's active
+# flag and token version may be served from cache before revocations are seen
+AUTH_STATE_TTL = 30
+
+
+# Bulk account import (DevConnect/provisioning.py): `manage.py import_users`, POST /api/admin/users/import/
+IMPORT_BATCH_SIZE = 1000
+# IMPORT_HASH_WORKERS = 4  # Processes hashing passwords in the command; default one per CPU
+IMPORT_API_MAX_ROWS = 1000  # Rows per request to the endpoint, which hashes in the web worker
+
+
+# Read replicas (DevConnect/db_router.py). Add each replica to DATABASES and list its alias
+# in DATABASE_REPLICAS; API and template reads then go to them round-robin, except right
+# after the client wrote something.
+DATABASE_ROUTERS = ['DevConnect.db_router.ReplicaRouter']
+DATABASE_REPLICAS = []
+# DATABASES['replica1'] = {**DATABASES['default'], 'HOST': 'replica1.internal'}
+# DATABASE_REPLICAS = ['replica1']
+REPLICA_PIN_SECONDS = 5  # Reads stay on the primary this long after the client writes
+REPLICA_MAX_LAG = 5  # Seconds behind the primary before a replica gets no reads
+# REPLICA_LAG_CHECK_INTERVAL = 2  # Seconds between lag checks, run by a thread in each process;
+# give replicas a connect timeout below REPLICA_LAG_CHECK_INTERVAL + REPLICA_MAX_LAG
+
+
+# POST /api/batch/ (DevConnect/batch.py)
+BATCH_MAX_REQUESTS = 20  # Sub-requests per batch
+BATCH_MAX_SECONDS = 5  # Sub-requests not started by then get a 504
+
+
+# Streamed whole-table lists (DevConnect/renderers.py) and response compression
+# (DevConnect/compression.py; brotli needs the 'brotli' package, gzip is always available)
+STREAM_CHUNK_SIZE = 2000  # Rows per keyset page, one query each
+COMPRESSION_BROTLI_QUALITY = 5
+
+
+# Personal data exports (DevConnect/exports.py): POST /api/exports/, `manage.py export_user_data <username>`
+EXPORT_ROOT = BASE_DIR / 'exports'  # Not under MEDIA_ROOT: the archives must never be served publicly
+EXPORT_KEEP_DAYS = 7  # Finished archives are deleted by `manage.py run_exports` after this
+EXPORT_THREAD = True  # Run exports in a thread of the web process; turn off when `run_exports --loop` runs them
@@ -0,0 +1,240 @@
+"""
+End-to-end load benchmark of the main API endpoints.
+
+Drives a running server (runserver, gunicorn or uvicorn against the same
+database) with loadgen and reports, per endpoint, p50/p95/p99 latency and
+throughput. SQL queries per request are counted in-process with the Django
+test client, since a server under load can't report them per request.
+
+Fixtures come from a data set made by `manage.py seed_social`; the users it
+creates share one password.
+
+    cd SocialMedia
+    python manage.py seed_social --users 100000
+    gunicorn SocialMedia.wsgi --workers 4 &
+    python benchmarks/api_load.py --output run1.json
+    python benchmarks/api_load.py --baseline run1.json --output run2.json
+
+The result is one JSON document; with --baseline it also has the relative
+change of every metric against a previous run.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from loadgen import call, run_load
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# name -> (method, path template); {post} and {user} are filled in per request
+SCENARIOS = {
+    'api_post_list': ('GET', '/api/posts/'),
+    'api_comment_list': ('GET', '/api/posts/{post}/comments/'),
+    'api_like_post': ('POST', '/api/posts/{post}/like/'),
+    'api_follow_list': ('POST', '/api/follows/{user}/'),
+    'token_obtain': ('POST', '/api/auth/token/'),
+}
+
+# Metrics compared against --baseline, and whether bigger is better
+COMPARED = {
+    ('latency_ms', 'p50'): False,
+    ('latency_ms', 'p95'): False,
+    ('latency_ms', 'p99'): False,
+    ('throughput_rps',): True,
+    ('queries_per_request',): False,
+}
+
+
+def setup_django():
+    sys.path.insert(0, PROJECT_DIR)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'SocialMedia.settings')
+    import django
+    django.setup()
+
+
+def pick_fixtures(args):
+    """Sample seeded users and posts spread over the whole id range."""
+    from django.contrib.auth.models import User
+    from DevConnect.models import Post
+
+    rng = random.Random(args.seed)
+    usernames = list(
+        User.objects.filter(username__startswith=f'{args.prefix}_', is_active=True)
+        .order_by('?' if args.random_users else 'pk')
+        .values_list('username', flat=True)[:args.users]
+    )
+    if not usernames:
+        sys.exit(f"No users named {args.prefix}_*; run `manage.py seed_social` first.")
+
+    post_pks = Post.objects.values_list('pk', flat=True)
+    first, last = post_pks.order_by('pk').first(), post_pks.order_by('-pk').first()
+    if first is None:
+        sys.exit("No posts; run `manage.py seed_social` first.")
+    candidates = {rng.randint(first, last) for _ in range(args.posts * 4)}
+    post_ids = list(Post.objects.filter(pk__in=candidates).values_list('pk', flat=True)[:args.posts]) or [first]
+    user_ids = list(User.objects.filter(username__in=usernames).values_list('pk', flat=True))
+    return usernames, user_ids, post_ids
+
+
+def request_for(name, usernames, user_ids, post_ids, password):
+    """make_request(client, iteration) for one scenario: each client acts as one user on varying targets."""
+    method, template = SCENARIOS[name]
+
+    def make_request(client, iteration, tokens):
+        if name == 'token_obtain':
+            return method, template, None, {'username': usernames[client % len(usernames)], 'password': password}
+        rng = random.Random(client * 1_000_003 + iteration)
+        path = template.format(post=rng.choice(post_ids), user=rng.choice(user_ids))
+        return method, path, {'Authorization': f'Bearer {tokens[client % len(tokens)]}'}, None
+
+    return make_request
+
+
+def count_queries(name, usernames, user_ids, post_ids, password, samples):
+    """Mean number of SQL queries one request of the scenario runs, measured in-process."""
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import CaptureQueriesContext
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    method, template = SCENARIOS[name]
+    user = User.objects.get(username=usernames[0])
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}')
+
+    counts = []
+    for i in range(samples * 2):  # Even number of calls, so toggles leave the data as it was
+        path = template.format(post=post_ids[i // 2 % len(post_ids)], user=user_ids[-1 - i // 2 % len(user_ids)])
+        body = {'username': user.username, 'password': password} if name == 'token_obtain' else {}
+        with CaptureQueriesContext(connection) as captured:
+            if method == 'GET':
+                client.get(path)
+            else:
+                client.post(path, body, content_type='application/json')
+        counts.append(len(captured.captured_queries))
+    return round(sum(counts) / len(counts), 2)
+
+
+async def get_tokens(base_url, usernames, password):
+    tokens = []
+    for username in usernames:
+        status, body = await call(base_url, 'POST', '/api/auth/token/', body={'username': username, 'password': password})
+        if status != 200:
+            sys.exit(f"Could not log in as {username}: {status} {body}")
+        tokens.append(body['access'])
+    return tokens
+
+
+async def bench(args, names, fixtures):
+    usernames, user_ids, post_ids = fixtures
+    tokens = await get_tokens(args.base_url, usernames, args.password)
+    results = {}
+    for name in names:
+        make_request = request_for(name, usernames, user_ids, post_ids, args.password)
+        results[name] = await run_load(
+            args.base_url,
+            lambda client, iteration: make_request(client, iteration, tokens),
+            concurrency=args.concurrency,
+            duration=args.duration,
+        )
+    return results
+
+
+def dig(result, path):
+    for key in path:
+        result = (result or {}).get(key)
+    return result
+
+
+def compare(results, baseline):
+    """Per scenario and metric: before, after, relative change (-0.12 is 12% lower) and whether that is better."""
+    changes = {}
+    for name, result in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        changes[name] = {}
+        for path, higher_is_better in COMPARED.items():
+            old, new = dig(before, path), dig(result, path)
+            if old and new is not None:
+                changes[name]['.'.join(path)] = {
+                    "before": old,
+                    "after": new,
+                    "change": round((new - old) / old, 4),
+                    "better": (new > old) == higher_is_better if new != old else None,
+                }
+    return changes
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Comma separated subset of: " + ', '.join(SCENARIOS))
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--users', type=int, default=50, help="Distinct users the clients log in as.")
+    parser.add_argument('--posts', type=int, default=200, help="Distinct posts the requests target.")
+    parser.add_argument('--random-users', action='store_true', help="Sample users at random instead of the first ones.")
+    parser.add_argument('--prefix', default='seed', help="Username prefix given to seed_social.")
+    parser.add_argument('--password', default='devconnect', help="Password given to seed_social.")
+    parser.add_argument('--query-samples', type=int, default=5, help="Requests per scenario used to count queries.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help="JSON of an earlier run to compare against.")
+    parser.add_argument('--output', help="Also write the JSON here.")
+    args = parser.parse_args()
+
+    names = [name for name in args.scenarios.split(',') if name]
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+
+    setup_django()
+    from django.db import connection
+    from DevConnect.models import Comment, Follow, Like, Post
+    from django.contrib.auth.models import User
+
+    fixtures = pick_fixtures(args)
+    queries = {name: count_queries(name, *fixtures, args.password, args.query_samples) for name in names}
+    results = asyncio.run(bench(args, names, fixtures))
+    for name in names:
+        results[name]["queries_per_request"] = queries[name]
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "base_url": args.base_url,
+            "concurrency": args.concurrency,
+            "duration_s": args.duration,
+            "rows": {model.__name__.lower(): model.objects.count() for model in (User, Post, Follow, Like, Comment)},
+        },
+        "results": results,
+    }
+    if args.baseline:
+        with open(args.baseline) as f:
+            report["compare"] = compare(results, json.load(f))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
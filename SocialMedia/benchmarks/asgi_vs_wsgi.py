@@ -0,0 +1,118 @@
+"""
+Throughput of the sync API under WSGI vs the async API under ASGI.
+
+Starts gunicorn (SocialMedia.wsgi) and uvicorn (SocialMedia.asgi) against the
+database configured in settings, with the same number of worker processes,
+and hammers the comment list, post detail and like toggle endpoints at high
+concurrency. Prints one JSON document with the results.
+
+    cd SocialMedia
+    python benchmarks/asgi_vs_wsgi.py --concurrency 200 --duration 20 --workers 2
+
+Needs gunicorn and uvicorn installed, and a migrated database.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+from loadgen import call, run_load
+
+SERVERS = {
+    'wsgi': lambda port, workers, threads: [
+        'gunicorn', 'SocialMedia.wsgi:application', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers), '--threads', str(threads), '--log-level', 'warning',
+    ],
+    'asgi': lambda port, workers, threads: [
+        'uvicorn', 'SocialMedia.asgi:application', '--host', '127.0.0.1', '--port', str(port),
+        '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+    ],
+}
+
+# Sync endpoint path under WSGI, async endpoint path under ASGI
+SCENARIOS = {
+    'comment_list': ('GET', '/api/posts/{post_id}/comments/', '/api/async/posts/{post_id}/comments/'),
+    'post_detail': ('GET', '/api/posts/{post_id}/', '/api/async/posts/{post_id}/'),
+    'like_toggle': ('POST', '/api/posts/{post_id}/like/', '/api/async/posts/{post_id}/like/'),
+}
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        with socket.socket() as sock:
+            if sock.connect_ex(('127.0.0.1', port)) == 0:
+                return
+        time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+async def make_fixtures(base_url, comments):
+    """Sign up a throwaway user through the API and give them a post with some comments."""
+    username = f'bench-{uuid.uuid4().hex[:8]}'
+    status, tokens = await call(base_url, 'POST', '/api/profiles/', body={
+        'username': username, 'email': f'{username}@example.com', 'password': uuid.uuid4().hex,
+    })
+    assert status == 201, tokens
+    headers = {'Authorization': f"Bearer {tokens['access_token']}"}
+
+    status, post = await call(base_url, 'POST', '/api/posts/', headers=headers, body={'content': 'benchmark post'})
+    assert status == 201, post
+    for i in range(comments):
+        await call(base_url, 'POST', f"/api/posts/{post['id']}/comments/", headers=headers, body={'content': f'comment {i}'})
+    return headers, post['id']
+
+
+async def bench(mode, port, args):
+    base_url = f'http://127.0.0.1:{port}'
+    headers, post_id = await make_fixtures(base_url, args.comments)
+    results = {}
+    for name, (method, sync_path, async_path) in SCENARIOS.items():
+        path = (async_path if mode == 'asgi' else sync_path).format(post_id=post_id)
+        results[name] = await run_load(
+            base_url,
+            lambda client, iteration: (method, path, headers, None),
+            concurrency=args.concurrency,
+            duration=args.duration,
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='threads per gunicorn worker')
+    parser.add_argument('--comments', type=int, default=50)
+    args = parser.parse_args()
+
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'SocialMedia.settings'))
+
+    report = {"concurrency": args.concurrency, "workers": args.workers, "threads": args.threads, "results": {}}
+    for port, mode in ((8101, 'wsgi'), (8102, 'asgi')):
+        server = subprocess.Popen(SERVERS[mode](port, args.workers, args.threads), cwd=project_dir, env=env)
+        try:
+            wait_for_port(port)
+            report["results"][mode] = asyncio.run(bench(mode, port, args))
+        finally:
+            server.terminate()
+            server.wait()
+
+    report["speedup"] = {
+        name: round(report["results"]["asgi"][name]["throughput_rps"] / report["results"]["wsgi"][name]["throughput_rps"], 2)
+        for name in SCENARIOS
+        if report["results"]["wsgi"][name]["throughput_rps"]
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Per-request cost of JWT authentication, in-process.
+
+Authenticates the same bearer token --requests times with:
+
+* jwt_db: simplejwt's JWTAuthentication, which loads the User row each time
+* stateless: StatelessJWTAuthentication with its cached user state warm
+* stateless_cold: the same with the cache emptied before every request,
+  i.e. the first request after AUTH_STATE_TTL runs out
+
+and reports mean and p95 microseconds and SQL queries per request. Run it
+against the configured database, with some user in it:
+
+    cd SocialMedia
+    python benchmarks/auth_overhead.py --requests 5000
+
+The result is one JSON document.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+
+from api_load import git_revision, setup_django
+
+
+def measure(authenticate, make_request, requests, before=None):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+
+    timings = []
+    with CaptureQueriesContext(connection) as captured:
+        for _ in range(requests):
+            if before:
+                before()
+            request = make_request()
+            started = time.perf_counter()
+            authenticate(request)
+            timings.append((time.perf_counter() - started) * 1e6)
+    timings.sort()
+    return {
+        "mean_us": round(statistics.fmean(timings), 1),
+        "p95_us": round(timings[int(len(timings) * 0.95)], 1),
+        "queries_per_request": round(len(captured.captured_queries) / requests, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--output', help="Also write the JSON here.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.core.cache import caches
+    from django.db import connection
+    from django.test import RequestFactory
+    from rest_framework.request import Request
+    from rest_framework_simplejwt.authentication import JWTAuthentication
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from DevConnect import authentication
+
+    user = User.objects.filter(is_active=True).order_by('pk').first()
+    if user is None:
+        sys.exit("No users; run `manage.py seed_social` first.")
+
+    factory = RequestFactory()
+
+    def requests_with(token):
+        return lambda: Request(factory.get('/api/feed/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+
+    plain = requests_with(RefreshToken.for_user(user).access_token)
+    stateless = requests_with(authentication.StatelessRefreshToken.for_user(user).access_token)
+    forget = lambda: caches[authentication.AUTH_STATE_CACHE_ALIAS].delete(authentication.state_key(user.pk))
+
+    results = {
+        "jwt_db": measure(JWTAuthentication().authenticate, plain, args.requests),
+        "stateless": measure(authentication.StatelessJWTAuthentication().authenticate, stateless, args.requests),
+        "stateless_cold": measure(authentication.StatelessJWTAuthentication().authenticate, stateless, args.requests, forget),
+    }
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "cache": caches[authentication.AUTH_STATE_CACHE_ALIAS].__class__.__name__,
+            "requests": args.requests,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Minimal closed-loop HTTP load generator used by the benchmark scripts.
+
+Each virtual client holds one keep-alive connection and sends requests back to
+back for the test duration. Only the standard library is used so the numbers
+are not skewed by a client library, and results are plain dicts that the
+scripts dump as JSON.
+"""
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Connection:
+    """One HTTP/1.1 keep-alive connection."""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def request(self, method, path, headers=None, body=None):
+        """Send one request and return (status, response headers, body bytes)."""
+        if self.writer is None or self.writer.is_closing():
+            await self.open()
+
+        payload = b''
+        headers = dict(headers or {})
+        if body is not None:
+            payload = json.dumps(body).encode()
+            headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(payload))
+        headers.setdefault('Host', f'{self.host}:{self.port}')
+
+        head = f'{method} {path} HTTP/1.1\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+        self.writer.write(head.encode() + payload)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('server closed the connection')
+        status = int(status_line.split()[1])
+
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        if response_headers.get('transfer-encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readline()).strip(), 16)
+                if size == 0:
+                    await self.reader.readline()
+                    break
+                data += await self.reader.readexactly(size)
+                await self.reader.readline()
+        else:
+            data = await self.reader.readexactly(int(response_headers.get('content-length', 0)))
+
+        if response_headers.get('connection', '').lower() == 'close':
+            await self.close()
+            self.writer = None
+        return status, response_headers, data
+
+
+async def call(base_url, method, path, headers=None, body=None):
+    """One-off request, for setting up fixtures before a run."""
+    connection = Connection(base_url)
+    try:
+        status, _, data = await connection.request(method, path, headers=headers, body=body)
+    finally:
+        await connection.close()
+    return status, json.loads(data) if data else None
+
+
+async def run_load(base_url, make_request, concurrency=50, duration=10.0):
+    """
+    Drive make_request(client_index, iteration) -> (method, path, headers, body)
+    from `concurrency` clients for `duration` seconds and summarize latencies.
+    """
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def client(index):
+        nonlocal errors
+        connection = Connection(base_url)
+        iteration = 0
+        try:
+            while time.perf_counter() < deadline:
+                method, path, headers, body = make_request(index, iteration)
+                iteration += 1
+                started = time.perf_counter()
+                try:
+                    status, _, _ = await connection.request(method, path, headers=headers, body=body)
+                except (ConnectionError, asyncio.IncompleteReadError, OSError):
+                    errors += 1
+                    connection.writer = None
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if status >= 500:
+                    errors += 1
+        finally:
+            await connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else 0,
+        "latency_ms": {
+            "mean": round(statistics.fmean(latencies) * 1000, 2) if latencies else None,
+            "p50": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+            "p99": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        },
+    }
@@ -0,0 +1,118 @@
+"""
+Rendering cost of the whole-table post list, in-process.
+
+Builds GET /api/posts/ (at most --rows posts) in three ways and reads the whole body:
+
+* drf: PostSerializer over model instances, rendered by DRF's JSONRenderer
+  (the list endpoint before streaming)
+* orjson: the same serializer output, rendered by ORJSONRenderer
+* streamed: renderers.stream_values() over keyset pages of .values(), as the
+  endpoint does now, plain and gzip-compressed
+
+For each it reports the time to the first byte, the total time and the peak
+memory Python allocated (tracemalloc). Run it against a seeded database:
+
+    cd SocialMedia
+    python manage.py seed_social --users 20000
+    python benchmarks/streaming_lists.py --rows 100000
+
+The result is one JSON document.
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from api_load import git_revision, setup_django
+
+
+def measure(produce):
+    """Run produce(), which yields the body in chunks, and time and size it."""
+    tracemalloc.start()
+    started = time.perf_counter()
+    first_byte = None
+    size = 0
+    for chunk in produce():
+        if first_byte is None:
+            first_byte = time.perf_counter() - started
+        size += len(chunk)
+    total = time.perf_counter() - started
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        "first_byte_ms": round(first_byte * 1000, 1),
+        "total_ms": round(total * 1000, 1),
+        "peak_memory_mb": round(peak / 2 ** 20, 1),
+        "bytes": size,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--output', help="Also write the JSON here.")
+    args = parser.parse_args()
+
+    setup_django()
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+    from DevConnect import compression, renderers
+    from DevConnect.models import Post
+    from DevConnect.serializers import PostSerializer
+
+    viewer = User.objects.order_by('pk').first()
+    if viewer is None:
+        sys.exit("No users; run `manage.py seed_social` first.")
+    last_id = Post.objects.order_by('pk').values_list('pk', flat=True)[args.rows - 1:args.rows].first()
+    posts = Post.objects.filter(pk__lte=last_id) if last_id else Post.objects.all()
+    rows = posts.count()
+
+    request = Request(APIRequestFactory().get('/api/posts/'))
+    request.accepted_renderer = renderers.ORJSONRenderer()
+
+    def serialized(renderer):
+        def produce():
+            data = PostSerializer(PostSerializer.setup_queryset(posts, viewer), many=True).data
+            yield renderer.render(data)
+        return produce
+
+    def streamed(compress=False):
+        def produce():
+            response = renderers.stream_values(
+                request, PostSerializer.stream_queryset(posts, viewer), PostSerializer.stream_row,
+            )
+            return compression.gzip_stream(response.streaming_content) if compress else response.streaming_content
+        return produce
+
+    results = {
+        "drf": measure(serialized(JSONRenderer())),
+        "orjson": measure(serialized(renderers.ORJSONRenderer())),
+        "streamed": measure(streamed()),
+        "streamed_gzip": measure(streamed(compress=True)),
+    }
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "orjson": renderers.orjson is not None,
+            "rows": rows,
+            "chunk_size": renderers.STREAM_CHUNK_SIZE,
+        },
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+"""
+Benchmark of the trending refresh as the Like and Comment tables grow.
+
+Each round first adds --grow comments (not timed, folded in right away), then
+--events new likes and comments, and times trending.refresh() reading exactly
+those. The incremental refresh should cost the same in every round, however big
+the tables have become. For comparison each round also times the obvious
+alternative: aggregating all the engagement in the window with one GROUP BY.
+
+It writes to the configured database, so run it against a seeded copy:
+
+    cd SocialMedia
+    python manage.py seed_social --users 20000
+    python benchmarks/trending_refresh.py --rounds 5 --grow 200000
+
+The result is one JSON document.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+
+from api_load import git_revision, setup_django
+
+
+def add_events(rng, user_ids, post_ids, likes, comments):
+    from DevConnect.models import Comment, Like
+
+    Like.objects.bulk_create(
+        [Like(user_id=rng.choice(user_ids), post_id=rng.choice(post_ids)) for _ in range(likes)],
+        batch_size=1000, ignore_conflicts=True,
+    )
+    Comment.objects.bulk_create(
+        [Comment(author_id=rng.choice(user_ids), post_id=rng.choice(post_ids), content='benchmark') for _ in range(comments)],
+        batch_size=1000,
+    )
+
+
+def timed(function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    return result, round((time.perf_counter() - started) * 1000, 2)
+
+
+def catch_up(trending):
+    total = 0
+    while True:
+        read = trending.refresh()
+        total += read
+        if read < trending.TRENDING_BATCH_SIZE:
+            return total
+
+
+def full_recompute(trending):
+    """Every post's engagement in the window from scratch, what a refresh without watermarks would run."""
+    from datetime import timedelta
+
+    from django.db.models import Count
+    from django.utils import timezone
+
+    cutoff = timezone.now() - timedelta(seconds=trending.TRENDING_WINDOW)
+    return sum(
+        len(list(model.objects.filter(post__created_at__gte=cutoff).values('post_id').annotate(events=Count('pk'))))
+        for model, _, _ in trending.SOURCES
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=5)
+    parser.add_argument('--grow', type=int, default=100000, help="Comments added before each round, not timed.")
+    parser.add_argument('--events', type=int, default=2000, help="New likes and new comments read by each timed refresh.")
+    parser.add_argument('--posts', type=int, default=1000, help="Most recent posts the events go to.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Also write the JSON here.")
+    args = parser.parse_args()
+
+    setup_django()
+    from unittest import mock
+
+    from django.contrib.auth.models import User
+    from django.db import connection
+    from DevConnect import trending
+    from DevConnect.models import Comment, Like, Post, TrendingScore
+
+    rng = random.Random(args.seed)
+    user_ids = list(User.objects.values_list('pk', flat=True)[:10000])
+    post_ids = list(Post.objects.order_by('-created_at').values_list('pk', flat=True)[:args.posts])
+    if not user_ids or not post_ids:
+        sys.exit("No users or posts; run `manage.py seed_social` first.")
+
+    rounds = []
+    # Events made a moment ago count right away
+    with mock.patch.object(trending, 'TRENDING_SETTLE', 0):
+        catch_up(trending)
+        for _ in range(args.rounds):
+            add_events(rng, user_ids, post_ids, 0, args.grow)
+            catch_up(trending)
+            add_events(rng, user_ids, post_ids, args.events, args.events)
+            read, refresh_ms = timed(catch_up, trending)
+            _, recompute_ms = timed(full_recompute, trending)
+            rounds.append({
+                "likes": Like.objects.count(),
+                "comments": Comment.objects.count(),
+                "trending_rows": TrendingScore.objects.count(),
+                "events_read": read,
+                "refresh_ms": refresh_ms,
+                "full_recompute_ms": recompute_ms,
+            })
+            sys.stderr.write(json.dumps(rounds[-1]) + '\n')
+
+    report = {
+        "meta": {
+            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "database": connection.vendor,
+            "events_per_round": args.events,
+            "grow_per_round": args.grow,
+        },
+        "rounds": rounds,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    sys.stdout.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()